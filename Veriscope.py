@@ -1,6 +1,6 @@
 # test_sec.py
 # --------------------------------------------------------------------------------------------
-# 시드 크롤(병렬) → 임베딩 인덱스(pkl) → 평가 시 NLI 재랭크(배치)
+# 시드 크롤(병렬) → 임베딩 인덱스(mmap) → 평가 시 NLI 재랭크(배치)
 # 출력: Top-5 근거(각 %) + 최종 신뢰도 %
 # - 네이버/ JTBC 전용 본문 추출기 추가
 # - AMP 서브도메인 잘못 시도 제거 (amp.news.*)
@@ -26,15 +26,27 @@ import sys
 import math
 import time
 import pickle
+import sqlite3
+import hashlib
+import zlib
+import mmap
+import array
+import bisect
 import queue
+import shutil
+import subprocess
 import argparse
 import urllib.parse as up
 import urllib.parse
 import logging
 import multiprocessing as mp
+import weakref
 from datetime import datetime, timezone
-from dataclasses import dataclass
-from typing import List, Tuple, Optional, Callable
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from functools import lru_cache
+from collections import OrderedDict, deque
+from typing import List, Tuple, Optional, Callable, Iterable, Dict
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from threading import Lock
 
@@ -65,6 +77,20 @@ import trafilatura
 from newspaper import Article
 from tqdm import tqdm
 
+# FAISS 근사 최근접 이웃 검색 (선택적)
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Aho-Corasick 다중 패턴 매칭 C 구현 (선택적 - 없으면 순수 파이썬 오토마톤)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 # 이미지 처리 라이브러리 (선택적)
 try:
     from PIL import Image
@@ -89,16 +115,23 @@ from urllib3.util.retry import Retry
 from readability import Document
 import json
 
+# --- local ---
+import index_manifest   # 인덱스 경로 / manifest 읽기 (표준 라이브러리만 쓰는 API 서버와 공유)
+
 # --------------------------------------------------------------------------------------------
 # 고정 경로
 SEED_CSV  = r"C:\Smart_IT\enhanced_seed_links.csv"  # 개선된 시드 링크 사용
-INDEX_PKL = r"C:\Smart_IT\smart_it_index.pkl"
+INDEX_PKL = r"C:\Smart_IT\smart_it_index.pkl"   # 구 포맷(pickle) - convert-index 로 1회 변환
+INDEX_DIR = index_manifest.INDEX_DIR             # 온디스크 인덱스(mmap 행렬 + 컬럼 파일) - 경로는 index_manifest.py 에서 설정
 
 # 기본 정책
 MAX_DEPTH = 2
 MAX_PAGES_PER_DOMAIN = 150      # 도메인당 최대 페이지(품질/시간 트레이드오프)
 REQUEST_TIMEOUT = 12
 CRAWL_SLEEP = 0.5
+BUILD_NEAR_DUP_HAMMING = 3      # 빌드 시 SimHash 해밍 거리 이하 청크는 하나로 합침 (음수 = 끔, build-index --near-dup-hamming)
+BUILD_NEAR_DUP_SHINGLE = 3      # SimHash 입력 단어 shingle 길이
+EMBED_CACHE_ROWS = 1_000_000    # 빌드 임베딩 캐시 최대 행 수 (초과 시 오래 안 쓴 것부터 삭제, 0 = 끔)
 
 # 검색/스코어 정책
 TOPK_CANDIDATES = 500           # ← 중요: 0 이면 NLI가 비어버림
@@ -119,6 +152,15 @@ EPS_SOURCE = 0.20     # 출처 신뢰성 가중치 (높임)
 EPS_LANG   = 0.15     # 한국어/영어 등 질의-문서 언어 정합 가중 (높임)
 TIME_LAMBDA = 0.0025
 
+# 검색 백엔드 (evaluate 의 --search-backend / --nprobe / --ef-search 로 변경)
+SEARCH_BACKEND = "auto"   # auto: ANN 인덱스가 있으면 사용 | exact: 전수 코사인 | faiss: ANN 강제
+ANN_NPROBE = 16           # IVF: 탐색할 클러스터 수 (클수록 recall↑ latency↑)
+ANN_EF_SEARCH = 128       # HNSW: 탐색 후보 리스트 크기 (클수록 recall↑ latency↑)
+SEARCH_RECENCY_DAYS = None  # 최근 N일 발행분만 검색 (None = 전체, --recency-days)
+SEARCH_NEWEST_FIRST = False # 최신 세그먼트부터 검색하고 시간 가중으로 더 나올 수 없으면 중단 (--newest-first)
+SEARCH_HYBRID = False       # BM25F + 코사인 융합 검색 (evaluate-image --retrieval hybrid)
+HYBRID_ALPHA = 0.7          # 융합 점수 = α·코사인 + (1-α)·(BM25 / 후보 중 최대 BM25)
+
 # 로깅
 logger = logging.getLogger("smart_it")
 
@@ -415,6 +457,75 @@ def korean_ratio(text: str) -> float:
     hangul = sum(1 for ch in text if '\uac00' <= ch <= '\ud7a3')
     return hangul / max(1, total)
 
+class AhoCorasick:
+    """
+    여러 사전 용어를 텍스트 한 번의 선형 스캔으로 모두 찾는 Aho-Corasick 오토마톤
+    
+    patterns 는 문자열 또는 (패턴, 값) 쌍 - 값이 같은 패턴(띄어쓰기 변형, 줄임말 등)은 하나의 적중으로 합쳐진다.
+    pyahocorasick 이 있으면 C 구현을 쓰고, 없으면 실패 링크를 전이 표에 펼친 순수 파이썬 DFA 로 스캔한다.
+    """
+
+    def __init__(self, patterns):
+        values = {}
+        for item in patterns:
+            pattern, value = (item, item) if isinstance(item, str) else item
+            if pattern:
+                values.setdefault(pattern, set()).add(value)
+        self.patterns = {p: frozenset(v) for p, v in values.items()}
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for pattern, value in self.patterns.items():
+                self._automaton.add_word(pattern, value)
+            if self.patterns:
+                self._automaton.make_automaton()
+            return
+        self._automaton = None
+
+        goto = [{}]
+        out = [set()]
+        for pattern, value in self.patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    out.append(set())
+                state = nxt
+            out[state] |= value
+
+        # 너비 우선으로 실패 링크를 계산하면서 실패 상태의 전이/출력을 물려받아 결정적 전이 표 구성
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            f = fail[state]
+            out[state] |= out[f]
+            delta[state] = {**delta[f], **goto[state]}
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[f].get(ch, 0)
+                queue.append(nxt)
+        self._delta = delta
+        self._out = [frozenset(o) for o in out]
+
+    def find_all(self, text: str) -> set:
+        """text 에 나타나는 모든 패턴의 값 집합 (겹치거나 다른 패턴에 포함된 패턴도 모두)"""
+        hits = set()
+        if not text or not self.patterns:
+            return hits
+        if self._automaton is not None:
+            for _, value in self._automaton.iter(text):
+                hits |= value
+            return hits
+        delta, out = self._delta, self._out
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                hits |= out[state]
+        return hits
+
 # --------------------------------------------------------------------------------------------
 # 본문 추출 (도메인 전용 → AMP/JSON-LD/Next.js/Readability → trafilatura → manual → newspaper3k)
 def extract_text(url: str, html: Optional[str], fast: bool = False) -> Tuple[str, Optional[datetime], str]:
@@ -919,6 +1030,136 @@ def source_reputation(url: str, in_seed: bool) -> float:
     if url.lower().startswith("https://"): score += 0.05
     return max(-0.2, min(0.8, score))
 
+def source_reputation_array(urls: List[str], from_seed: np.ndarray) -> np.ndarray:
+    """source_reputation 의 배열 버전 (같은 기사의 청크들은 URL 이 같으므로 (URL, 시드 여부) 당 한 번 계산)"""
+    cache = {}
+    out = np.empty(len(urls), dtype=np.float64)
+    for j, key in enumerate(zip(urls, np.asarray(from_seed, dtype=bool).tolist())):
+        v = cache.get(key)
+        if v is None:
+            v = cache[key] = source_reputation(*key)
+        out[j] = v
+    return out
+
+# 도메인 분류 비트 - 인덱스 빌드/URL 추가 시 레코드별로 계산해 domain_class.npy (uint8) 로 저장
+DOMAIN_KOREAN = 1 << 0      # 국내 사이트
+DOMAIN_FOREIGN = 1 << 1     # 해외 사이트 (국내가 아니고 일반 TLD)
+DOMAIN_GOV = 1 << 2         # 정부/공공기관
+DOMAIN_MEDIA = 1 << 3       # 주요 언론사
+URL_QUALITY_NEWS = 1 << 4   # 기사 URL 형태 (is_quality_news_url)
+
+KOREAN_SITE_DOMAINS = (
+    'naver.com', 'daum.net', 'chosun.com', 'joins.com', 'donga.com',
+    'hani.co.kr', 'khan.co.kr', 'ytn.co.kr', 'jtbc.co.kr', 'sbs.co.kr',
+    'kbs.co.kr', 'mbc.co.kr', 'news1.kr', 'newsis.com', 'edaily.co.kr',
+    'mk.co.kr', 'hankyung.com', 'korea.kr', 'koreaherald.com', 'koreatimes.co.kr',
+    'koreajoongangdaily.joins.com', 'pressian.com', 'ohmynews.com'
+)
+FOREIGN_SITE_TLDS = ('.fr', '.de', '.it', '.es', '.com', '.net', '.org')
+GOV_SITE_DOMAINS = ('korea.kr', 'mofa.go.kr', 'mois.go.kr', 'gov.kr')
+MEDIA_SITE_DOMAINS = ('yna.co.kr', 'ytn.co.kr', 'jtbc.co.kr', 'naver.com', 'hankyung.com')
+
+def is_quality_news_url(url: str) -> bool:
+    """뉴스 기사 URL인지 확인 (일반 페이지 제외)"""
+    url_lower = url.lower()
+    
+    # 제외할 URL 패턴들 (더 강력하게)
+    exclude_patterns = [
+        'copyright', 'agreement', 'privacy', 'terms', 'policy',
+        'contact', 'about', 'newslist', 'category', 'tag',
+        'search', 'login', 'register', 'member', 'mypage',
+        'sitemap', 'rss', 'xml', 'api', 'admin', 'management',
+        'list', 'index', 'main', 'home', 'plan', 'specialedition',
+        'history', 'archive', 'event', 'promotion', 'guide'
+    ]
+    
+    # 제외 패턴이 있으면 False (대소문자 구분 없이)
+    for pattern in exclude_patterns:
+        if pattern in url_lower:
+            logger.debug(f"제외 패턴 '{pattern}' 발견: {url}")
+            return False
+    
+    # 포함되어야 할 패턴들 (뉴스 기사 URL 특징)
+    include_patterns = [
+        'article', 'news', 'view', 'read', 'story', 'report'
+    ]
+    
+    # 포함 패턴이 있거나, 숫자가 많이 포함된 URL (기사 ID)
+    has_include_pattern = any(pattern in url_lower for pattern in include_patterns)
+    has_many_numbers = len([c for c in url if c.isdigit()]) >= 10  # 기사 ID는 보통 10자리 이상
+    
+    # URL에 날짜 패턴이 있는지 확인 (YYYY/MM/DD 또는 YYYYMMDD)
+    has_date_pattern = bool(re.search(r'20\d{2}[/\-]?\d{2}[/\-]?\d{2}', url))
+    
+    result = has_include_pattern or has_many_numbers or has_date_pattern
+    logger.debug(f"URL 품질 검사: {url} -> {result} (패턴:{has_include_pattern}, 숫자:{has_many_numbers}, 날짜:{has_date_pattern})")
+    
+    return result
+
+def domain_class_bits(url: str) -> int:
+    """URL 의 도메인 분류 비트 (DOMAIN_* | URL_QUALITY_NEWS)"""
+    d = domain_of(url)
+    bits = 0
+    if any(kd in d for kd in KOREAN_SITE_DOMAINS):
+        bits |= DOMAIN_KOREAN
+    elif any(tld in d for tld in FOREIGN_SITE_TLDS):
+        bits |= DOMAIN_FOREIGN
+    if any(gd in d for gd in GOV_SITE_DOMAINS):
+        bits |= DOMAIN_GOV
+    if any(md in d for md in MEDIA_SITE_DOMAINS):
+        bits |= DOMAIN_MEDIA
+    if url and is_quality_news_url(url):
+        bits |= URL_QUALITY_NEWS
+    return bits
+
+def jtbc_url_year(url: str) -> Optional[int]:
+    """JTBC 기사 ID 의 연도 (NB11272032 -> 2011)"""
+    if 'jtbc.co.kr' not in url:
+        return None
+    jtbc_match = re.search(r'NB(\d{2})', url)
+    if not jtbc_match:
+        return None
+    year_suffix = int(jtbc_match.group(1))
+    return 2000 + year_suffix if year_suffix <= 25 else 1900 + year_suffix   # 26-99는 1926-1999 (실제로는 거의 없음)
+
+def url_year(url: str) -> Optional[int]:
+    """URL 에서 기사 연도 감지 (JTBC 기사 ID → 20xx 패턴 → korea.kr 특수 처리 순서, 없으면 None)"""
+    detected_year = jtbc_url_year(url)
+    if not detected_year:
+        for year_suffix in re.findall(r'20(\d{2})', url):
+            year_candidate = int('20' + year_suffix)
+            if 2000 <= year_candidate <= 2025:
+                detected_year = year_candidate
+                break
+    if not detected_year and 'korea.kr' in url and '132038018' in url:
+        detected_year = 2016
+    return detected_year
+
+RELEVANCE_KR_RE = re.compile(r'[가-힣]{2,}')
+RELEVANCE_EN_RE = re.compile(r'[A-Za-z]{3,}')
+RELEVANCE_NUM_RE = re.compile(r'[0-9]{2,}')
+
+def relevance_keywords(text: str) -> set:
+    """키워드 관련성 검증용 키워드 집합 (한국어 2글자 이상, 영어 3글자 이상(대문자), 숫자 2자리 이상)"""
+    keywords = set(RELEVANCE_KR_RE.findall(text))
+    keywords.update(RELEVANCE_EN_RE.findall(text.upper()))
+    keywords.update(RELEVANCE_NUM_RE.findall(text))
+    return keywords
+
+@lru_cache(maxsize=1 << 20)
+def keyword_hash(keyword: str) -> int:
+    """키워드의 64비트 해시 (프로세스/실행과 무관하게 고정 - 인덱스 컬럼에 저장)"""
+    return int.from_bytes(hashlib.blake2b(keyword.encode("utf-8"), digest_size=8).digest(), "little")
+
+def relevance_keyword_hashes(text: str) -> np.ndarray:
+    """relevance_keywords 의 해시 (정렬된 uint64 배열)"""
+    return np.unique(np.fromiter((keyword_hash(k) for k in relevance_keywords(text)), dtype=np.uint64))
+
+@lru_cache(maxsize=4096)
+def relevance_hash_set(text: str) -> frozenset:
+    """relevance_keywords 의 해시 집합 (텍스트별 memo - 같은 질의/근거 청크는 한 번만 토큰화)"""
+    return frozenset(keyword_hash(k) for k in relevance_keywords(text))
+
 def time_weight(dt_pub: Optional[datetime]) -> float:
     if not dt_pub: return 0.0
     age_days = max(0.0, (now_utc() - dt_pub).total_seconds()/86400.0)
@@ -940,6 +1181,18 @@ def time_weight(dt_pub: Optional[datetime]) -> float:
         w = math.exp(-TIME_LAMBDA * age_days)  # 1년 이내는 기존 공식
         return -0.1 + 0.9 * w  # -0.1 ~ +0.8
 
+def time_weight_array(published: np.ndarray) -> np.ndarray:
+    """time_weight 의 벡터 버전 (published: epoch 초 배열, NaN 은 발행일 없음 → 0.0)"""
+    published = np.asarray(published, dtype=np.float64)
+    age_days = np.maximum(0.0, (now_utc().timestamp() - published) / 86400.0)
+    recent = -0.1 + 0.9 * np.exp(-TIME_LAMBDA * np.nan_to_num(age_days))
+    out = np.select(
+        [age_days > 365 * 13, age_days > 365 * 10, age_days > 365 * 7,
+         age_days > 365 * 5, age_days > 365 * 3, age_days > 365 * 1],
+        [-1.2, -1.0, -0.8, -0.6, -0.4, -0.2],
+        default=recent)
+    return np.where(np.isnan(published) | (published == 0), 0.0, out)
+
 # --------------------------------------------------------------------------------------------
 # 데이터 구조
 @dataclass
@@ -950,13 +1203,1950 @@ class DocRecord:
     chunk: str
     domain: str
     from_seed: bool
+    alt_urls: Tuple[str, ...] = ()   # 빌드 시 이 청크로 합쳐진 (거의) 같은 내용의 다른 기사 URL
+@dataclass
+class IndexSegment:
+    """base 외의 세그먼트: 샤드(shards/NNN) 또는 append-only delta (사용자 URL 추가분)"""
+    name: str
+    matrix: np.ndarray
+    records: List[DocRecord]
+    urls: Optional["UrlMap"] = field(default=None, repr=False)  # URL → 행 범위 (지연 로딩)
+    path: Optional[str] = None                                   # 세그먼트 디렉터리
+    normalized: bool = False                                     # 행렬 행이 L2 정규화되어 있음 (meta.json)
 
 @dataclass
 class IndexPack:
     model_name: str
     embed_dim: int
-    matrix: np.ndarray
-    records: List[DocRecord]
+    matrix: np.ndarray                  # base 세그먼트 임베딩 행렬
+    records: List[DocRecord]            # base 세그먼트 레코드
+    deltas: List[IndexSegment] = field(default_factory=list)  # 전역 행 번호는 base → shard → delta 순으로 이어짐
+    shards: List[IndexSegment] = field(default_factory=list)  # build-index --shards 로 만든 샤드 (읽기 전용)
+    index_dir: Optional[str] = None     # 디스크에서 연 경우 인덱스 디렉터리 (ANN 인덱스 위치)
+    ann: Optional["AnnIndex"] = field(default=None, repr=False)  # base 세그먼트용 ANN (지연 로딩)
+    quant: Optional["QuantIndex"] = field(default=None, repr=False)  # base 세그먼트용 양자화 코드 (지연 로딩)
+    urls: Optional["UrlMap"] = field(default=None, repr=False)      # base 세그먼트 URL → 행 범위 (지연 로딩)
+    deleted: Dict[str, List[List[int]]] = field(default_factory=dict)  # 세그먼트명 → 삭제된 행 범위 (tombstone)
+    _deleted_masks: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _published_cols: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _published_ranges: Dict[str, Tuple[float, float, bool]] = field(default_factory=dict, repr=False)
+    _domain_class_cols: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _keyword_indexes: Dict[str, "KeywordIndex"] = field(default_factory=dict, repr=False)
+    version: Optional[str] = None       # 연 인덱스 스냅샷 버전 (CURRENT 가 가리키는 versions/<버전>)
+    stamp: Optional[tuple] = field(default=None, repr=False)  # (버전, delta 목록, tombstone mtime) - refresh_index 비교용
+    lease: Optional[str] = field(default=None, repr=False)    # 이 pack 이 보유한 리더 lease 파일
+    normalized: bool = False            # base 행렬 행이 L2 정규화되어 있음 (meta.json, 검색 시 행 노름 계산 생략)
+
+    def iter_named_segments(self, include_shards: bool = True):
+        """(세그먼트명, 전역 시작 행, 행렬, 레코드) 를 base → shard → delta 순으로 반환 (base 이름은 "base")
+        include_shards=False 면 샤드를 건너뛴다 (전역 행 번호는 그대로)."""
+        start = 0
+        yield BASE_SEGMENT, start, self.matrix, self.records
+        start += len(self.records)
+        for seg in self.shards:
+            if include_shards:
+                yield seg.name, start, seg.matrix, seg.records
+            start += len(seg.records)
+        for seg in self.deltas:
+            yield seg.name, start, seg.matrix, seg.records
+            start += len(seg.records)
+
+    def segment_normalized(self, name: str) -> bool:
+        if name == BASE_SEGMENT:
+            return self.normalized
+        return any(seg.normalized for seg in self.shards + self.deltas if seg.name == name)
+
+    def iter_segments(self):
+        """(전역 시작 행, 행렬, 레코드) 를 base → shard → delta 순으로 반환"""
+        for _, start, matrix, records in self.iter_named_segments():
+            yield start, matrix, records
+
+    def url_map(self, name: str) -> "UrlMap":
+        """세그먼트의 URL 맵 (디스크의 url_map.npy 를 열고, 없으면 URL 컬럼으로 한 번 만든다)"""
+        if name == BASE_SEGMENT:
+            if self.urls is None:
+                self.urls = UrlMap.open(self.index_dir, self.records)
+            return self.urls
+        for seg in self.shards + self.deltas:
+            if seg.name == name:
+                if seg.urls is None:
+                    seg.urls = UrlMap.open(seg.path, seg.records)
+                return seg.urls
+        raise KeyError(name)
+
+    def published_column(self, name: str, records) -> np.ndarray:
+        """세그먼트의 발행 시각 컬럼 (epoch 초, 없으면 NaN)"""
+        if isinstance(records, RecordColumns):
+            return records.published
+        col = self._published_cols.get(name)
+        if col is None:
+            col = self._published_cols[name] = np.array(
+                [r.published if r.published is not None else np.nan for r in records], dtype=np.float64)
+        return col
+
+    def published_range(self, name: str, records) -> Tuple[float, float, bool]:
+        """세그먼트의 (최소 발행 시각, 최대 발행 시각, 발행일 없는 행 존재 여부). 한 번 계산 후 캐시."""
+        rng = self._published_ranges.get(name)
+        if rng is None:
+            pub = np.asarray(self.published_column(name, records))
+            known = pub[~np.isnan(pub)]
+            rng = self._published_ranges[name] = (
+                float(known.min()) if len(known) else math.nan,
+                float(known.max()) if len(known) else math.nan,
+                bool(len(known) < len(pub)))
+        return rng
+
+    def domain_class_column(self, name: str, records) -> np.ndarray:
+        """세그먼트의 도메인 분류 비트 컬럼 (domain_class.npy 가 없던 인덱스는 URL 당 한 번 계산 후 캐시)"""
+        col = getattr(records, "domain_class", None)
+        if col is not None:
+            return col
+        col = self._domain_class_cols.get(name)
+        if col is None:
+            class_of_url = {}
+            urls = records.iter_field("url") if isinstance(records, RecordColumns) else (r.url for r in records)
+            bits = []
+            for url in urls:
+                b = class_of_url.get(url)
+                if b is None:
+                    b = class_of_url[url] = domain_class_bits(url or "")
+                bits.append(b)
+            col = self._domain_class_cols[name] = np.asarray(bits, dtype=np.uint8)
+        return col
+
+    def domain_classes(self, idx) -> np.ndarray:
+        """전역 행 번호 목록의 도메인 분류 비트 (uint8)"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        out = np.zeros(len(idx), dtype=np.uint8)
+        for name, start, _, records in self.iter_named_segments():
+            sel = np.nonzero((idx >= start) & (idx < start + len(records)))[0]
+            if len(sel):
+                out[sel] = np.asarray(self.domain_class_column(name, records))[idx[sel] - start]
+        return out
+
+    def record_features(self, idx) -> Tuple[np.ndarray, np.ndarray]:
+        """전역 행 번호 목록의 (청크 한글 비율 float32, URL 감지 연도 int16 - 없으면 0).
+        빌드 시 저장된 컬럼을 읽고, 컬럼이 없던 세그먼트는 요청한 행만 계산한다."""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        ratios = np.zeros(len(idx), dtype=np.float32)
+        years = np.zeros(len(idx), dtype=np.int16)
+        for _, start, _, records in self.iter_named_segments():
+            sel = np.nonzero((idx >= start) & (idx < start + len(records)))[0]
+            if not len(sel):
+                continue
+            rows = idx[sel] - start
+            kr_col = getattr(records, "korean_ratio", None)
+            year_col = getattr(records, "url_year", None)
+            if kr_col is not None and year_col is not None:
+                ratios[sel] = kr_col[rows]
+                years[sel] = year_col[rows]
+                continue
+            for j, r in zip(sel.tolist(), rows.tolist()):
+                rec = records[r]
+                ratios[j] = korean_ratio(rec.chunk or "")
+                years[j] = url_year(rec.url or "") or 0
+        return ratios, years
+
+    def keyword_hashes(self, i) -> np.ndarray:
+        """행의 관련성 키워드 해시 집합 (relevance_keyword_hashes, 저장된 컬럼이 없으면 청크로 계산)"""
+        i = int(i)
+        for start, _, records in self.iter_segments():
+            if i < start + len(records):
+                kwhash = getattr(records, "kwhash", None)
+                if kwhash is not None:
+                    off, vals = kwhash
+                    return vals[off[i - start]:off[i - start + 1]]
+                return relevance_keyword_hashes(records[i - start].chunk or "")
+        raise IndexError(i)
+
+    def keyword_hash_hits(self, idx, hashes: np.ndarray) -> np.ndarray:
+        """전역 행 번호 목록의 각 행 관련성 키워드 해시 중 hashes 에 든 개수 (int64)"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        if not len(idx) or not len(hashes):
+            return np.zeros(len(idx), dtype=np.int64)
+        per_row = [self.keyword_hashes(i) for i in idx.tolist()]
+        owner = np.repeat(np.arange(len(idx)), [len(h) for h in per_row])
+        hit = np.isin(np.concatenate(per_row), hashes, assume_unique=False)
+        return np.bincount(owner[hit], minlength=len(idx))
+
+    def field_values(self, idx, name: str) -> List[str]:
+        """전역 행 번호 목록의 문자열 필드 값 (컬럼 저장소는 해당 필드만 읽고 DocRecord 를 만들지 않음)"""
+        out = []
+        for i in np.asarray(idx, dtype=np.int64).reshape(-1).tolist():
+            for start, _, records in self.iter_segments():
+                if i < start + len(records):
+                    col = records.columns.get(name) if isinstance(records, RecordColumns) else None
+                    out.append(col[i - start] if col is not None else getattr(records[i - start], name))
+                    break
+            else:
+                raise IndexError(i)
+        return out
+
+    def keyword_index(self, name: str, records) -> "KeywordIndex":
+        """세그먼트의 키워드 역색인 (kw.* 파일을 열고, 없으면 청크 본문으로 한 번 만든다)"""
+        kw = self._keyword_indexes.get(name)
+        if kw is None:
+            seg_dir = self.index_dir if name == BASE_SEGMENT else next(
+                (seg.path for seg in self.shards + self.deltas if seg.name == name), None)
+            kw = self._keyword_indexes[name] = KeywordIndex.open(seg_dir, records)
+        return kw
+
+    def keyword_rows(self, keyword: str) -> Optional[np.ndarray]:
+        """keyword 가 들어 있을 수 있는 전역 행 번호 (오름차순, 상위 집합 - 부분 문자열 확인은 호출 측에서).
+        역색인으로 거를 수 없는 키워드 (2자 이상 토큰이 없음) 면 None."""
+        if keyword != keyword.lower():   # 소문자 본문에는 대문자가 들어 있을 수 없음
+            return np.zeros(0, dtype=np.int64)
+        out = []
+        for name, start, _, records in self.iter_named_segments():
+            if not len(records):
+                continue
+            rows = self.keyword_index(name, records).candidate_rows(keyword)
+            if rows is None:
+                return None
+            out.append(rows.astype(np.int64) + start)
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int64)
+
+    def bm25_scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """질의 토큰에 대한 BM25F 점수 (제목 가중은 빌드 시 tf 에 반영). 반환: (전역 행 번호 오름차순, 점수)
+        질의 토큰은 그 토큰으로 시작하는 색인 토큰과 맞춘다 ('대통령' ↔ '대통령은', '대통령이')."""
+        terms = sorted(set(KEYWORD_TOKEN_RE.findall(query.lower())))
+        segments = [(name, start, records, self.keyword_index(name, records))
+                    for name, start, _, records in self.iter_named_segments() if len(records)]
+        if not terms or not segments:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        n_docs = sum(len(records) for _, _, records, _ in segments)
+        avgdl = max(sum(kw.total_length for *_, kw in segments) / n_docs, 1e-6)
+        rows_out, scores_out = [], []
+        for term in terms:
+            hits = []
+            for name, start, records, kw in segments:
+                rows, tf = kw.term_postings(term)
+                dead = self.deleted_mask(name, len(records))
+                if dead is not None and len(rows):
+                    live = ~dead[rows]
+                    rows, tf = rows[live], tf[live]
+                if len(rows):
+                    hits.append((rows.astype(np.int64) + start, tf, kw.lengths[rows]))
+            df = sum(len(h[0]) for h in hits)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for rows, tf, dl in hits:
+                rows_out.append(rows)
+                scores_out.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)))
+        if not rows_out:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows, inv = np.unique(np.concatenate(rows_out), return_inverse=True)
+        return rows, np.bincount(inv, weights=np.concatenate(scores_out)).astype(np.float32)
+
+    def deleted_mask(self, name: str, rows: int) -> Optional[np.ndarray]:
+        """세그먼트의 삭제 행 마스크 (삭제가 없으면 None)"""
+        ranges = self.deleted.get(name)
+        if not ranges:
+            return None
+        mask = self._deleted_masks.get(name)
+        if mask is None:
+            mask = np.zeros(rows, dtype=bool)
+            for a, b in ranges:
+                mask[a:b] = True
+            self._deleted_masks[name] = mask
+        return mask
+
+    def find_url(self, url: str) -> List[Tuple[int, int]]:
+        """URL 의 (삭제되지 않은) 청크 행 범위를 전역 행 번호 [start, stop) 목록으로 반환"""
+        out = []
+        for name, start, _, records in self.iter_named_segments():
+            dead = self.deleted.get(name, ())
+            for a, b in self.url_map(name).lookup(url):
+                if not any(da <= a and b <= db for da, db in dead):
+                    out.append((start + a, start + b))
+        return out
+
+    def has_url(self, url: str) -> bool:
+        return bool(self.find_url(url))
+
+    def __len__(self) -> int:
+        return len(self.records) + sum(len(seg.records) for seg in self.shards + self.deltas)
+
+    def record(self, i) -> DocRecord:
+        i = int(i)
+        for start, _, records in self.iter_segments():
+            if i < start + len(records):
+                return records[i - start]
+        raise IndexError(i)
+
+    def iter_records(self):
+        for _, _, records in self.iter_segments():
+            yield from records
+
+    def iter_field(self, name: str):
+        """레코드 필드 값을 전역 행 순서대로 반환 (컬럼 저장소는 DocRecord 생성 없이 읽음)"""
+        for _, _, records in self.iter_segments():
+            if isinstance(records, RecordColumns):
+                yield from records.iter_field(name)
+            else:
+                for r in records:
+                    yield getattr(r, name)
+
+    def vectors(self, idx) -> np.ndarray:
+        """전역 행 번호 목록에 해당하는 임베딩 행을 모아 반환"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        out = np.empty((len(idx), self.embed_dim), dtype=np.float32)
+        for start, matrix, records in self.iter_segments():
+            sel = np.nonzero((idx >= start) & (idx < start + len(records)))[0]
+            if len(sel):
+                out[sel] = matrix[idx[sel] - start]
+        return out
+
+    def column_values(self, idx, name: str) -> np.ndarray:
+        """전역 행 번호 목록의 숫자 컬럼 값 (published: float64 epoch 초, 없으면 NaN / from_seed: bool)"""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        out = np.full(len(idx), np.nan) if name == "published" else np.zeros(len(idx), dtype=bool)
+        for seg_name, start, _, records in self.iter_named_segments():
+            sel = np.nonzero((idx >= start) & (idx < start + len(records)))[0]
+            if not len(sel):
+                continue
+            if name == "published":
+                col = self.published_column(seg_name, records)
+            elif isinstance(records, RecordColumns):
+                col = records.from_seed
+            else:
+                col = np.array([bool(r.from_seed) for r in records], dtype=bool)
+            out[sel] = np.asarray(col)[idx[sel] - start]
+        return out
+
+    def string_codes(self, idx, name: str) -> Tuple[np.ndarray, List[str]]:
+        """전역 행 번호 목록의 문자열 필드를 (정수 코드 int64, 고유 문자열 표) 로 반환합니다.
+        인턴된 컬럼(url/title/domain)은 id 배열만 읽고 고유 문자열만 디코딩한다 (행마다 문자열을 만들지 않음)."""
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        codes = np.zeros(len(idx), dtype=np.int64)
+        code_of = {}
+        for _, start, _, records in self.iter_named_segments():
+            sel = np.nonzero((idx >= start) & (idx < start + len(records)))[0]
+            if not len(sel):
+                continue
+            rows = idx[sel] - start
+            col = records.columns.get(name) if isinstance(records, RecordColumns) else None
+            if isinstance(col, InternedColumn):
+                seg_ids, inv = np.unique(np.asarray(col.ids)[rows], return_inverse=True)
+                values = [col.table[int(sid)] for sid in seg_ids.tolist()]
+            else:
+                seg_code = {}
+                inv = np.fromiter((seg_code.setdefault(col[r] if col is not None else getattr(records[r], name), len(seg_code))
+                                   for r in rows.tolist()), dtype=np.int64, count=len(rows))
+                values = list(seg_code)
+            remap = np.fromiter((code_of.setdefault(v, len(code_of)) for v in values), dtype=np.int64, count=len(values))
+            codes[sel] = remap[inv.reshape(-1)]
+        return codes, list(code_of)
+
+# --------------------------------------------------------------------------------------------
+# 온디스크 인덱스 포맷 (v3)
+#   INDEX_DIR/
+#     meta.json                  포맷 버전 / 모델명 / 임베딩 차원 / 행 수 / 행 정규화 여부
+#     matrix.npy                 float32 (N, D) 임베딩 행렬 → np.load(mmap_mode="r") 로 지연 로딩
+#     published.npy              float64 (N,) 발행 시각(epoch 초, 없으면 NaN)
+#     from_seed.npy              bool (N,)
+#     domain_class.npy           uint8 (N,) 도메인 분류 비트 (DOMAIN_* | URL_QUALITY_NEWS, 없으면 열 때 계산)
+#     korean_ratio.npy           float32 (N,) 청크 한글 비율 / url_year.npy int16 (N,) URL 감지 연도 (없으면 0)
+#     kwhash.off.npy/kwhash.npy  청크별 관련성 키워드 해시 집합 (정렬된 uint64) - 없던 인덱스는 후보 행만 계산
+#     chunk.off.npy/chunk.bin    청크 본문 (int64 offset + UTF-8 blob)
+#     chunk.zblk.npy/chunk.zbin  (압축 시 chunk.bin 대신) CHUNK_BLOCK_ROWS 행 단위 zlib 블록, 후보 행의 블록만 풀어 읽음
+#     <field>.ids.npy            url/title/domain 행별 int32 id (한 기사의 청크들은 같은 id 를 공유)
+#     <field>.off.npy/<field>.bin url/title/domain 고유 문자열 테이블 (id 순서, offset + UTF-8 blob)
+#                                (v2 는 url/title/domain 도 행별 문자열 컬럼이었음 - 그대로 읽을 수 있음)
+#     alt_urls.off.npy/.bin      청크별로 합쳐진 중복 기사 URL 목록 ("\n" 구분, 없던 인덱스는 빈 목록으로 읽음)
+#     url_map.npy                URL 해시 → 행 범위 (중복 확인/삭제/재색인용)
+#     kw.vocab.txt/kw.off.npy/kw.post.npy  키워드 역색인: 본문 토큰 → 행 번호 posting (없던 인덱스는 열 때 생성)
+#     kw.tf.npy/kw.len.npy       posting 별 BM25F 가중 tf (제목 가중 포함) / 행별 가중 문서 길이
+#     stats.json                 세그먼트 통계: 도메인별 청크/URL 수, 발행월 히스토그램, 내용 체크섬
+#     manifest.json              (스냅샷 루트) 전체 세그먼트 통계를 삭제분을 빼고 합친 요약 - 인덱스를 열지 않고 조회
+#     tombstones.json            (스냅샷 루트) 세그먼트별 삭제된 행 범위, merge-index 때 실제로 제거
+INDEX_FORMAT_VERSION = 3
+INDEX_READABLE_VERSIONS = (2, 3)
+INDEX_STR_FIELDS = ("url", "title", "domain", "chunk")
+INDEX_INTERNED_FIELDS = ("url", "title", "domain")
+CHUNK_COMPRESS_LEVEL = 0    # 청크 본문 zlib 압축 레벨 (0 = 미압축, build-index --compress-chunks 로 지정)
+CHUNK_BLOCK_ROWS = 64       # 압축 블록당 청크 수
+CHUNK_BLOCK_CACHE = 256     # 프로세스당 캐시할 압축 해제 블록 수
+DOMAIN_CLASS_FILE = "domain_class.npy"
+KOREAN_RATIO_FILE = "korean_ratio.npy"   # 청크 한글 비율 (korean_ratio)
+URL_YEAR_FILE = "url_year.npy"           # URL 에서 감지한 기사 연도 (url_year, 없으면 0)
+KEYWORD_HASH_FIELD = "kwhash"            # 청크 관련성 키워드 해시 집합 (relevance_keyword_hashes)
+ALT_URLS_FIELD = "alt_urls"
+SEGMENT_STATS_FILE = "stats.json"   # 세그먼트별 도메인/발행월 통계 + 체크섬 (manifest 집계용)
+
+def _load_npy(path: str) -> np.ndarray:
+    """npy 파일을 읽기 전용 mmap 으로 연다 (빈 배열은 mmap 불가하므로 일반 로드)"""
+    arr = np.load(path, mmap_mode="r")
+    return arr if arr.size else np.load(path)
+
+def _save_npy_atomic(path: str, arr: np.ndarray):
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+def _persist_derived(seg_dir: str, save: Callable[[str], None]) -> bool:
+    """열 때 만든 파생 파일(URL 맵, 키워드 역색인)을 세그먼트 디렉터리에 저장한다.
+    다른 프로세스는 다시 만들지 않고 같은 파일을 mmap 으로 열어 페이지 캐시를 공유한다. 실패해도 메모리 사본으로 계속."""
+    try:
+        save(seg_dir)
+        return True
+    except OSError as e:
+        logger.warning("파생 인덱스 파일을 저장하지 못해 프로세스 메모리에 둡니다: %s (%s)", seg_dir, e)
+        return False
+
+class StringColumn:
+    """offset 배열 + UTF-8 blob 으로 저장된 문자열 컬럼 (행 단위 지연 디코딩)"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def open(cls, base_path: str) -> "StringColumn":
+        offsets = _load_npy(base_path + ".off.npy")
+        blob_path = base_path + ".bin"
+        if os.path.getsize(blob_path) > 0:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(offsets, blob)
+
+    def __len__(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+class CompressedStringColumn:
+    """CHUNK_BLOCK_ROWS 행씩 zlib 로 압축된 문자열 컬럼. 요청된 행이 속한 블록만 풀고 최근 블록은 캐시."""
+
+    def __init__(self, offsets: np.ndarray, block_offsets: np.ndarray, blob: np.ndarray, block_rows: int):
+        self.offsets = offsets              # 압축 전 기준 (N+1,) offset
+        self.block_offsets = block_offsets  # 압축 블록 (B+1,) offset
+        self.blob = blob
+        self.block_rows = block_rows
+        self._cache = OrderedDict()
+
+    @classmethod
+    def open(cls, base_path: str, block_rows: int) -> "CompressedStringColumn":
+        blob_path = base_path + ".zbin"
+        if os.path.getsize(blob_path) > 0:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(_load_npy(base_path + ".off.npy"), _load_npy(base_path + ".zblk.npy"), blob, block_rows)
+
+    def __len__(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    def _block(self, b: int) -> bytes:
+        data = self._cache.get(b)
+        if data is None:
+            start, end = int(self.block_offsets[b]), int(self.block_offsets[b + 1])
+            data = zlib.decompress(self.blob[start:end].tobytes())
+            self._cache[b] = data
+            if len(self._cache) > CHUNK_BLOCK_CACHE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(b)
+        return data
+
+    def __getitem__(self, i: int) -> str:
+        b = i // self.block_rows
+        base = int(self.offsets[b * self.block_rows])
+        start, end = int(self.offsets[i]) - base, int(self.offsets[i + 1]) - base
+        return self._block(b)[start:end].decode("utf-8")
+
+class InternedColumn:
+    """행별 int32 id + 고유 문자열 테이블로 저장된 문자열 컬럼 (같은 문자열은 한 번만 저장)"""
+
+    def __init__(self, ids: np.ndarray, table: StringColumn):
+        self.ids = ids
+        self.table = table
+
+    @classmethod
+    def open(cls, base_path: str) -> "InternedColumn":
+        return cls(_load_npy(base_path + ".ids.npy"), StringColumn.open(base_path))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> str:
+        return self.table[int(self.ids[i])]
+
+class RecordColumns:
+    """컬럼 파일 위의 DocRecord 시퀀스 뷰. 접근한 행만 DocRecord 로 만든다."""
+
+    def __init__(self, columns: dict, published: np.ndarray, from_seed: np.ndarray,
+                 domain_class: Optional[np.ndarray] = None, korean_ratio: Optional[np.ndarray] = None,
+                 url_year: Optional[np.ndarray] = None, kwhash: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        self.columns = columns
+        self.published = published
+        self.from_seed = from_seed
+        self.domain_class = domain_class
+        self.korean_ratio = korean_ratio
+        self.url_year = url_year
+        self.kwhash = kwhash    # (int64 offset, uint64 해시)
+
+    @classmethod
+    def open(cls, index_dir: str, chunk_block_rows: int = CHUNK_BLOCK_ROWS) -> "RecordColumns":
+        columns = {}
+        for f in INDEX_STR_FIELDS:
+            base_path = os.path.join(index_dir, f)
+            if os.path.exists(base_path + ".ids.npy"):
+                columns[f] = InternedColumn.open(base_path)
+            elif os.path.exists(base_path + ".zblk.npy"):
+                columns[f] = CompressedStringColumn.open(base_path, chunk_block_rows)
+            else:
+                columns[f] = StringColumn.open(base_path)
+        alt_path = os.path.join(index_dir, ALT_URLS_FIELD)
+        if os.path.exists(alt_path + ".off.npy"):
+            columns[ALT_URLS_FIELD] = StringColumn.open(alt_path)
+        published = _load_npy(os.path.join(index_dir, "published.npy"))
+        from_seed = _load_npy(os.path.join(index_dir, "from_seed.npy"))
+        cls_path = os.path.join(index_dir, DOMAIN_CLASS_FILE)
+        domain_class = _load_npy(cls_path) if os.path.exists(cls_path) else None
+        kr_path = os.path.join(index_dir, KOREAN_RATIO_FILE)
+        year_path = os.path.join(index_dir, URL_YEAR_FILE)
+        kwhash_path = os.path.join(index_dir, KEYWORD_HASH_FIELD)
+        kwhash = None
+        if os.path.exists(kwhash_path + ".npy") and os.path.exists(kwhash_path + ".off.npy"):
+            kwhash = (_load_npy(kwhash_path + ".off.npy"), _load_npy(kwhash_path + ".npy"))
+        return cls(columns, published, from_seed, domain_class,
+                   korean_ratio=_load_npy(kr_path) if os.path.exists(kr_path) else None,
+                   url_year=_load_npy(year_path) if os.path.exists(year_path) else None,
+                   kwhash=kwhash)
+
+    def __len__(self) -> int:
+        return len(self.published)
+
+    def __getitem__(self, i) -> DocRecord:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        pub = float(self.published[i])
+        alt = self.columns.get(ALT_URLS_FIELD)
+        alt = alt[i] if alt is not None else ""
+        return DocRecord(
+            url=self.columns["url"][i],
+            title=self.columns["title"][i],
+            published=(None if math.isnan(pub) else pub),
+            chunk=self.columns["chunk"][i],
+            domain=self.columns["domain"][i],
+            from_seed=bool(self.from_seed[i]),
+            alt_urls=tuple(alt.split("\n")) if alt else ()
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def iter_field(self, name: str):
+        col = self.columns.get(name)
+        if isinstance(col, InternedColumn):
+            # 고유 문자열은 한 번만 디코딩
+            cache = {}
+            for sid in col.ids.tolist():
+                value = cache.get(sid)
+                if value is None:
+                    value = cache[sid] = col.table[sid]
+                yield value
+        elif col is not None:
+            for i in range(len(self)):
+                yield col[i]
+        else:
+            for rec in self:
+                yield getattr(rec, name)
+
+# URL 맵: 세그먼트 내 같은 URL 의 연속 청크 구간 [start, stop) 을 URL 해시로 정렬해 저장
+#   url_map.npy  (hash uint64, start int64, stop int64) → 이진 탐색 후 url 컬럼으로 충돌 확인
+BASE_SEGMENT = "base"
+URL_MAP_FILE = "url_map.npy"
+URL_MAP_DTYPE = np.dtype([("hash", "<u8"), ("start", "<i8"), ("stop", "<i8")])
+TOMBSTONE_FILE = "tombstones.json"
+
+def url_key(url: str) -> int:
+    """URL 의 64비트 해시 (프로세스/실행과 무관하게 고정)"""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+class _UrlRunCollector:
+    """행 순서대로 들어오는 URL 에서 같은 URL 의 연속 구간을 모은다."""
+
+    def __init__(self):
+        self.runs = []
+        self.rows = 0
+        self._prev = None
+
+    def add(self, url: str):
+        if not self.runs or url != self._prev:
+            self.runs.append((url_key(url), self.rows, self.rows + 1))
+            self._prev = url
+        else:
+            h, a, _ = self.runs[-1]
+            self.runs[-1] = (h, a, self.rows + 1)
+        self.rows += 1
+
+    def table(self) -> np.ndarray:
+        table = np.array(self.runs, dtype=URL_MAP_DTYPE)
+        return table[np.argsort(table["hash"], kind="stable")]
+
+class UrlMap:
+    """URL → 세그먼트 내 행 범위 맵"""
+
+    def __init__(self, table: np.ndarray, records):
+        self.table = table
+        self.records = records
+
+    @classmethod
+    def build(cls, records) -> "UrlMap":
+        collector = _UrlRunCollector()
+        if isinstance(records, RecordColumns):
+            for url in records.iter_field("url"):
+                collector.add(url)
+        else:
+            for rec in records:
+                collector.add(rec.url)
+        return cls(collector.table(), records)
+
+    @classmethod
+    def open(cls, seg_dir: Optional[str], records) -> "UrlMap":
+        path = os.path.join(seg_dir, URL_MAP_FILE) if seg_dir else None
+        if path and os.path.exists(path):
+            return cls(_load_npy(path), records)
+        if seg_dir:
+            logger.info("URL 맵이 없어 URL 컬럼으로 생성합니다: %s", seg_dir)
+        urls = cls.build(records)
+        if seg_dir and _persist_derived(seg_dir, lambda d: _save_npy_atomic(os.path.join(d, URL_MAP_FILE), urls.table)):
+            urls = cls(_load_npy(path), records)
+        return urls
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _url_at(self, i: int) -> str:
+        if isinstance(self.records, RecordColumns):
+            return self.records.columns["url"][i]
+        return self.records[i].url
+
+    def lookup(self, url: str) -> List[Tuple[int, int]]:
+        """URL 의 세그먼트 내 행 범위 목록 (없으면 빈 리스트)"""
+        hashes = self.table["hash"]
+        h = np.uint64(url_key(url))
+        lo = int(np.searchsorted(hashes, h, side="left"))
+        hi = int(np.searchsorted(hashes, h, side="right"))
+        out = []
+        for j in range(lo, hi):
+            a, b = int(self.table["start"][j]), int(self.table["stop"][j])
+            if self._url_at(a) == url:
+                out.append((a, b))
+        return out
+
+    def iter_ranges(self):
+        """(대표 URL, start, stop) 를 URL 구간마다 반환 (레코드 전체를 읽지 않음)"""
+        for a, b in zip(self.table["start"].tolist(), self.table["stop"].tolist()):
+            yield self._url_at(a), a, b
+
+# 키워드 역색인: 청크 본문(소문자)의 한글 2자 이상 / 영문·숫자 2자 이상 토큰 → 세그먼트 내 행 번호 posting list
+#   kw.vocab.txt   정렬된 토큰 ("\n" 구분) - 키워드를 포함하는 토큰을 부분 문자열 검색으로 찾음 (조사가 붙은 토큰 포함)
+#   kw.vstart.npy  int64 (V+1,) 토큰별 kw.vocab.txt 내 바이트 위치
+#   kw.off.npy     int64 (V+1,) 토큰별 posting 구간
+#   kw.post.npy    int32 토큰별 행 번호 (오름차순)
+#   kw.tf.npy      float32 posting 별 BM25F 가중 단어 빈도 (본문 tf + BM25_TITLE_WEIGHT × 제목 tf)
+#   kw.len.npy     float32 (N,) 행별 BM25F 가중 문서 길이 (토큰 수)
+KEYWORD_TOKEN_RE = re.compile(r"[가-힣]{2,}|[a-z0-9]{2,}")
+KEYWORD_INDEX_FILES = ("kw.vocab.txt", "kw.vstart.npy", "kw.off.npy", "kw.post.npy", "kw.tf.npy", "kw.len.npy")
+BM25_TITLE_WEIGHT = 2.0     # BM25F 제목 필드 가중치 (빌드 시 tf/문서 길이에 반영)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+class _KeywordPostingCollector:
+    """행 순서대로 들어오는 청크 본문/제목에서 토큰 → (행 번호, 가중 tf) posting 을 모은다."""
+
+    def __init__(self):
+        self.token_ids = {}
+        self.tokens = array.array("i")
+        self.rows = array.array("i")
+        self.tf = array.array("f")
+        self.lengths = array.array("f")
+        self._title = (None, None)   # 같은 기사의 청크들은 제목이 같으므로 직전 제목 토큰을 재사용
+
+    def add(self, chunk: str, title: str = ""):
+        body = KEYWORD_TOKEN_RE.findall((chunk or "").lower())
+        if self._title[0] != title:
+            self._title = (title, KEYWORD_TOKEN_RE.findall((title or "").lower()))
+        head = self._title[1]
+        counts = {}
+        for tok in body:
+            counts[tok] = counts.get(tok, 0.0) + 1.0
+        for tok in head:
+            counts[tok] = counts.get(tok, 0.0) + BM25_TITLE_WEIGHT
+        row = len(self.lengths)
+        for tok, c in counts.items():
+            tid = self.token_ids.get(tok)
+            if tid is None:
+                tid = self.token_ids[tok] = len(self.token_ids)
+            self.tokens.append(tid)
+            self.rows.append(row)
+            self.tf.append(c)
+        self.lengths.append(len(body) + BM25_TITLE_WEIGHT * len(head))
+
+    def build(self) -> "KeywordIndex":
+        vocab = sorted(self.token_ids)
+        rank = np.empty(len(vocab), dtype=np.int32)   # 등장 순서 id → 정렬 순서 id
+        for i, tok in enumerate(vocab):
+            rank[self.token_ids[tok]] = i
+        tokens = rank[np.frombuffer(self.tokens, dtype=np.int32)] if len(self.tokens) else np.zeros(0, dtype=np.int32)
+        order = np.argsort(tokens, kind="stable")   # 행은 이미 오름차순이므로 토큰 내에서도 오름차순 유지
+        postings = np.frombuffer(self.rows, dtype=np.int32)[order] if len(self.rows) else np.zeros(0, dtype=np.int32)
+        tf = np.frombuffer(self.tf, dtype=np.float32)[order] if len(self.tf) else np.zeros(0, dtype=np.float32)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tokens, minlength=len(vocab)), out=offsets[1:])
+        lengths = np.frombuffer(self.lengths, dtype=np.float32).copy() if len(self.lengths) else np.zeros(0, dtype=np.float32)
+        encoded = [tok.encode("utf-8") for tok in vocab]
+        starts = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) + 1 for b in encoded], out=starts[1:])
+        return KeywordIndex(b"\n".join(encoded), starts, offsets, postings, tf, lengths)
+
+class KeywordIndex:
+    """세그먼트의 키워드 역색인 (토큰 → 행 번호, BM25F tf). vocab 은 UTF-8 바이트 (디스크에서 열면 읽기 전용 mmap)."""
+
+    def __init__(self, vocab, starts: np.ndarray, offsets: np.ndarray, postings: np.ndarray, tf: np.ndarray,
+                 lengths: np.ndarray):
+        self.vocab = vocab          # "\n" 구분 토큰 바이트 (bytes 또는 mmap)
+        self.starts = starts        # int64 (V+1,) 토큰별 vocab 내 바이트 위치 (마지막은 끝 + 1)
+        self.offsets = offsets
+        self.postings = postings
+        self.tf = tf
+        self.lengths = lengths
+        self.total_length = float(np.asarray(lengths, dtype=np.float64).sum())
+
+    @classmethod
+    def build(cls, records) -> "KeywordIndex":
+        collector = _KeywordPostingCollector()
+        if isinstance(records, RecordColumns):
+            for chunk, title in zip(records.iter_field("chunk"), records.iter_field("title")):
+                collector.add(chunk, title)
+        else:
+            for r in records:
+                collector.add(r.chunk, r.title)
+        return collector.build()
+
+    @classmethod
+    def load(cls, seg_dir: str) -> Optional["KeywordIndex"]:
+        paths = [os.path.join(seg_dir, f) for f in KEYWORD_INDEX_FILES]
+        if not all(os.path.exists(p) for p in paths):
+            return None
+        vocab = b""
+        if os.path.getsize(paths[0]) > 0:
+            with open(paths[0], "rb") as f:
+                vocab = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(vocab, *(_load_npy(p) for p in paths[1:]))
+
+    @classmethod
+    def open(cls, seg_dir: Optional[str], records) -> "KeywordIndex":
+        kw = cls.load(seg_dir) if seg_dir else None
+        if kw is not None:
+            return kw
+        if seg_dir:
+            logger.info("키워드 역색인이 없어 청크 본문으로 생성합니다: %s", seg_dir)
+        kw = cls.build(records)
+        if seg_dir and _persist_derived(seg_dir, kw.save):
+            kw = cls.load(seg_dir) or kw
+        return kw
+
+    def save(self, seg_dir: str):
+        tmp = os.path.join(seg_dir, f"{KEYWORD_INDEX_FILES[0]}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(self.vocab)
+        os.replace(tmp, os.path.join(seg_dir, KEYWORD_INDEX_FILES[0]))
+        for name, arr in zip(KEYWORD_INDEX_FILES[1:], (self.starts, self.offsets, self.postings, self.tf, self.lengths)):
+            _save_npy_atomic(os.path.join(seg_dir, name), arr)
+
+    def _token(self, t: int) -> bytes:
+        return self.vocab[self.starts[t]:self.starts[t + 1] - 1]
+
+    def term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """term 으로 시작하는 토큰(조사/어미가 붙은 형태)들의 (행 번호, 합산 tf) - BM25 용"""
+        n = len(self.starts) - 1
+        key = term.encode("utf-8")   # UTF-8 바이트 순서 = 코드 포인트 순서이므로 정렬된 vocab 그대로 이진 탐색
+        lo = bisect.bisect_left(range(n), key, key=self._token)
+        hi = bisect.bisect_left(range(n), key + b"\xff", key=self._token)
+        if lo >= hi:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        a, b = int(self.offsets[lo]), int(self.offsets[hi])   # 정렬된 토큰 구간이므로 posting 도 연속 구간
+        rows, inv = np.unique(self.postings[a:b], return_inverse=True)
+        return rows, np.bincount(inv, weights=self.tf[a:b]).astype(np.float32)
+
+    def _rows_of_token_run(self, run: str) -> np.ndarray:
+        """run 을 부분 문자열로 포함하는 모든 토큰의 posting 합집합"""
+        pos = [m.start() for m in re.finditer(re.escape(run.encode("utf-8")), self.vocab)]
+        if not pos:
+            return np.zeros(0, dtype=np.int32)
+        tids = np.unique(np.searchsorted(self.starts, np.asarray(pos, dtype=np.int64), side="right") - 1)
+        return np.unique(np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in tids.tolist()]))
+
+    def candidate_rows(self, keyword: str) -> Optional[np.ndarray]:
+        """keyword 가 (소문자 본문에) 부분 문자열로 들어 있을 수 있는 행 번호 (상위 집합, 확인은 호출 측에서).
+        2자 이상 토큰이 하나도 없는 키워드는 색인으로 거를 수 없으므로 None."""
+        runs = KEYWORD_TOKEN_RE.findall(keyword.lower())
+        if not runs:
+            return None
+        rows = None
+        for run in sorted(set(runs), key=len, reverse=True):   # 긴 토큰부터 교집합 (posting 이 작음)
+            hit = self._rows_of_token_run(run)
+            rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+def read_tombstones(index_dir: str) -> Dict[str, List[List[int]]]:
+    path = os.path.join(index_dir, TOMBSTONE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_tombstones(index_dir: str, tombstones: Dict[str, List[List[int]]]):
+    path = os.path.join(index_dir, TOMBSTONE_FILE)
+    tombstones = {k: v for k, v in tombstones.items() if v}
+    if not tombstones:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(tombstones, f)
+    os.replace(path + ".tmp", path)
+
+def _write_json_atomic(path: str, obj):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+def _published_histogram(published: np.ndarray) -> Tuple[Dict[str, int], int]:
+    """발행 시각 배열 → ({"YYYY-MM": 청크 수}, 발행일 없는 청크 수)"""
+    published = np.asarray(published, dtype=np.float64)
+    known = ~np.isnan(published)
+    months, counts = np.unique(published[known].astype("datetime64[s]").astype("datetime64[M]"), return_counts=True)
+    return {str(m): int(c) for m, c in zip(months, counts)}, int((~known).sum())
+
+def _segment_stats_dict(domain_stats: Dict[str, List[int]], published: np.ndarray, checksum: str) -> dict:
+    hist, unknown = _published_histogram(published)
+    return {"rows": int(len(published)), "checksum": checksum, "domains": domain_stats,
+            "published_hist": hist, "unknown_published": unknown}
+
+def write_index_dir(index_dir: str, model_name: str, matrix, records: Iterable[DocRecord],
+                    embed_dim: Optional[int] = None, compress_level: Optional[int] = None):
+    """행렬과 레코드를 v3 온디스크 포맷으로 기록합니다.
+    matrix 로 행렬 블록 리스트를 넘기면 전체를 메모리에 올리지 않고 순서대로 이어 기록한다.
+    행이 없는 행렬([], 빈 블록 리스트 등)은 (0, embed_dim) 으로 기록하므로 그럴 수 있는 호출자는 embed_dim 을 넘긴다.
+    compress_level > 0 이면 청크 본문을 블록 단위 zlib 으로 압축한다 (None 이면 CHUNK_COMPRESS_LEVEL)."""
+    if compress_level is None:
+        compress_level = CHUNK_COMPRESS_LEVEL
+    os.makedirs(index_dir, exist_ok=True)
+    matrix_path = os.path.join(index_dir, "matrix.npy")
+    if isinstance(matrix, (list, tuple)):
+        blocks = [b for b in matrix if b.shape[0] > 0]
+        if blocks:
+            embed_dim = blocks[0].shape[1]
+        elif embed_dim is None:
+            raise ValueError("빈 행렬 블록 리스트에는 embed_dim 이 필요합니다")
+        rows = sum(b.shape[0] for b in blocks)
+        M = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32, shape=(rows, embed_dim))
+        pos = 0
+        for b in blocks:
+            M[pos:pos + b.shape[0]] = b
+            pos += b.shape[0]
+        M.flush()
+    else:
+        M = np.ascontiguousarray(matrix, dtype=np.float32)
+        if M.ndim != 2:
+            if M.size or embed_dim is None:
+                raise ValueError(f"임베딩 행렬은 2차원이어야 합니다 (shape={M.shape}, embed_dim={embed_dim})")
+            M = M.reshape(0, embed_dim)
+        np.save(matrix_path, M)
+
+    digest = hashlib.blake2b(digest_size=16)   # 세그먼트 내용 체크섬 (행렬 + 레코드)
+    normalized = True                          # 모든 행이 단위 벡터면 검색 시 행 노름 계산을 생략
+    for pos in range(0, M.shape[0], ANN_ADD_BLOCK):
+        blk = np.ascontiguousarray(M[pos:pos + ANN_ADD_BLOCK])
+        digest.update(blk.tobytes())
+        if normalized and blk.size and np.abs(np.linalg.norm(blk, axis=1) - 1.0).max() > 1e-3:
+            normalized = False
+    published, from_seed, domain_class = [], [], []
+    kr_ratio, year_col = [], []
+    kwhash_vals = [np.zeros(0, dtype=np.uint64)]
+    kwhash_off = [0]
+    class_of_url = {}   # 같은 기사의 청크들은 URL 이 같으므로 분류/연도는 URL 당 한 번
+    year_of_url = {}
+    domain_stats = {}   # 도메인 → [청크 수, URL 수] (stats.json)
+    url_runs = _UrlRunCollector()
+    keyword_postings = _KeywordPostingCollector()
+    offsets = {f: [0] for f in INDEX_STR_FIELDS}
+    interned = {f: {} for f in INDEX_INTERNED_FIELDS}   # 문자열 → id
+    ids = {f: [] for f in INDEX_INTERNED_FIELDS}
+    blobs = {f: open(os.path.join(index_dir, f + ".bin"), "wb") for f in INDEX_STR_FIELDS if not (f == "chunk" and compress_level)}
+    blobs[ALT_URLS_FIELD] = open(os.path.join(index_dir, ALT_URLS_FIELD + ".bin"), "wb")
+    alt_offsets = [0]
+    if compress_level:
+        blobs["chunk"] = open(os.path.join(index_dir, "chunk.zbin"), "wb")
+    chunk_block, chunk_blocks = [], [0]
+
+    def flush_chunk_block():
+        z = zlib.compress(b"".join(chunk_block), compress_level)
+        blobs["chunk"].write(z)
+        chunk_blocks.append(chunk_blocks[-1] + len(z))
+        chunk_block.clear()
+
+    try:
+        for rec in records:
+            published.append(rec.published if rec.published is not None else np.nan)
+            from_seed.append(bool(rec.from_seed))
+            url = rec.url or ""
+            bits = class_of_url.get(url)
+            if bits is None:
+                bits = class_of_url[url] = domain_class_bits(url)
+                domain_stats.setdefault(domain_of(url), [0, 0])[1] += 1
+            domain_stats[domain_of(url)][0] += 1
+            domain_class.append(bits)
+            year = year_of_url.get(url)
+            if year is None:
+                year = year_of_url[url] = url_year(url) or 0
+            year_col.append(year)
+            kr_ratio.append(korean_ratio(rec.chunk or ""))
+            hashes = relevance_keyword_hashes(rec.chunk or "")
+            kwhash_vals.append(hashes)
+            kwhash_off.append(kwhash_off[-1] + len(hashes))
+            url_runs.add(url)
+            keyword_postings.add(rec.chunk, rec.title)
+            digest.update(repr((published[-1], from_seed[-1])).encode("ascii"))
+            alt = "\n".join(getattr(rec, "alt_urls", ())).encode("utf-8")
+            blobs[ALT_URLS_FIELD].write(alt)
+            alt_offsets.append(alt_offsets[-1] + len(alt))
+            for f in INDEX_STR_FIELDS:
+                value = getattr(rec, f) or ""
+                if f in interned:
+                    sid = interned[f].get(value)
+                    if sid is not None:
+                        ids[f].append(sid)
+                        continue
+                    sid = interned[f][value] = len(interned[f])
+                    ids[f].append(sid)
+                b = value.encode("utf-8")
+                digest.update(b + b"\0")
+                offsets[f].append(offsets[f][-1] + len(b))
+                if f == "chunk" and compress_level:
+                    chunk_block.append(b)
+                    if len(chunk_block) == CHUNK_BLOCK_ROWS:
+                        flush_chunk_block()
+                else:
+                    blobs[f].write(b)
+        if compress_level and chunk_block:
+            flush_chunk_block()
+    finally:
+        for fh in blobs.values():
+            fh.close()
+
+    if len(published) != M.shape[0]:
+        raise ValueError(f"행렬/레코드 행 수 불일치: matrix={M.shape[0]}, records={len(published)}")
+    for f in INDEX_STR_FIELDS:
+        np.save(os.path.join(index_dir, f + ".off.npy"), np.asarray(offsets[f], dtype=np.int64))
+    for f in INDEX_INTERNED_FIELDS:
+        np.save(os.path.join(index_dir, f + ".ids.npy"), np.asarray(ids[f], dtype=np.int32))
+    np.save(os.path.join(index_dir, ALT_URLS_FIELD + ".off.npy"), np.asarray(alt_offsets, dtype=np.int64))
+    if compress_level:
+        np.save(os.path.join(index_dir, "chunk.zblk.npy"), np.asarray(chunk_blocks, dtype=np.int64))
+    np.save(os.path.join(index_dir, "published.npy"), np.asarray(published, dtype=np.float64))
+    np.save(os.path.join(index_dir, "from_seed.npy"), np.asarray(from_seed, dtype=bool))
+    np.save(os.path.join(index_dir, DOMAIN_CLASS_FILE), np.asarray(domain_class, dtype=np.uint8))
+    np.save(os.path.join(index_dir, KOREAN_RATIO_FILE), np.asarray(kr_ratio, dtype=np.float32))
+    np.save(os.path.join(index_dir, URL_YEAR_FILE), np.asarray(year_col, dtype=np.int16))
+    np.save(os.path.join(index_dir, KEYWORD_HASH_FIELD + ".off.npy"), np.asarray(kwhash_off, dtype=np.int64))
+    np.save(os.path.join(index_dir, KEYWORD_HASH_FIELD + ".npy"), np.concatenate(kwhash_vals))
+    np.save(os.path.join(index_dir, URL_MAP_FILE), url_runs.table())
+    keyword_postings.build().save(index_dir)
+    _write_json_atomic(os.path.join(index_dir, SEGMENT_STATS_FILE),
+                       _segment_stats_dict(domain_stats, np.asarray(published, dtype=np.float64), digest.hexdigest()))
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "model_name": model_name,
+        "embed_dim": int(M.shape[1]),
+        "rows": int(M.shape[0]),
+        "chunk_compress_level": int(compress_level),
+        "chunk_block_rows": CHUNK_BLOCK_ROWS,
+        "normalized": normalized,
+        "created": now_utc().isoformat(),
+    }
+    # meta.json 은 마지막에 기록 (meta 가 있으면 나머지 파일이 완성된 상태)
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+def read_index_meta(index_dir: str) -> dict:
+    with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format_version") not in INDEX_READABLE_VERSIONS:
+        raise RuntimeError(f"지원하지 않는 인덱스 포맷 버전: {meta.get('format_version')} (필요: {INDEX_READABLE_VERSIONS})")
+    return meta
+
+def _open_segments(root: str, prefix: str = "") -> List[IndexSegment]:
+    """root 아래의 세그먼트 디렉터리들을 이름 순서로 연다 (meta.json 이 없는 미완성 디렉터리는 무시)."""
+    segments = []
+    if not os.path.isdir(root):
+        return segments
+    for name in sorted(os.listdir(root)):
+        seg_dir = os.path.join(root, name)
+        if not os.path.exists(os.path.join(seg_dir, "meta.json")):
+            continue
+        seg_meta = read_index_meta(seg_dir)
+        segments.append(IndexSegment(
+            name=prefix + name,
+            matrix=_load_npy(os.path.join(seg_dir, "matrix.npy")),
+            records=RecordColumns.open(seg_dir, seg_meta.get("chunk_block_rows", CHUNK_BLOCK_ROWS)),
+            path=seg_dir,
+            normalized=bool(seg_meta.get("normalized", False))
+        ))
+    return segments
+
+def open_index_dir(index_dir: str) -> IndexPack:
+    """온디스크 인덱스(v2/v3)를 mmap 으로 연다 (행렬/컬럼은 접근 시 페이지 단위로 로딩).
+    shards/ 아래 샤드와 deltas/ 아래의 delta 세그먼트도 이름(생성 순) 순서로 함께 연다."""
+    meta = read_index_meta(index_dir)
+    shards = _open_segments(os.path.join(index_dir, "shards"), prefix="shards/")
+    deltas = _open_segments(os.path.join(index_dir, "deltas"))
+    return IndexPack(
+        model_name=meta["model_name"],
+        embed_dim=meta["embed_dim"],
+        matrix=_load_npy(os.path.join(index_dir, "matrix.npy")),
+        records=RecordColumns.open(index_dir, meta.get("chunk_block_rows", CHUNK_BLOCK_ROWS)),
+        deltas=deltas,
+        shards=shards,
+        index_dir=index_dir,
+        deleted=read_tombstones(index_dir),
+        normalized=bool(meta.get("normalized", False))
+    )
+
+INDEX_LOCK_STALE_SEC = 600  # 이보다 오래된 잠금 파일은 비정상 종료로 보고 제거
+
+@contextmanager
+def index_file_lock(lock_path: str, timeout: float = 60.0):
+    """O_EXCL 잠금 파일 기반 프로세스 간 잠금 (timeout=0 이면 즉시 TimeoutError)"""
+    t0 = time.time()
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > INDEX_LOCK_STALE_SEC:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                pass
+            if time.time() - t0 >= timeout:
+                raise TimeoutError(f"인덱스 잠금 획득 실패: {lock_path}")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        yield
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+# --------------------------------------------------------------------------------------------
+# 버전별 인덱스 스냅샷 - 전체 재작성(빌드/병합/정리/샤드 교체)은 새 버전 디렉터리로 공개
+#   INDEX_DIR/
+#     CURRENT                    현재 버전 이름 (임시 파일 기록 후 os.replace 로 원자적 교체)
+#     versions/<버전>/           스냅샷 (위의 v3 포맷 디렉터리, 공개 후에는 delta 추가/삭제 기록 외에는 변경 없음)
+#     readers/<버전>.<pid>.<n>   리더 lease - 버전을 연 프로세스가 닫을 때까지 보유 (오래된 lease 는 무시)
+#   CURRENT 가 없으면 INDEX_DIR 자체가 인덱스인 이전 레이아웃으로 읽는다 (다음 공개 때 versions/ 로 전환).
+#   공개 후 lease 가 없는 이전 버전은 gc_index_versions 가 지운다.
+INDEX_CURRENT_FILE = index_manifest.INDEX_CURRENT_FILE
+INDEX_VERSIONS_DIR = index_manifest.INDEX_VERSIONS_DIR
+INDEX_READERS_DIR = "readers"
+LEGACY_VERSION = index_manifest.LEGACY_VERSION   # CURRENT 이전 레이아웃(INDEX_DIR 바로 아래 인덱스)의 버전 이름
+INDEX_LEASE_STALE_SEC = 6 * 3600    # 이보다 오래 갱신되지 않은 lease 는 비정상 종료로 보고 무시
+_LEASE_SEQ = iter(range(1, 1 << 62))
+
+def read_current_version(root: Optional[str] = None) -> Optional[str]:
+    """CURRENT 가 가리키는 버전 이름 (이전 레이아웃이면 None)"""
+    return index_manifest.read_current_version(root or INDEX_DIR)
+
+def version_dir(version: str, root: Optional[str] = None) -> str:
+    root = root or INDEX_DIR
+    return root if version == LEGACY_VERSION else os.path.join(root, INDEX_VERSIONS_DIR, version)
+
+def current_index_dir(root: Optional[str] = None) -> str:
+    """현재 공개된 인덱스 스냅샷 디렉터리"""
+    return version_dir(read_current_version(root) or LEGACY_VERSION, root)
+
+def _link_tree(src: str, dst: str, skip: Iterable[str] = ()):
+    """src 의 파일들을 dst 에 하드링크로 복제 (링크 불가 시 복사). skip 은 src 기준 상대 경로."""
+    skip = {os.path.normpath(p) for p in skip}
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = os.path.relpath(dirpath, src)
+        dirnames[:] = [d for d in dirnames if os.path.normpath(os.path.join(rel, d)) not in skip]
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+        for name in filenames:
+            if os.path.normpath(os.path.join(rel, name)) in skip:
+                continue
+            s_path, d_path = os.path.join(dirpath, name), os.path.join(dst, rel, name)
+            try:
+                os.link(s_path, d_path)
+            except OSError:
+                shutil.copy2(s_path, d_path)
+
+def publish_index_version(tmp_dir: str, root: Optional[str] = None) -> str:
+    """tmp_dir 에 완성된 인덱스를 새 버전으로 공개합니다 (호출자가 root + ".lock" 을 잡고 있어야 함).
+    디렉터리를 versions/ 아래로 rename 한 뒤 CURRENT 를 원자적으로 바꾼다. 새 버전 이름을 반환."""
+    root = root or INDEX_DIR
+    version = f"{time.time_ns():020d}-{os.getpid()}"
+    write_index_manifest(tmp_dir, version)
+    os.makedirs(os.path.join(root, INDEX_VERSIONS_DIR), exist_ok=True)
+    os.replace(tmp_dir, version_dir(version, root))
+    current_path = os.path.join(root, INDEX_CURRENT_FILE)
+    with open(current_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_path + ".tmp", current_path)
+    logger.info("인덱스 버전 공개: %s", version)
+    return version
+
+def _acquire_reader_lease(version: str, root: Optional[str] = None) -> Optional[str]:
+    leases = os.path.join(root or INDEX_DIR, INDEX_READERS_DIR)
+    path = os.path.join(leases, f"{version}.{os.getpid()}.{next(_LEASE_SEQ)}")
+    try:
+        os.makedirs(leases, exist_ok=True)
+        with open(path, "w"):
+            pass
+    except OSError as e:
+        logger.warning(f"리더 lease 생성 실패 (버전 GC 보호 없음): {e}")
+        return None
+    return path
+
+def _release_reader_lease(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _live_leases(root: str) -> Dict[str, int]:
+    """버전별 유효 lease 수 (오래된 lease 파일은 지운다)"""
+    counts = {}
+    leases = os.path.join(root, INDEX_READERS_DIR)
+    if not os.path.isdir(leases):
+        return counts
+    now = time.time()
+    for name in os.listdir(leases):
+        path = os.path.join(leases, name)
+        try:
+            if now - os.path.getmtime(path) > INDEX_LEASE_STALE_SEC:
+                os.remove(path)
+                continue
+        except OSError:
+            continue
+        version = name.split(".", 1)[0]
+        counts[version] = counts.get(version, 0) + 1
+    return counts
+
+def gc_index_versions(root: Optional[str] = None) -> List[str]:
+    """현재 버전이 아니고 lease 가 없는 버전(과 이전 레이아웃 파일)을 지웁니다. 지운 버전 목록을 반환."""
+    root = root or INDEX_DIR
+    current = read_current_version(root)
+    if current is None:
+        return []
+    held = _live_leases(root)
+    removed = []
+    versions_root = os.path.join(root, INDEX_VERSIONS_DIR)
+    for version in sorted(os.listdir(versions_root)) if os.path.isdir(versions_root) else []:
+        if version == current or held.get(version):
+            continue
+        shutil.rmtree(os.path.join(versions_root, version), ignore_errors=True)
+        if not os.path.exists(os.path.join(versions_root, version)):
+            removed.append(version)
+    # versions/ 로 전환되기 전 레이아웃의 파일들
+    if not held.get(LEGACY_VERSION) and os.path.exists(os.path.join(root, "meta.json")):
+        for name in os.listdir(root):
+            if name in (INDEX_CURRENT_FILE, INDEX_VERSIONS_DIR, INDEX_READERS_DIR):
+                continue
+            path = os.path.join(root, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+        removed.append(LEGACY_VERSION)
+    if removed:
+        logger.info("이전 인덱스 버전 정리: %s", ", ".join(removed))
+    return removed
+
+def _index_stamp(index_dir: str, version: str) -> tuple:
+    """버전 + delta 목록 + tombstone 수정 시각 (다른 프로세스의 URL 추가/삭제 감지용)"""
+    delta_root = os.path.join(index_dir, "deltas")
+    deltas = tuple(sorted(os.listdir(delta_root))) if os.path.isdir(delta_root) else ()
+    try:
+        tomb_mtime = os.path.getmtime(os.path.join(index_dir, TOMBSTONE_FILE))
+    except OSError:
+        tomb_mtime = None
+    return (version, deltas, tomb_mtime)
+
+def refresh_index(pack: IndexPack) -> IndexPack:
+    """새 버전이 공개되었거나 delta/삭제 기록이 바뀌었으면 새로 연 pack 을, 아니면 그대로 반환합니다.
+    이전 pack 은 참조가 모두 사라질 때 lease 가 풀려 다음 GC 때 지워진다."""
+    if pack.version is None:
+        return pack
+    version = read_current_version() or LEGACY_VERSION
+    if version == pack.version and _index_stamp(pack.index_dir, version) == pack.stamp:
+        if pack.lease:
+            try:
+                os.utime(pack.lease)
+            except OSError:
+                pass
+        return pack
+    return load_index()
+
+_INDEX_CACHE: Optional[IndexPack] = None
+
+def get_index() -> IndexPack:
+    """장기 실행 프로세스(API 서버)용: 열어 둔 인덱스를 재사용하고, 새 버전이 공개되면 다음 호출 때 교체합니다."""
+    global _INDEX_CACHE
+    if _INDEX_CACHE is None:
+        _INDEX_CACHE = load_index()
+        return _INDEX_CACHE
+    old_version = _INDEX_CACHE.version
+    pack = _INDEX_CACHE = refresh_index(_INDEX_CACHE)
+    if pack.version != old_version:
+        # 이전 버전을 다른 요청이 아직 쓰고 있으면 lease 가 남아 있어 지워지지 않는다
+        gc_index_versions()
+    return pack
+
+INDEX_WARM_READ = 8 << 20   # warm_index 가 파일을 읽는 단위 (바이트)
+
+def warm_index(pack: Optional[IndexPack] = None) -> Tuple[int, int]:
+    """여러 평가 워커가 한 인덱스를 공유하도록 준비합니다 (워커를 띄우기 전 로더 프로세스에서 1회).
+    1) 세그먼트마다 열 때 만드는 파생 파일(URL 맵, 키워드 역색인)이 없으면 만들어 스냅샷에 저장하고
+    2) 스냅샷의 모든 파일을 한 번 읽어 OS 페이지 캐시에 올린다.
+    인덱스는 전부 읽기 전용 mmap 으로 열리므로 이후 워커들은 복사 없이 같은 물리 페이지를 공유한다.
+    반환: (파일 수, 바이트 수)"""
+    pack = pack or load_index()
+    for name, _, _, records in pack.iter_named_segments():
+        if len(records):
+            pack.url_map(name)
+            pack.keyword_index(name, records)
+    files = total = 0
+    buf = bytearray(INDEX_WARM_READ)
+    for dirpath, _, filenames in os.walk(pack.index_dir):
+        for fname in filenames:
+            try:
+                with open(os.path.join(dirpath, fname), "rb", buffering=0) as f:
+                    while True:
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        total += n
+            except OSError:
+                continue
+            files += 1
+    logger.info("인덱스 %s: 파일 %d개, %.1f MB 를 페이지 캐시에 올림", pack.version, files, total / 1e6)
+    return files, total
+
+# --------------------------------------------------------------------------------------------
+# 인덱스 manifest - 스냅샷 루트의 manifest.json (check-domains, /health 가 인덱스를 열지 않고 읽음)
+#   읽기는 index_manifest.py (API 서버의 헬스체크는 그쪽의 index_health 만 사용 - 읽기 전용).
+#   세그먼트별 stats.json 을 합치고 tombstone 된 행만 세그먼트에서 읽어 뺀다.
+#   새 버전 공개, delta 추가, URL 삭제 때마다 (인덱스 잠금 하에서) 다시 기록된다.
+INDEX_MANIFEST_FILE = index_manifest.INDEX_MANIFEST_FILE
+
+def _segment_dirs(index_dir: str) -> List[Tuple[str, str]]:
+    """(세그먼트명, 디렉터리) 를 base → shard → delta 순으로 (meta.json 이 있는 것만)"""
+    out = [(BASE_SEGMENT, index_dir)]
+    for sub, prefix in (("shards", "shards/"), ("deltas", "")):
+        root = os.path.join(index_dir, sub)
+        if os.path.isdir(root):
+            for name in sorted(os.listdir(root)):
+                if os.path.exists(os.path.join(root, name, "meta.json")):
+                    out.append((prefix + name, os.path.join(root, name)))
+    return out
+
+def _segment_stats(seg_dir: str) -> dict:
+    """세그먼트 stats.json (없던 이전 세그먼트는 레코드 컬럼으로 한 번 계산해 기록)"""
+    path = os.path.join(seg_dir, SEGMENT_STATS_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    records = RecordColumns.open(seg_dir)
+    domain_stats, seen = {}, set()
+    for url in records.iter_field("url"):
+        d = domain_stats.setdefault(domain_of(url), [0, 0])
+        d[0] += 1
+        if url not in seen:
+            seen.add(url)
+            d[1] += 1
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("matrix.npy", "url.ids.npy", "url.bin", "chunk.off.npy", "published.npy"):
+        p = os.path.join(seg_dir, name)
+        if os.path.exists(p):
+            with open(p, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    stats = _segment_stats_dict(domain_stats, np.asarray(records.published), digest.hexdigest())
+    try:
+        _write_json_atomic(path, stats)
+    except OSError:
+        pass
+    return stats
+
+def write_index_manifest(index_dir: str, version: Optional[str] = None) -> dict:
+    """index_dir 스냅샷의 manifest.json 을 다시 계산해 기록합니다 (삭제된 행은 통계에서 뺌)."""
+    meta = read_index_meta(index_dir)
+    tombstones = read_tombstones(index_dir)
+    domains, hist = {}, {}
+    rows = deleted_rows = unknown = 0
+    digest = hashlib.blake2b(digest_size=16)
+    segments = _segment_dirs(index_dir)
+    for name, seg_dir in segments:
+        stats = _segment_stats(seg_dir)
+        digest.update(f"{name}:{stats['checksum']};".encode("utf-8"))
+        rows += stats["rows"]
+        unknown += stats["unknown_published"]
+        for d, (chunks, urls) in stats["domains"].items():
+            agg = domains.setdefault(d, {"chunks": 0, "urls": 0})
+            agg["chunks"] += chunks
+            agg["urls"] += urls
+        for month, count in stats["published_hist"].items():
+            hist[month] = hist.get(month, 0) + count
+        ranges = tombstones.get(name)
+        if not ranges:
+            continue
+        # 삭제 구간은 URL 하나의 청크 구간이므로 URL 수는 구간당 1 씩 뺀다
+        records = RecordColumns.open(seg_dir)
+        for a, b in ranges:
+            agg = domains.get(domain_of(records.columns["url"][a]))
+            if agg:
+                agg["chunks"] -= b - a
+                agg["urls"] -= 1
+            del_hist, del_unknown = _published_histogram(np.asarray(records.published[a:b]))
+            for month, count in del_hist.items():
+                hist[month] = hist.get(month, 0) - count
+            unknown -= del_unknown
+            deleted_rows += b - a
+    digest.update(json.dumps(tombstones, sort_keys=True).encode("utf-8"))
+    manifest = {
+        "version": version,
+        "model_name": meta["model_name"],
+        "embed_dim": meta["embed_dim"],
+        "rows": rows - deleted_rows,
+        "deleted_rows": deleted_rows,
+        "segments": len(segments),
+        "built": meta.get("created"),
+        "updated": now_utc().isoformat(),
+        "checksum": digest.hexdigest(),
+        "domains": {d: v for d, v in sorted(domains.items()) if v["chunks"] > 0},
+        "published_hist": {m: c for m, c in sorted(hist.items()) if c > 0},
+        "unknown_published": unknown,
+    }
+    _write_json_atomic(os.path.join(index_dir, INDEX_MANIFEST_FILE), manifest)
+    return manifest
+
+def read_index_manifest(root: Optional[str] = None) -> Optional[dict]:
+    """현재 버전의 manifest (인덱스가 없으면 None, manifest 가 없던 인덱스는 한 번 계산해 기록 - CLI 용)"""
+    manifest = index_manifest.load_manifest(root or INDEX_DIR)
+    if manifest is not None:
+        return manifest
+    version = read_current_version(root) or LEGACY_VERSION
+    index_dir = version_dir(version, root)
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    with index_file_lock((root or INDEX_DIR) + ".lock"):
+        return write_index_manifest(index_dir, None if version == LEGACY_VERSION else version)
+
+# --------------------------------------------------------------------------------------------
+# ANN(FAISS) 인덱스 - base 세그먼트 전용, INDEX_DIR/ann.faiss + ann.json 으로 저장
+#   flat: 정확한 내적(=정규화 벡터의 코사인) 검색
+#   ivf : IVF-Flat, nlist 개 클러스터 중 nprobe 개만 탐색
+#   hnsw: HNSW 그래프, efSearch 로 recall/latency 조절
+ANN_KINDS = ("flat", "ivf", "hnsw")
+ANN_INDEX_FILE = "ann.faiss"
+ANN_META_FILE = "ann.json"
+ANN_ADD_BLOCK = 65536     # mmap 행렬을 이 행 수 단위로 나눠 ANN 에 추가
+
+@dataclass
+class AnnIndex:
+    kind: str
+    index: object
+
+def configure_search(backend: str = "auto", nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     rerank: Optional[int] = None, shard_workers: Optional[int] = None,
+                     recency_days: Optional[float] = None, newest_first: bool = False,
+                     hybrid: bool = False, hybrid_alpha: Optional[float] = None):
+    global SEARCH_BACKEND, ANN_NPROBE, ANN_EF_SEARCH, QUANT_RERANK, SHARD_SEARCH_WORKERS
+    global SEARCH_RECENCY_DAYS, SEARCH_NEWEST_FIRST, SEARCH_HYBRID, HYBRID_ALPHA
+    SEARCH_BACKEND = backend
+    SEARCH_RECENCY_DAYS = recency_days
+    SEARCH_NEWEST_FIRST = newest_first
+    SEARCH_HYBRID = hybrid
+    if hybrid_alpha is not None:
+        HYBRID_ALPHA = hybrid_alpha
+    if shard_workers is not None:
+        SHARD_SEARCH_WORKERS = shard_workers
+    if rerank:
+        QUANT_RERANK = rerank
+    if nprobe:
+        ANN_NPROBE = nprobe
+    if ef_search:
+        ANN_EF_SEARCH = ef_search
+    if backend == "faiss" and not FAISS_AVAILABLE:
+        logger.warning("faiss 가 설치되지 않아 전수 검색(exact)으로 대체합니다.")
+    logger.info("검색 백엔드: %s (nprobe=%d, efSearch=%d, rerank=%d)", SEARCH_BACKEND, ANN_NPROBE, ANN_EF_SEARCH, QUANT_RERANK)
+
+def build_ann_index(index_dir: str, kind: str = "hnsw", nlist: int = 0, hnsw_m: int = 32):
+    """base 세그먼트의 행렬로 FAISS ANN 인덱스를 만들어 인덱스 디렉터리에 저장합니다.
+    공개된 버전 디렉터리를 직접 고치지 않도록 publish_base_sidecars 를 거쳐 호출한다."""
+    if not FAISS_AVAILABLE:
+        raise RuntimeError("faiss 가 설치되어 있지 않습니다: pip install faiss-cpu")
+    assert kind in ANN_KINDS, f"unknown ann kind: {kind}"
+    t0 = time.time()
+    matrix = _load_npy(os.path.join(index_dir, "matrix.npy"))
+    rows, dim = matrix.shape
+    if kind == "flat":
+        ann = faiss.IndexFlatIP(dim)
+    elif kind == "ivf":
+        nlist = nlist or max(1, min(65536, int(4 * math.sqrt(max(rows, 1)))))
+        ann = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        # 학습은 클러스터당 ~64개 샘플이면 충분
+        n_train = min(rows, nlist * 64)
+        train_idx = np.sort(np.random.default_rng(0).choice(rows, size=n_train, replace=False))
+        ann.train(np.ascontiguousarray(matrix[train_idx], dtype=np.float32))
+    else:
+        ann = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        ann.hnsw.efConstruction = 200
+    for i in range(0, rows, ANN_ADD_BLOCK):
+        ann.add(np.ascontiguousarray(matrix[i:i + ANN_ADD_BLOCK], dtype=np.float32))
+
+    tmp_path = os.path.join(index_dir, ANN_INDEX_FILE + ".tmp")
+    faiss.write_index(ann, tmp_path)
+    os.replace(tmp_path, os.path.join(index_dir, ANN_INDEX_FILE))
+    with open(os.path.join(index_dir, ANN_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "rows": int(rows), "nlist": int(nlist), "hnsw_m": int(hnsw_m)}, f, indent=2)
+    logger.info("[ok] ANN 인덱스 생성: %s (kind=%s, rows=%d, %.1fs)", index_dir, kind, rows, time.time() - t0)
+
+def read_ann_meta(index_dir: str) -> Optional[dict]:
+    meta_path = os.path.join(index_dir, ANN_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_ann_index(pack: IndexPack) -> Optional[AnnIndex]:
+    """pack 의 base 세그먼트용 ANN 인덱스를 (처음 한 번) 불러옵니다. 없거나 오래됐으면 None."""
+    if pack.ann is not None or not FAISS_AVAILABLE or not pack.index_dir:
+        return pack.ann
+    meta = read_ann_meta(pack.index_dir)
+    if meta is None:
+        return None
+    if meta.get("rows") != len(pack.records):
+        logger.warning("ANN 인덱스 행 수(%s)가 base(%d)와 달라 사용하지 않습니다. build-ann 으로 다시 만드세요.",
+                       meta.get("rows"), len(pack.records))
+        return None
+    path = os.path.join(pack.index_dir, ANN_INDEX_FILE)
+    try:
+        index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except Exception:
+        index = faiss.read_index(path)
+    pack.ann = AnnIndex(kind=meta["kind"], index=index)
+    return pack.ann
+
+def _ann_search(ann: AnnIndex, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ANN 으로 질의별 top-k 를 구한 뒤 행별 최대 유사도로 합친다 (유사도 내림차순).
+    질의가 여러 개면 고유 행이 k 개보다 많을 수 있으므로 호출자가 앞에서부터 잘라 쓴다."""
+    if ann.kind == "ivf":
+        faiss.extract_index_ivf(ann.index).nprobe = ANN_NPROBE
+    elif ann.kind == "hnsw":
+        ann.index.hnsw.efSearch = max(ANN_EF_SEARCH, k)
+    sims, ids = ann.index.search(np.ascontiguousarray(q, dtype=np.float32), k)
+    ids, sims = ids.ravel(), sims.ravel()
+    valid = ids >= 0
+    ids, sims = ids[valid], sims[valid]
+    order = np.argsort(-sims, kind="stable")
+    uniq, first = np.unique(ids[order], return_index=True)
+    # np.unique 는 행 번호 순이므로 유사도 순으로 되돌린다
+    best = sims[order][first]
+    o = np.argsort(-best, kind="stable")
+    return uniq[o].astype(np.int64), best[o]
+
+# --------------------------------------------------------------------------------------------
+# 양자화 임베딩 (base 세그먼트 전용) - 1차 검색은 압축 코드로, 상위 후보만 float32 원본으로 재채점
+#   int8: 차원별 대칭 스케일 int8 코드 (quant.codes.npy + quant.scale.npy) → 4x 절감
+#   pq  : FAISS Product Quantization (quant.faiss), 행당 pq_m 바이트 → 384차원 기준 m=96 이면 16x 절감
+#   원본 matrix.npy 는 mmap 으로만 열려 있으므로 재채점한 행의 페이지만 메모리에 올라온다.
+QUANT_KINDS = ("int8", "pq")
+QUANT_META_FILE = "quant.json"
+QUANT_RERANK = 300          # 재채점 후보 최소 개수
+QUANT_RERANK_FACTOR = 2     # 재채점 후보 = max(QUANT_RERANK, k * QUANT_RERANK_FACTOR)
+
+@dataclass
+class QuantIndex:
+    kind: str
+    codes: Optional[np.ndarray] = None    # int8 (N, D)
+    scale: Optional[np.ndarray] = None    # float32 (D,)
+    index: object = None                  # faiss.IndexPQ
+
+def build_quant_index(index_dir: str, kind: str = "int8", pq_m: int = 96):
+    """base 세그먼트의 float32 행렬을 int8 / PQ 코드로 압축해 인덱스 디렉터리에 저장합니다.
+    공개된 버전 디렉터리를 직접 고치지 않도록 publish_base_sidecars 를 거쳐 호출한다."""
+    assert kind in QUANT_KINDS, f"unknown quantization kind: {kind}"
+    t0 = time.time()
+    matrix = _load_npy(os.path.join(index_dir, "matrix.npy"))
+    rows, dim = matrix.shape
+    if kind == "int8":
+        absmax = np.zeros(dim, dtype=np.float32)
+        for i in range(0, rows, ANN_ADD_BLOCK):
+            absmax = np.maximum(absmax, np.abs(matrix[i:i + ANN_ADD_BLOCK]).max(axis=0))
+        scale = np.where(absmax > 0, absmax / 127.0, 1.0).astype(np.float32)
+        tmp_path = os.path.join(index_dir, "quant.codes.npy.tmp")
+        codes = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.int8, shape=(rows, dim))
+        for i in range(0, rows, ANN_ADD_BLOCK):
+            block = np.asarray(matrix[i:i + ANN_ADD_BLOCK], dtype=np.float32) / scale
+            codes[i:i + len(block)] = np.clip(np.rint(block), -127, 127).astype(np.int8)
+        codes.flush()
+        del codes
+        os.replace(tmp_path, os.path.join(index_dir, "quant.codes.npy"))
+        np.save(os.path.join(index_dir, "quant.scale.npy"), scale)
+    else:
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("PQ 양자화에는 faiss 가 필요합니다: pip install faiss-cpu")
+        if dim % pq_m:
+            raise ValueError(f"임베딩 차원({dim})이 pq_m({pq_m})으로 나누어떨어지지 않습니다.")
+        pq = faiss.IndexPQ(dim, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        n_train = min(rows, 256 * 64)
+        train_idx = np.sort(np.random.default_rng(0).choice(rows, size=n_train, replace=False))
+        pq.train(np.ascontiguousarray(matrix[train_idx], dtype=np.float32))
+        for i in range(0, rows, ANN_ADD_BLOCK):
+            pq.add(np.ascontiguousarray(matrix[i:i + ANN_ADD_BLOCK], dtype=np.float32))
+        tmp_path = os.path.join(index_dir, "quant.faiss.tmp")
+        faiss.write_index(pq, tmp_path)
+        os.replace(tmp_path, os.path.join(index_dir, "quant.faiss"))
+    # 다른 방식으로 만들었던 이전 코드 파일 정리
+    stale = ("quant.faiss",) if kind == "int8" else ("quant.codes.npy", "quant.scale.npy")
+    for name in stale:
+        if os.path.exists(os.path.join(index_dir, name)):
+            os.remove(os.path.join(index_dir, name))
+    with open(os.path.join(index_dir, QUANT_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "rows": int(rows), "pq_m": int(pq_m)}, f, indent=2)
+    logger.info("[ok] 양자화 인덱스 생성: %s (kind=%s, rows=%d, %.1fs)", index_dir, kind, rows, time.time() - t0)
+
+def read_quant_meta(index_dir: str) -> Optional[dict]:
+    meta_path = os.path.join(index_dir, QUANT_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_quant_index(pack: IndexPack) -> Optional[QuantIndex]:
+    """pack 의 base 세그먼트용 양자화 코드를 (처음 한 번) 불러옵니다. 없거나 오래됐으면 None."""
+    if pack.quant is not None or not pack.index_dir:
+        return pack.quant
+    meta = read_quant_meta(pack.index_dir)
+    if meta is None:
+        return None
+    if meta.get("rows") != len(pack.records):
+        logger.warning("양자화 인덱스 행 수(%s)가 base(%d)와 달라 사용하지 않습니다. quantize-index 로 다시 만드세요.",
+                       meta.get("rows"), len(pack.records))
+        return None
+    if meta["kind"] == "int8":
+        pack.quant = QuantIndex(kind="int8",
+                                codes=_load_npy(os.path.join(pack.index_dir, "quant.codes.npy")),
+                                scale=np.load(os.path.join(pack.index_dir, "quant.scale.npy")))
+    elif FAISS_AVAILABLE:
+        path = os.path.join(pack.index_dir, "quant.faiss")
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            index = faiss.read_index(path)
+        pack.quant = QuantIndex(kind="pq", index=index)
+    return pack.quant
+
+def _quant_search(quant: QuantIndex, matrix: np.ndarray, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """압축 코드로 후보를 고른 뒤 후보 행만 float32 원본으로 정확한 코사인 유사도를 다시 계산한다."""
+    rows = len(matrix)
+    n_cand = min(rows, max(QUANT_RERANK, k * QUANT_RERANK_FACTOR))
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    if quant.kind == "int8":
+        q_scaled = (q * quant.scale).T
+        approx = np.empty(rows, dtype=np.float32)
+        for i in range(0, rows, ANN_ADD_BLOCK):
+            approx[i:i + ANN_ADD_BLOCK] = (quant.codes[i:i + ANN_ADD_BLOCK].astype(np.float32) @ q_scaled).max(axis=1)
+        cand = np.argpartition(-approx, n_cand - 1)[:n_cand]
+    else:
+        _, ids = quant.index.search(np.ascontiguousarray(q, dtype=np.float32), n_cand)
+        cand = np.unique(ids[ids >= 0])
+    cand = np.sort(cand)  # mmap 순차 접근
+    vecs = np.asarray(matrix[cand], dtype=np.float32)
+    vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+    sims = (vecs @ q.T).max(axis=1)
+    top = np.argsort(-sims, kind="stable")[:k]
+    return cand[top].astype(np.int64), sims[top]
+
+# --------------------------------------------------------------------------------------------
+# ANN / 양자화 인덱스 (재)생성 - 공개된 스냅샷은 고치지 않고 부가 파일을 더한 새 버전으로 공개
+ANN_FILES = (ANN_INDEX_FILE, ANN_META_FILE)
+QUANT_FILES = (QUANT_META_FILE, "quant.codes.npy", "quant.scale.npy", "quant.faiss")
+
+def publish_base_sidecars(ann: Optional[dict] = None, quant: Optional[dict] = None) -> Optional[str]:
+    """현재 버전 base 의 ANN(ann = build_ann_index 인자) / 양자화(quant = build_quant_index 인자) 인덱스를
+    만들어 새 버전으로 공개합니다. base 행렬을 하드링크한 임시 디렉터리에서 만들고, 인덱스 잠금 하에서
+    현재 버전의 나머지 파일(delta, tombstone, 다시 만들지 않는 부가 파일)을 링크해 공개한다.
+    공개한 버전 이름을 반환 (만드는 도중 다른 작업이 새 버전을 공개했으면 결과를 버리고 None)."""
+    live_dir = current_index_dir()
+    staging_dir = INDEX_DIR + ".sidecar.tmp"
+    tmp_dir = INDEX_DIR + ".sidecar.version"
+    for d in (staging_dir, tmp_dir):
+        shutil.rmtree(d, ignore_errors=True)
+    _link_tree(live_dir, staging_dir, skip=[name for name in os.listdir(live_dir) if name != "matrix.npy"])
+    built = []
+    if ann:
+        build_ann_index(staging_dir, **ann)
+        built += ANN_FILES
+    if quant:
+        build_quant_index(staging_dir, **quant)
+        built += QUANT_FILES
+    with index_file_lock(INDEX_DIR + ".lock"):
+        if current_index_dir() != live_dir:
+            logger.warning("ANN/양자화 인덱스 생성 도중 새 인덱스 버전이 공개되어 결과를 버립니다.")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return None
+        # 이전 레이아웃(INDEX_DIR 가 곧 인덱스)이면 버전 관리 파일은 옮기지 않는다
+        _link_tree(live_dir, tmp_dir, skip=built + [INDEX_CURRENT_FILE, INDEX_VERSIONS_DIR, INDEX_READERS_DIR])
+        for name in built:
+            if os.path.exists(os.path.join(staging_dir, name)):
+                os.replace(os.path.join(staging_dir, name), os.path.join(tmp_dir, name))
+        version = publish_index_version(tmp_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    gc_index_versions()
+    return version
+
+# --------------------------------------------------------------------------------------------
+# 샤드 인덱스 - build-index --shards N 이 INDEX_DIR/shards/NNN 에 샤드를 나눠 기록 (base 는 빈 세그먼트)
+#   domain: 도메인 해시 % N → 시드 단위로 샤드 하나만 다시 빌드 가능 (--rebuild-shard)
+#   month : 발행 연월 % N (발행일 없으면 샤드 0)
+#   year  : 발행 연도별 샤드 하나 (shards/YYYY, 발행일 없으면 shards/0000) - N 은 무시.
+#           search_index 의 recency_days / newest_first 가 연도 샤드 단위로 통째로 건너뛴다.
+#   평가 시 SHARD_SEARCH_WORKERS > 1 이면 샤드별 top-k 를 프로세스 풀에서 동시에 구해 합친다.
+SHARD_BY_CHOICES = ("domain", "month", "year")
+SHARD_META_FILE = "shards.json"
+SHARD_SEARCH_WORKERS = 0    # 0/1 이면 현재 프로세스에서 순차 검색
+_SHARD_POOL = None
+_SHARD_CACHE = {}           # (샤드 디렉터리, meta mtime) → (행렬, 행 정규화 여부 - meta.json "normalized")  [워커 프로세스 쪽 캐시]
+
+def shard_of_domain(domain: str, n: int) -> int:
+    return url_key(domain or "") % n
+
+def shard_of_published(published: Optional[float], n: int) -> int:
+    if published is None or (isinstance(published, float) and math.isnan(published)):
+        return 0
+    dt = datetime.fromtimestamp(published, tz=timezone.utc)
+    return (dt.year * 12 + dt.month - 1) % n
+
+def shard_year(published: Optional[float]) -> int:
+    if published is None or (isinstance(published, float) and math.isnan(published)):
+        return 0
+    return datetime.fromtimestamp(published, tz=timezone.utc).year
+
+def assign_shards(records: List[DocRecord], n: int, by: str) -> np.ndarray:
+    assert by in SHARD_BY_CHOICES, f"unknown shard key: {by}"
+    if by == "year":
+        return np.fromiter((shard_year(r.published) for r in records), dtype=np.int32, count=len(records))
+    if by == "domain":
+        return np.fromiter((shard_of_domain(r.domain, n) for r in records), dtype=np.int32, count=len(records))
+    return np.fromiter((shard_of_published(r.published, n) for r in records), dtype=np.int32, count=len(records))
+
+def read_shard_meta(index_dir: str) -> Optional[dict]:
+    path = os.path.join(index_dir, "shards", SHARD_META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_sharded_index(index_dir: str, model_name: str, matrix: np.ndarray, records: List[DocRecord], n: int, by: str):
+    """레코드를 n 개 샤드로 나눠 index_dir/shards/NNN 에 기록합니다 (base 는 빈 세그먼트로 남겨 delta 병합용으로 사용)."""
+    assign = assign_shards(records, n, by)
+    write_index_dir(index_dir, model_name, matrix[:0], [])
+    keys = np.unique(assign).tolist() if by == "year" else list(range(n))
+    for key in keys:
+        name = f"{key:04d}" if by == "year" else f"{key:03d}"
+        sel = np.nonzero(assign == key)[0]
+        write_index_dir(os.path.join(index_dir, "shards", name), model_name, matrix[sel], (records[i] for i in sel))
+        logger.info("샤드 %s 기록: %d행", name, len(sel))
+    os.makedirs(os.path.join(index_dir, "shards"), exist_ok=True)
+    with open(os.path.join(index_dir, "shards", SHARD_META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"count": len(keys), "by": by}, f, indent=2)
+
+def replace_shard(index_dir: str, k: int, model_name: str, matrix: np.ndarray, records: List[DocRecord]):
+    """샤드 하나만 새 내용으로 교체한 새 버전을 공개합니다 (다른 샤드/base/delta 는 하드링크로 공유)."""
+    name = f"{k:03d}"
+    staging_dir = index_dir + f".shard{name}.tmp"
+    tmp_dir = index_dir + f".shard{name}.version"
+    for d in (staging_dir, tmp_dir):
+        shutil.rmtree(d, ignore_errors=True)
+    write_index_dir(staging_dir, model_name, matrix, records)
+    with index_file_lock(index_dir + ".lock"):
+        live_dir = current_index_dir(index_dir)
+        _link_tree(live_dir, tmp_dir, skip=(os.path.join("shards", name), TOMBSTONE_FILE))
+        os.replace(staging_dir, os.path.join(tmp_dir, "shards", name))
+        # 교체된 샤드의 삭제 기록은 더 이상 유효하지 않다
+        tombstones = read_tombstones(live_dir)
+        tombstones.pop("shards/" + name, None)
+        write_tombstones(tmp_dir, tombstones)
+        publish_index_version(tmp_dir, index_dir)
+    gc_index_versions(index_dir)
+    logger.info("[ok] 샤드 %s 교체: %d행", name, len(records))
+
+SEARCH_BLOCK_ROWS = 4096    # 전수 검색 시 한 번에 곱하는 행렬 행 수 (블록 × 차원 float32 가 캐시에 들어가는 크기)
+
+def blockwise_topk(matrix, q: np.ndarray, k: int, excluded: Optional[np.ndarray] = None,
+                   normalized: bool = False, block: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """행렬을 행 블록 단위로 훑으며 질의별 최대 코사인 유사도의 top-k (행 번호, 유사도) 를 구합니다 (정렬 안 됨).
+    q 는 정규화된 질의 (Q, D). 블록마다 행별 최대 유사도를 구해 지금까지의 top-k 와 합치므로
+    (Q × N) 유사도 행렬이나 정규화된 행렬 사본을 만들지 않고 메모리는 O(블록) 이다.
+    normalized=True 면 (빌드 시 확인된) 단위 벡터 행으로 보고 행 노름 계산을 생략한다.
+    excluded 가 True 인 행은 제외한다."""
+    n = len(matrix)
+    block = block or SEARCH_BLOCK_ROWS
+    q = np.ascontiguousarray(np.atleast_2d(q), dtype=np.float32).T    # (D, Q)
+    best_idx = np.zeros(0, dtype=np.int64)
+    best_sims = np.zeros(0, dtype=np.float32)
+    if k <= 0:
+        return best_idx, best_sims
+    for a in range(0, n, block):
+        blk = np.asarray(matrix[a:a + block], dtype=np.float32)
+        sims = blk @ q
+        sims = sims.max(axis=1) if sims.shape[1] > 1 else sims[:, 0]
+        if not normalized:
+            sims /= np.maximum(np.linalg.norm(blk, axis=1), 1e-12)
+        if excluded is not None:
+            sims[excluded[a:a + len(blk)]] = -np.inf
+        kk = min(k, len(sims))
+        top = np.argpartition(-sims, kk - 1)[:kk] if kk < len(sims) else np.arange(len(sims))
+        top = top[np.isfinite(sims[top])]
+        best_idx = np.concatenate([best_idx, top + a])
+        best_sims = np.concatenate([best_sims, sims[top]])
+        if len(best_sims) > k:
+            keep = np.argpartition(-best_sims, k - 1)[:k]
+            best_idx, best_sims = best_idx[keep], best_sims[keep]
+    return best_idx, best_sims
+
+def _shard_search_worker(shard_dir: str, q: np.ndarray, k: int, dead: List[List[int]],
+                         min_published: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """샤드 하나에서 질의별 최대 코사인 유사도 top-k (샤드 내 행 번호, 유사도). q 는 정규화된 질의.
+    min_published 가 있으면 그보다 오래된 행은 제외한다 (발행일 없는 행은 유지)."""
+    key = (shard_dir, os.stat(os.path.join(shard_dir, "meta.json")).st_mtime_ns)
+    cached = _SHARD_CACHE.get(key)
+    if cached is None:
+        matrix = _load_npy(os.path.join(shard_dir, "matrix.npy"))
+        cached = _SHARD_CACHE[key] = (matrix, bool(read_index_meta(shard_dir).get("normalized", False)))
+    matrix, normalized = cached
+    if len(matrix) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    excluded = None
+    if dead or min_published is not None:
+        excluded = np.zeros(len(matrix), dtype=bool)
+        for a, b in dead:
+            excluded[a:b] = True
+        if min_published is not None:
+            excluded |= _load_npy(os.path.join(shard_dir, "published.npy")) < min_published
+    return blockwise_topk(matrix, q, k, excluded, normalized)
+
+def _shard_pool() -> ProcessPoolExecutor:
+    global _SHARD_POOL
+    if _SHARD_POOL is None:
+        _SHARD_POOL = ProcessPoolExecutor(max_workers=SHARD_SEARCH_WORKERS)
+        logger.info("샤드 검색 프로세스 풀 시작: %d workers", SHARD_SEARCH_WORKERS)
+    return _SHARD_POOL
+
+# --------------------------------------------------------------------------------------------
+# 인덱스 검색 (base + shard + delta 세그먼트)
+def _excluded_mask(pack: IndexPack, name: str, records, min_published: Optional[float]) -> Optional[np.ndarray]:
+    """검색에서 뺄 행 마스크: 삭제(tombstone)된 행 + 최근 기간 밖의 행 (없으면 None)"""
+    dead = pack.deleted_mask(name, len(records))
+    if min_published is None:
+        return dead
+    old = np.asarray(pack.published_column(name, records)) < min_published
+    return old if dead is None else (old | dead)
+
+def _search_segment(pack: IndexPack, name: str, start: int, matrix, records, q_np: np.ndarray, k: int,
+                    ann: Optional[AnnIndex], quant: Optional[QuantIndex],
+                    min_published: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """세그먼트 하나에서 top-k (전역 행 번호, 유사도). base 는 ANN / 양자화 코드를 쓸 수 있다."""
+    kk = min(k, len(records))
+    excluded = _excluded_mask(pack, name, records, min_published)
+    if start == 0 and name == BASE_SEGMENT and (ann is not None or quant is not None):
+        # 제외될 행만큼 (최대 8k) 더 뽑은 뒤 걸러낸다
+        n_excl = int(excluded.sum()) if excluded is not None else 0
+        extra = min(len(records), kk + min(n_excl, 8 * kk))
+        if ann is not None:
+            top, top_sims = _ann_search(ann, q_np, extra)
+        else:
+            top, top_sims = _quant_search(quant, matrix, q_np, extra)
+        if excluded is not None:
+            live = ~excluded[top]
+            top, top_sims = top[live], top_sims[live]
+        return top[:kk], top_sims[:kk]
+    q_norm = q_np / np.maximum(np.linalg.norm(q_np, axis=1, keepdims=True), 1e-12)
+    top, top_sims = blockwise_topk(matrix, q_norm, kk, excluded, pack.segment_normalized(name))
+    return top + start, top_sims
+
+def _segment_time_bound(pack: IndexPack, name: str, records) -> float:
+    """세그먼트 행들이 가질 수 있는 time_weight 최댓값 (가장 최근 발행일 기준, 발행일 없는 행은 0.0)"""
+    _, newest, has_unknown = pack.published_range(name, records)
+    bound = float(time_weight_array(np.array([newest]))[0]) if not math.isnan(newest) else -np.inf
+    return max(bound, 0.0) if has_unknown else bound
+
+def _search_newest_first(pack: IndexPack, segments: list, q_np: np.ndarray, k: int,
+                         ann: Optional[AnnIndex], quant: Optional[QuantIndex],
+                         min_published: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """세그먼트(연도 샤드 등)를 최신 발행일 순으로 검색하고, 남은 세그먼트가 시간 가중 점수로
+    현재 k번째 후보를 넘을 수 없으면 멈춘다. 후보는 sim + (DELTA_TIME/ALPHA_SIM)*time_weight 로 고른다."""
+    ratio = DELTA_TIME / ALPHA_SIM
+    bounds = [_segment_time_bound(pack, name, records) for name, _, _, records in segments]
+    order = sorted(range(len(segments)), key=lambda i: -bounds[i])
+    idx_acc = np.zeros(0, dtype=np.int64)
+    sims_acc = np.zeros(0, dtype=np.float32)
+    adj_acc = np.zeros(0, dtype=np.float64)
+    for pos, i in enumerate(order):
+        if len(adj_acc) >= k and adj_acc.min() >= 1.0 + ratio * bounds[i]:
+            logger.debug("최신순 검색 조기 종료: %d/%d 세그먼트 생략", len(order) - pos, len(order))
+            break
+        name, start, matrix, records = segments[i]
+        top, top_sims = _search_segment(pack, name, start, matrix, records, q_np, k, ann, quant, min_published)
+        pub = np.asarray(pack.published_column(name, records))[top - start]
+        adj = top_sims + ratio * time_weight_array(pub)
+        idx_acc = np.concatenate([idx_acc, top.astype(np.int64)])
+        sims_acc = np.concatenate([sims_acc, top_sims.astype(np.float32)])
+        adj_acc = np.concatenate([adj_acc, adj])
+        if len(adj_acc) > k:
+            keep = np.argpartition(-adj_acc, k - 1)[:k]
+            idx_acc, sims_acc, adj_acc = idx_acc[keep], sims_acc[keep], adj_acc[keep]
+    order = np.argsort(-sims_acc, kind="stable")
+    return idx_acc[order], sims_acc[order]
+
+def search_index(pack: IndexPack, q_vecs: np.ndarray, k: int,
+                 recency_days: Optional[float] = None, newest_first: Optional[bool] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """질의 벡터(들)과 가장 유사한 상위 k개 행을 전체 세그먼트에서 찾습니다.
+    질의 벡터가 여러 개면 행별 최대 유사도를 사용한다. 반환: (전역 행 번호, 유사도) 내림차순
+    base 세그먼트는 SEARCH_BACKEND 에 따라 ANN(FAISS) 인덱스 또는 양자화 코드 + 재채점을,
+    delta 는 항상 전수 검색을 쓴다.
+    recency_days: 최근 N일 안에 발행된 행(발행일 없는 행 포함)만 검색 - 발행일 범위가 창 밖인 세그먼트는 열지 않음
+    newest_first: 세그먼트를 최신순으로 검색하다 시간 가중으로 더 나은 후보가 나올 수 없으면 중단
+    (둘 다 None 이면 SEARCH_RECENCY_DAYS / SEARCH_NEWEST_FIRST 설정을 따른다)"""
+    if recency_days is None:
+        recency_days = SEARCH_RECENCY_DAYS
+    if newest_first is None:
+        newest_first = SEARCH_NEWEST_FIRST
+    min_published = (now_utc().timestamp() - recency_days * 86400) if recency_days else None
+    q_np = np.atleast_2d(np.asarray(q_vecs, dtype=np.float32))
+    ann = load_ann_index(pack) if SEARCH_BACKEND != "exact" else None
+    if SEARCH_BACKEND == "faiss" and ann is None:
+        logger.warning("ANN 인덱스를 사용할 수 없어 전수 검색으로 대체합니다.")
+    quant = load_quant_index(pack) if (ann is None and SEARCH_BACKEND != "exact") else None
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    segments = []
+    for name, start, matrix, records in pack.iter_named_segments():
+        if len(records) == 0:
+            continue
+        if min_published is not None:
+            _, newest, has_unknown = pack.published_range(name, records)
+            if not has_unknown and not (newest >= min_published):
+                continue  # 세그먼트 전체가 창 밖
+        segments.append((name, start, matrix, records))
+    if newest_first:
+        return _search_newest_first(pack, segments, q_np, k, ann, quant, min_published)
+
+    found_idx, found_sims = [], []
+    # 샤드는 프로세스 풀에 먼저 맡기고 나머지 세그먼트를 검색하는 동안 병렬로 돈다
+    shard_futs = []
+    shard_paths = {seg.name: seg.path for seg in pack.shards}
+    pooled_segments = [seg for seg in segments if seg[0] in shard_paths]
+    if SHARD_SEARCH_WORKERS > 1 and len(pooled_segments) > 1:
+        q_norm = q_np / np.maximum(np.linalg.norm(q_np, axis=1, keepdims=True), 1e-12)
+        pool = _shard_pool()
+        for name, start, _, _ in pooled_segments:
+            dead_ranges = pack.deleted.get(name, [])
+            shard_futs.append((start, shard_paths[name], dead_ranges,
+                               pool.submit(_shard_search_worker, shard_paths[name], q_norm, k, dead_ranges, min_published)))
+    pooled = {seg[0] for seg in pooled_segments} if shard_futs else set()
+    for name, start, matrix, records in segments:
+        if name in pooled:
+            continue
+        top, top_sims = _search_segment(pack, name, start, matrix, records, q_np, k, ann, quant, min_published)
+        found_idx.append(top)
+        found_sims.append(top_sims)
+    for start, path, dead_ranges, fut in shard_futs:
+        try:
+            top, top_sims = fut.result()
+        except Exception as e:
+            logger.warning(f"샤드 병렬 검색 실패, 현재 프로세스에서 검색: {path} ({e})")
+            top, top_sims = _shard_search_worker(path, q_norm, k, dead_ranges, min_published)
+        found_idx.append(top + start)
+        found_sims.append(top_sims)
+    if not found_idx:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    idx = np.concatenate(found_idx)
+    sims = np.concatenate(found_sims)
+    order = np.argsort(-sims, kind="stable")[:k]
+    return idx[order].astype(np.int64), sims[order]
+
+def hybrid_search(pack: IndexPack, query_text: str, q_vecs: np.ndarray, k: int,
+                  alpha: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """BM25F(키워드 역색인) 상위 k 와 임베딩 상위 k 의 합집합을 융합 점수로 다시 정렬합니다.
+    융합 점수 = alpha·코사인 + (1-alpha)·(BM25 / 후보 중 최대 BM25).
+    반환: (전역 행 번호, 코사인 유사도, 융합 점수) - 융합 점수 내림차순. 순위는 융합 점수로 정하되
+    유사도 임계값/점수/보고는 코사인으로 해야 한다 (BM25 최대 후보는 (1-alpha) 만으로도 임계값을 넘을 수 있음)"""
+    if alpha is None:
+        alpha = HYBRID_ALPHA
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    dense_idx, _ = search_index(pack, q_vecs, k)
+    sparse_idx, sparse_scores = pack.bm25_scores(query_text)
+    if SEARCH_RECENCY_DAYS and len(sparse_idx):
+        min_published = now_utc().timestamp() - SEARCH_RECENCY_DAYS * 86400
+        keep = np.ones(len(sparse_idx), dtype=bool)
+        for name, start, _, records in pack.iter_named_segments():
+            sel = np.nonzero((sparse_idx >= start) & (sparse_idx < start + len(records)))[0]
+            if len(sel):
+                pub = np.asarray(pack.published_column(name, records))[sparse_idx[sel] - start]
+                keep[sel] = np.isnan(pub) | (pub >= min_published)
+        sparse_idx, sparse_scores = sparse_idx[keep], sparse_scores[keep]
+    top = np.argsort(-sparse_scores, kind="stable")[:k]
+    idx = np.union1d(dense_idx, sparse_idx[top]).astype(np.int64)
+    if not len(idx):
+        return idx, np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    q_np = np.atleast_2d(np.asarray(q_vecs, dtype=np.float32))
+    q_np = q_np / np.maximum(np.linalg.norm(q_np, axis=1, keepdims=True), 1e-12)
+    vecs = pack.vectors(idx)
+    vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+    cos = (vecs @ q_np.T).max(axis=1)
+    bm25 = np.zeros(len(idx), dtype=np.float32)
+    pos = np.minimum(np.searchsorted(sparse_idx, idx), max(len(sparse_idx) - 1, 0))
+    hit = (sparse_idx[pos] == idx) if len(sparse_idx) else np.zeros(len(idx), dtype=bool)
+    bm25[hit] = sparse_scores[pos[hit]]
+    if bm25.max() > 0:
+        bm25 /= bm25.max()
+    fused = (alpha * cos + (1 - alpha) * bm25).astype(np.float32)
+    order = np.argsort(-fused, kind="stable")[:k]
+    return idx[order], cos.astype(np.float32)[order], fused[order]
 
 # --------------------------------------------------------------------------------------------
 # 문장 분할/청킹
@@ -1018,8 +3208,80 @@ def get_embedder(use_gpu: bool, fp16: bool):
         raise Exception("모든 AI 모델 로딩 실패")
     
     logger.info("임베딩 모델: %s (device=%s, fp16=%s)", selected_model, emb._target_device, fp16)
+    emb.selected_model_name = selected_model
     return emb, fp16
 
+DEFAULT_EMBED_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+def embedder_model_name(embedder) -> str:
+    """get_embedder 가 실제로 로딩한 모델 이름"""
+    return getattr(embedder, "selected_model_name", DEFAULT_EMBED_MODEL)
+
+# --------------------------------------------------------------------------------------------
+# 임베딩 캐시 - INDEX_DIR.embcache.sqlite
+#   (모델명, 공백 정규화한 청크) 해시 → float32 벡터. 재빌드 시 바뀌지 않은 청크는 모델을 거치지 않는다.
+#   행마다 마지막 사용 순번을 두고, EMBED_CACHE_ROWS 를 넘으면 오래 안 쓴 행부터 지운다 (LRU).
+EMBED_CACHE_SQL_BATCH = 500     # SQLite 변수 개수 제한 아래로 키를 나눠 조회
+
+def embed_cache_path() -> str:
+    return INDEX_DIR + ".embcache.sqlite"
+
+def embed_cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.blake2b((model_name + "\0" + normalize_space(text)).encode("utf-8"), digest_size=16).digest()
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_rows: int = EMBED_CACHE_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS emb (key BLOB PRIMARY KEY, vec BLOB NOT NULL, used INTEGER NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS emb_used ON emb(used)")
+        self.conn.commit()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """캐시에 있는 키의 벡터를 반환하고 사용 순번을 갱신합니다."""
+        found = {}
+        for i in range(0, len(keys), EMBED_CACHE_SQL_BATCH):
+            part = keys[i:i + EMBED_CACHE_SQL_BATCH]
+            rows = self.conn.execute(
+                f"SELECT key, vec FROM emb WHERE key IN ({','.join('?' * len(part))})", part).fetchall()
+            for key, vec in rows:
+                found[bytes(key)] = np.frombuffer(vec, dtype=np.float32)
+        if found:
+            now = time.time_ns()
+            self.conn.executemany("UPDATE emb SET used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+        return found
+
+    def put_many(self, items: Iterable[Tuple[bytes, np.ndarray]]):
+        now = time.time_ns()
+        self.conn.executemany("INSERT OR REPLACE INTO emb (key, vec, used) VALUES (?, ?, ?)",
+                              ((k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items))
+        self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """max_rows 를 넘는 만큼 가장 오래 안 쓴 행을 지운다. 지운 행 수를 반환."""
+        excess = self.conn.execute("SELECT COUNT(*) FROM emb").fetchone()[0] - self.max_rows
+        if excess <= 0:
+            return 0
+        self.conn.execute("DELETE FROM emb WHERE key IN (SELECT key FROM emb ORDER BY used LIMIT ?)", (excess,))
+        self.conn.commit()
+        return excess
+
+    def close(self):
+        self.conn.close()
+
+def open_embedding_cache() -> Optional[EmbeddingCache]:
+    """EMBED_CACHE_ROWS > 0 이면 빌드용 임베딩 캐시를 연다 (실패하면 캐시 없이 진행)."""
+    if EMBED_CACHE_ROWS <= 0:
+        return None
+    try:
+        return EmbeddingCache(embed_cache_path(), EMBED_CACHE_ROWS)
+    except sqlite3.Error as e:
+        logger.warning(f"임베딩 캐시를 열 수 없어 캐시 없이 진행: {e}")
+        return None
+
 def get_nli(use_gpu: bool, fp16: bool):
     name = "cross-encoder/nli-deberta-v3-small"
     tok = AutoTokenizer.from_pretrained(name)
@@ -1032,6 +3294,85 @@ def get_nli(use_gpu: bool, fp16: bool):
     return tok, mdl, fp16
 
 
+# 의미적 연관성 휴리스틱 사전 (analyze_semantic_relevance 와 배치 버전이 공유)
+SEMANTIC_TOPIC_PATTERNS = {
+    # 정치 관련 주제
+    '대통령_탄핵': ['대통령', '탄핵', '파면', '헌법재판소'],
+    '선거_정치': ['선거', '투표', '후보', '정당', '국회의원'],
+    '정부_정책': ['정부', '정책', '법안', '국정감사', '국정운영'],
+    '사법_수사': ['검찰', '수사', '기소', '재판', '판결'],
+    # 사회 관련 주제
+    '경제_금융': ['경제', '금리', '물가', '주식', '부동산'],
+    '보건_의료': ['코로나', '백신', '병원', '의료', '방역'],
+    '교육_문화': ['교육', '학교', '대학', '문화', '예술'],
+    '환경_안전': ['환경', '기후', '안전', '재해', '사고'],
+}
+
+# 관련 주제 매칭 (정치-사법, 경제-사회 등)
+SEMANTIC_RELATED_TOPICS = {
+    '대통령_탄핵': ['사법_수사', '정부_정책'],
+    '선거_정치': ['정부_정책', '대통령_탄핵'],
+    '경제_금융': ['정부_정책'],
+    '보건_의료': ['정부_정책', '사회_복지'],
+}
+
+# 한국어 맥락 (정치인 이름, 기관명, 사건/이슈명)
+KOREAN_CONTEXT_TERMS = [
+    ['윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜'],
+    ['헌법재판소', '국회', '청와대', '정부', '검찰', '법원'],
+    ['탄핵', '파면', '선거', '국정감사', '수사', '기소'],
+]
+
+# 한국 정치 관련 핵심 엔티티
+KEY_ENTITY_TERMS = {
+    'politicians': ['윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜', '김건희'],
+    'institutions': ['헌법재판소', '국회', '청와대', '대통령실', '검찰', '국정원'],
+    'parties': ['민주당', '국민의힘', '더불어민주당', '정의당', '개혁신당'],
+    'events': ['탄핵', '파면', '탄핵심판', '국정감사', '특검', '수사'],
+}
+
+# 사건 연관 맵핑
+EVENT_RELATIONSHIPS = {
+    '탄핵': ['헌법재판소', '헌재', '심판', '파면', '정치'],
+    '파면': ['탄핵', '헌법재판소', '대통령', '권한정지'],
+    '선거': ['후보', '투표', '정당', '선거운동', '공약'],
+    '수사': ['검찰', '기소', '혐의', '조사', '증거'],
+    '국정감사': ['국회', '의원', '감사', '질의', '답변'],
+}
+
+# 날짜 패턴 (2025년 10월 / 10월 25일 / 2025년 / 상대 시점)
+TEMPORAL_DATE_PATTERNS = [
+    re.compile(r'\d{4}년\s*\d{1,2}월'),
+    re.compile(r'\d{1,2}월\s*\d{1,2}일'),
+    re.compile(r'\d{4}\s*년'),
+    re.compile(r'어제|오늘|내일|이번주|다음주|지난주'),
+]
+
+# 긍정적/부정적 키워드
+SENTIMENT_POSITIVE_KEYWORDS = ['성공', '발전', '개선', '증가', '상승', '긍정', '희망']
+SENTIMENT_NEGATIVE_KEYWORDS = ['실패', '문제', '감소', '하락', '부정', '우려', '비판', '논란']
+
+def _unique_terms(*groups) -> List[str]:
+    terms = {}
+    for group in groups:
+        for term in group:
+            terms.setdefault(term, len(terms))
+    return list(terms)
+
+# 위 사전들의 용어 전체 (열 순서 고정) - 오토마톤 하나로 텍스트당 한 번만 스캔
+SEMANTIC_HEURISTIC_TERMS = _unique_terms(
+    *SEMANTIC_TOPIC_PATTERNS.values(), *KOREAN_CONTEXT_TERMS, *KEY_ENTITY_TERMS.values(),
+    EVENT_RELATIONSHIPS, *EVENT_RELATIONSHIPS.values(), SENTIMENT_POSITIVE_KEYWORDS, SENTIMENT_NEGATIVE_KEYWORDS,
+)
+_SEMANTIC_TERM_COL = {term: i for i, term in enumerate(SEMANTIC_HEURISTIC_TERMS)}
+SEMANTIC_TERM_MATCHER = AhoCorasick(SEMANTIC_HEURISTIC_TERMS)
+
+@lru_cache(maxsize=1024)
+def semantic_dictionary_hits(text: str) -> frozenset:
+    """text 에 포함된 SEMANTIC_HEURISTIC_TERMS (1회 스캔, 후보마다 반복되는 질의 텍스트는 memo)"""
+    return frozenset(SEMANTIC_TERM_MATCHER.find_all(text or ""))
+
+
 def analyze_semantic_relevance(query_text: str, article_content: str, embedder) -> dict:
     """
     고도화된 의미적 연관성 분석
@@ -1104,27 +3445,9 @@ def extract_semantic_topics(text: str) -> List[str]:
     """텍스트에서 의미적 주제 추출"""
     topics = []
     
-    # 정치 관련 주제
-    political_patterns = {
-        '대통령_탄핵': ['대통령', '탄핵', '파면', '헌법재판소'],
-        '선거_정치': ['선거', '투표', '후보', '정당', '국회의원'],
-        '정부_정책': ['정부', '정책', '법안', '국정감사', '국정운영'],
-        '사법_수사': ['검찰', '수사', '기소', '재판', '판결']
-    }
-    
-    # 사회 관련 주제  
-    social_patterns = {
-        '경제_금융': ['경제', '금리', '물가', '주식', '부동산'],
-        '보건_의료': ['코로나', '백신', '병원', '의료', '방역'],
-        '교육_문화': ['교육', '학교', '대학', '문화', '예술'],
-        '환경_안전': ['환경', '기후', '안전', '재해', '사고']
-    }
-    
-    all_patterns = {**political_patterns, **social_patterns}
-    
-    text_lower = text.lower()
-    for topic, keywords in all_patterns.items():
-        if any(keyword in text_lower for keyword in keywords):
+    hits = semantic_dictionary_hits(text.lower())
+    for topic, keywords in SEMANTIC_TOPIC_PATTERNS.items():
+        if any(keyword in hits for keyword in keywords):
             topics.append(topic)
     
     return topics
@@ -1141,12 +3464,7 @@ def calculate_topic_relevance(query_topics: List[str], article_topics: List[str]
         return len(common_topics) / max(len(query_topics), len(article_topics))
     
     # 관련 주제 매칭 (정치-사법, 경제-사회 등)
-    related_pairs = {
-        '대통령_탄핵': ['사법_수사', '정부_정책'],
-        '선거_정치': ['정부_정책', '대통령_탄핵'],
-        '경제_금융': ['정부_정책'],
-        '보건_의료': ['정부_정책', '사회_복지']
-    }
+    related_pairs = SEMANTIC_RELATED_TOPICS
     
     relevance_score = 0.0
     for q_topic in query_topics:
@@ -1160,20 +3478,13 @@ def calculate_topic_relevance(query_topics: List[str], article_topics: List[str]
 def analyze_korean_context(query_text: str, article_content: str) -> float:
     """한국어 맥락 분석 (인명, 기관명, 고유명사 등)"""
     try:
-        # 정치인 이름 매칭
-        politicians = ['윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜']
-        # 기관명 매칭  
-        institutions = ['헌법재판소', '국회', '청와대', '정부', '검찰', '법원']
-        # 사건/이슈명 매칭
-        events = ['탄핵', '파면', '선거', '국정감사', '수사', '기소']
-        
-        query_lower = query_text.lower()
-        article_lower = article_content.lower()
+        query_lower = semantic_dictionary_hits(query_text.lower())
+        article_lower = semantic_dictionary_hits(article_content.lower())
         
         context_matches = 0
         total_contexts = 0
         
-        for context_list in [politicians, institutions, events]:
+        for context_list in KOREAN_CONTEXT_TERMS:
             for item in context_list:
                 total_contexts += 1
                 if item in query_lower and item in article_lower:
@@ -1232,24 +3543,16 @@ def analyze_content_relevance_with_ai(query_text: str, article_content: str) ->
 
 def extract_key_entities(query_text: str, article_content: str) -> dict:
     """핵심 엔티티 추출 및 매칭"""
-    import re
-    
-    # 한국 정치 관련 핵심 엔티티
-    entities = {
-        'politicians': ['윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜', '김건희'],
-        'institutions': ['헌법재판소', '국회', '청와대', '대통령실', '검찰', '국정원'],
-        'parties': ['민주당', '국민의힘', '더불어민주당', '정의당', '개혁신당'],
-        'events': ['탄핵', '파면', '탄핵심판', '국정감사', '특검', '수사']
-    }
-    
+    query_hits = semantic_dictionary_hits(query_text)
+    article_hits = semantic_dictionary_hits(article_content)
     query_entities = set()
     article_entities = set()
     
-    for category, entity_list in entities.items():
+    for category, entity_list in KEY_ENTITY_TERMS.items():
         for entity in entity_list:
-            if entity in query_text:
+            if entity in query_hits:
                 query_entities.add(entity)
-            if entity in article_content:
+            if entity in article_hits:
                 article_entities.add(entity)
     
     # 공통 엔티티 계산
@@ -1266,22 +3569,12 @@ def extract_key_entities(query_text: str, article_content: str) -> dict:
 
 def analyze_temporal_context(query_text: str, article_content: str) -> float:
     """시간적 맥락 분석"""
-    import re
-    
-    # 날짜 패턴 매칭
-    date_patterns = [
-        r'\d{4}년\s*\d{1,2}월',      # 2025년 10월
-        r'\d{1,2}월\s*\d{1,2}일',    # 10월 25일
-        r'\d{4}\s*년',               # 2025년
-        r'어제|오늘|내일|이번주|다음주|지난주'
-    ]
-    
     query_dates = []
     article_dates = []
     
-    for pattern in date_patterns:
-        query_dates.extend(re.findall(pattern, query_text))
-        article_dates.extend(re.findall(pattern, article_content))
+    for pattern in TEMPORAL_DATE_PATTERNS:
+        query_dates.extend(pattern.findall(query_text))
+        article_dates.extend(pattern.findall(article_content))
     
     if not query_dates and not article_dates:
         return 0.5  # 중립
@@ -1298,24 +3591,18 @@ def analyze_temporal_context(query_text: str, article_content: str) -> float:
 
 def analyze_event_relationships(query_text: str, article_content: str) -> float:
     """사건 간 연관성 분석"""
-    
-    # 사건 연관 맵핑
-    event_relationships = {
-        '탄핵': ['헌법재판소', '헌재', '심판', '파면', '정치'],
-        '파면': ['탄핵', '헌법재판소', '대통령', '권한정지'],
-        '선거': ['후보', '투표', '정당', '선거운동', '공약'],
-        '수사': ['검찰', '기소', '혐의', '조사', '증거'],
-        '국정감사': ['국회', '의원', '감사', '질의', '답변']
-    }
+    event_relationships = EVENT_RELATIONSHIPS
+    query_hits = semantic_dictionary_hits(query_text)
+    article_hits = semantic_dictionary_hits(article_content)
     
     query_events = []
     article_events = []
     
     # 쿼리와 기사에서 사건 추출
     for event, related_terms in event_relationships.items():
-        if event in query_text:
+        if event in query_hits:
             query_events.append(event)
-        if event in article_content:
+        if event in article_hits:
             article_events.append(event)
     
     if not query_events:
@@ -1332,7 +3619,7 @@ def analyze_event_relationships(query_text: str, article_content: str) -> float:
         if q_event in event_relationships:
             related_terms = event_relationships[q_event]
             for term in related_terms:
-                if term in article_content:
+                if term in article_hits:
                     relationship_score += 0.2  # 연관 용어당 0.2점
     
     return min(relationship_score, 1.0)
@@ -1341,13 +3628,13 @@ def analyze_event_relationships(query_text: str, article_content: str) -> float:
 def analyze_sentiment_consistency(query_text: str, article_content: str) -> float:
     """감정/논조 일관성 분석"""
     
-    # 긍정적/부정적 키워드
-    positive_keywords = ['성공', '발전', '개선', '증가', '상승', '긍정', '희망']
-    negative_keywords = ['실패', '문제', '감소', '하락', '부정', '우려', '비판', '논란']
+    positive_keywords = SENTIMENT_POSITIVE_KEYWORDS
+    negative_keywords = SENTIMENT_NEGATIVE_KEYWORDS
     
     def get_sentiment_score(text):
-        pos_count = sum(1 for word in positive_keywords if word in text)
-        neg_count = sum(1 for word in negative_keywords if word in text)
+        hits = semantic_dictionary_hits(text)
+        pos_count = sum(1 for word in positive_keywords if word in hits)
+        neg_count = sum(1 for word in negative_keywords if word in hits)
         
         if pos_count > neg_count:
             return 1  # 긍정
@@ -1367,6 +3654,96 @@ def analyze_sentiment_consistency(query_text: str, article_content: str) -> floa
     else:
         return 0.0  # 불일치
 
+def _term_cols(terms) -> np.ndarray:
+    return np.array([_SEMANTIC_TERM_COL[t] for t in terms], dtype=np.int64)
+
+def semantic_term_presence(texts: List[str]) -> np.ndarray:
+    """텍스트별 SEMANTIC_HEURISTIC_TERMS 포함 여부 (bool 행렬, 텍스트 x 용어)"""
+    present = np.zeros((len(texts), len(SEMANTIC_HEURISTIC_TERMS)), dtype=bool)
+    for row, text in enumerate(texts):
+        hits = semantic_dictionary_hits(text or "")
+        if hits:
+            present[row, _term_cols(hits)] = True
+    return present
+
+def analyze_semantic_relevance_batch(query_text: str, article_contents: List[str], article_vectors: np.ndarray,
+                                     embedder=None, query_vector: Optional[np.ndarray] = None) -> dict:
+    """
+    analyze_semantic_relevance 의 배치 버전 (후보 기사 전체를 한 번에 채점)
+    
+    질의는 한 번만 임베딩하고 (query_vector 를 주면 재사용), 기사 임베딩은 인덱스에 저장된
+    행 벡터(article_vectors)를 그대로 사용합니다. 주제/맥락/AI 휴리스틱은 용어 포함 행렬
+    하나로부터 열 연산으로 계산하며, 기사별 점수는 analyze_semantic_relevance 와 같습니다.
+    
+    Returns:
+        dict: 점수 배열 (semantic_similarity, topic_relevance, context_score, ai_relevance, final_score)
+              + query_topics / article_topics (기사별 목록)
+    """
+    n = len(article_contents)
+    if query_vector is None:
+        query_vector = embedder.encode([query_text], convert_to_numpy=True, normalize_embeddings=True)[0]
+    q_vec = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+    q_vec = q_vec / max(float(np.linalg.norm(q_vec)), 1e-12)
+    a_vecs = np.asarray(article_vectors, dtype=np.float32).reshape(n, -1)
+    semantic_similarity = (a_vecs @ q_vec) / np.maximum(np.linalg.norm(a_vecs, axis=1), 1e-12)
+
+    present = semantic_term_presence([query_text] + list(article_contents))
+    q_terms, a_terms = present[0], present[1:]
+
+    # 1. 주제 연관성 (calculate_topic_relevance)
+    topics = list(SEMANTIC_TOPIC_PATTERNS)
+    topic_hits = np.stack([present[:, _term_cols(SEMANTIC_TOPIC_PATTERNS[t])].any(axis=1) for t in topics], axis=1)
+    q_topics, a_topics = topic_hits[0], topic_hits[1:]
+    related = np.array([[a in SEMANTIC_RELATED_TOPICS.get(q, ()) for a in topics] for q in topics], dtype=np.float64)
+    n_q_topics = int(q_topics.sum())
+    n_a_topics = a_topics.sum(axis=1)
+    common_topics = (a_topics & q_topics).sum(axis=1)
+    related_score = np.minimum(0.5 * (a_topics @ (q_topics.astype(np.float64) @ related)), 1.0)
+    topic_relevance = np.where(
+        (n_q_topics == 0) | (n_a_topics == 0), 0.0,
+        np.where(common_topics > 0, common_topics / np.maximum(np.maximum(n_q_topics, n_a_topics), 1), related_score))
+
+    # 2. 한국어 맥락 (analyze_korean_context: 양쪽 모두 2점, 한쪽만 1점)
+    ctx_cols = _term_cols([item for group in KOREAN_CONTEXT_TERMS for item in group])
+    context_score = np.minimum((int(q_terms[ctx_cols].sum()) + a_terms[:, ctx_cols].sum(axis=1)) / (len(ctx_cols) * 2), 1.0)
+
+    # 3. AI 연관성 (analyze_content_relevance_with_ai 의 네 가지 휴리스틱)
+    ent_cols = np.unique(_term_cols([e for group in KEY_ENTITY_TERMS.values() for e in group]))
+    q_ent = q_terms[ent_cols]
+    entity_score = (a_terms[:, ent_cols] & q_ent).sum(axis=1) / int(q_ent.sum()) if q_ent.any() else np.zeros(n)
+
+    q_dates = {d for p in TEMPORAL_DATE_PATTERNS for d in p.findall(query_text)}
+    temporal_score = np.empty(n, dtype=np.float64)
+    for row, content in enumerate(article_contents):
+        a_dates = {d for p in TEMPORAL_DATE_PATTERNS for d in p.findall(content or "")}
+        temporal_score[row] = 0.5 if not q_dates and not a_dates else (0.8 if q_dates & a_dates else 0.3)
+
+    q_events = [e for e in EVENT_RELATIONSHIPS if q_terms[_SEMANTIC_TERM_COL[e]]]
+    if q_events:
+        direct = a_terms[:, _term_cols(q_events)].any(axis=1)
+        related_terms = sum(a_terms[:, _term_cols(EVENT_RELATIONSHIPS[e])].sum(axis=1) for e in q_events)
+        event_score = np.where(direct, 1.0, np.minimum(0.2 * related_terms, 1.0))
+    else:
+        event_score = np.full(n, 0.5)
+
+    pos_cols, neg_cols = _term_cols(SENTIMENT_POSITIVE_KEYWORDS), _term_cols(SENTIMENT_NEGATIVE_KEYWORDS)
+    sentiment = np.sign(present[:, pos_cols].sum(axis=1) - present[:, neg_cols].sum(axis=1))
+    sentiment_score = 1.0 - 0.5 * np.abs(sentiment[1:] - sentiment[0])
+
+    ai_relevance = np.minimum(entity_score * 0.4 + temporal_score * 0.2 + event_score * 0.3 + sentiment_score * 0.1, 1.0)
+
+    # 4. 종합 연관성 점수 (analyze_semantic_relevance 와 같은 가중치)
+    final_score = semantic_similarity * 0.25 + topic_relevance * 0.25 + context_score * 0.2 + ai_relevance * 0.3
+    return {
+        'semantic_similarity': semantic_similarity,
+        'topic_relevance': topic_relevance,
+        'context_score': context_score,
+        'ai_relevance': ai_relevance,
+        'final_score': final_score,
+        'query_topics': [t for t, hit in zip(topics, q_topics) if hit],
+        'article_topics': [[t for t, hit in zip(topics, row) if hit] for row in a_topics],
+    }
+
 @torch.no_grad()
 def nli_batch_probs(pairs: List[Tuple[str, str]], tok, mdl, batch_size: int, use_fp16: bool) -> np.ndarray:
     outs = []
@@ -1500,19 +3877,41 @@ def process_seed(seed: str, embedder, embed_batch: int, fast_extract: bool,
         ))
     return list(vecs), recs
 
+def chunk_records(text_chunks: List[Tuple[str, str, str, str]]) -> List[DocRecord]:
+    """크롤링 청크 (url, dt, title, chunk) → DocRecord"""
+    return [DocRecord(
+        url=url,
+        title=title or "",
+        published=(dt.timestamp() if dt else None),
+        chunk=ch,
+        domain=domain_of(url),
+        from_seed=True
+    ) for url, dt, title, ch in text_chunks]
+
 # GPU 최대 활용 배치 임베딩 처리
-def batch_embed_texts(text_chunks: List[Tuple[str, str, str, str]], embedder, embed_batch: int) -> Tuple[List[np.ndarray], List[DocRecord]]:
-    """텍스트 청크들을 배치로 임베딩 처리 - GPU 최대 활용 (분할 처리)"""
+def batch_embed_texts(text_chunks: List[Tuple[str, str, str, str]], embedder, embed_batch: int,
+                      cache: Optional[EmbeddingCache] = None) -> Tuple[List[np.ndarray], List[DocRecord]]:
+    """텍스트 청크들을 배치로 임베딩 처리 - GPU 최대 활용 (분할 처리)
+    cache 를 주면 캐시에 없는 청크만 모델로 임베딩하고 결과를 캐시에 넣는다."""
     if not text_chunks:
         return [], []
     
     texts = [chunk[3] for chunk in text_chunks]  # 텍스트만 추출
+    cached, keys = {}, []
+    if cache is not None:
+        model_name = embedder_model_name(embedder)
+        keys = [embed_cache_key(model_name, t) for t in texts]
+        cached = cache.get_many(keys)
+        texts = [t for t, k in zip(texts, keys) if k not in cached]
+        print(f"[캐시] 임베딩 캐시 적중: {len(text_chunks) - len(texts):,}/{len(text_chunks):,}개 청크")
     total_texts = len(texts)
     
     print(f"[GPU] GPU 최대 활용 임베딩 시작: {total_texts:,}개 청크")
     
     # RTX3070ti 8GB에 맞는 메모리 관리
-    if torch.cuda.is_available():
+    if not texts:
+        vecs = []
+    elif torch.cuda.is_available():
         torch.cuda.empty_cache()
         
         # 대용량 데이터 분할 처리 전략
@@ -1585,17 +3984,15 @@ def batch_embed_texts(text_chunks: List[Tuple[str, str, str, str]], embedder, em
             device='cpu'
         )
     
+    if cache is not None:
+        # 새로 임베딩한 청크를 캐시에 넣고 원래 순서대로 합친다
+        miss_keys = [k for k in keys if k not in cached]
+        cache.put_many(zip(miss_keys, vecs))
+        fresh = dict(zip(miss_keys, vecs))
+        vecs = [cached[k] if k in cached else fresh[k] for k in keys]
+    
     # DocRecord 생성
-    recs = []
-    for (url, dt, title, ch), v in zip(text_chunks, vecs):
-        recs.append(DocRecord(
-            url=url,
-            title=title or "",
-            published=(dt.timestamp() if dt else None),
-            chunk=ch,
-            domain=domain_of(url),
-            from_seed=True
-        ))
+    recs = chunk_records(text_chunks)
     
     # GPU 메모리 정리
     if torch.cuda.is_available():
@@ -1604,9 +4001,130 @@ def batch_embed_texts(text_chunks: List[Tuple[str, str, str, str]], embedder, em
     print(f"✅ 임베딩 완료: {len(recs):,}개 벡터 생성")
     return list(vecs), recs
 
+# --------------------------------------------------------------------------------------------
+# 빌드 시 근접 중복 청크 합치기 (SimHash)
+#   통신사 기사가 여러 언론사에 그대로 실리거나 make_chunks 창이 겹치는 청크를 임베딩 전에 하나로 합친다.
+#   64비트 SimHash 를 16비트씩 4개 밴드로 나누면 해밍 거리 3 이하인 쌍은 반드시 한 밴드가 같다 (비둘기집).
+SIMHASH_BANDS = 4
+
+def chunk_simhash(texts: List[str], shingle: int = BUILD_NEAR_DUP_SHINGLE) -> np.ndarray:
+    """텍스트별 64비트 SimHash (정규화한 단어 shingle 의 blake2b 해시 비트 다수결)"""
+    out = np.zeros(len(texts), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        words = _normalize_chunk_text(text).split()
+        grams = {" ".join(words[j:j + shingle]) for j in range(max(1, len(words) - shingle + 1))}
+        if not grams:
+            continue
+        h = np.frombuffer(b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams), dtype="<u8")
+        bits = np.unpackbits(h.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little").reshape(-1, 64)
+        votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(h)
+        out[i] = np.packbits(votes, bitorder="little").view("<u8")[0]
+    return out
+
+def collapse_near_duplicate_chunks(text_chunks: List[Tuple[str, str, str, str]], max_hamming: int = BUILD_NEAR_DUP_HAMMING
+                                   ) -> Tuple[List[Tuple[str, str, str, str]], List[Tuple[str, ...]]]:
+    """SimHash 해밍 거리 max_hamming 이하인 청크를 먼저 나온 청크 하나로 합칩니다.
+    (남은 청크 목록, 청크별로 합쳐진 다른 URL 목록) 을 반환 - 출처 다양성 계산에 사용."""
+    if max_hamming is None or max_hamming < 0 or len(text_chunks) < 2:
+        return text_chunks, [() for _ in text_chunks]
+    sig = chunk_simhash([c[3] for c in text_chunks])
+    band_bits = 64 // SIMHASH_BANDS
+    if max_hamming >= SIMHASH_BANDS:
+        logger.warning("해밍 거리 %d 는 밴드 수(%d) 이상이라 일부 근접 중복을 놓칠 수 있습니다.", max_hamming, SIMHASH_BANDS)
+    buckets = [{} for _ in range(SIMHASH_BANDS)]
+    owner = np.arange(len(text_chunks))
+    for i, h in enumerate(sig.tolist()):
+        keys = [(h >> (b * band_bits)) & ((1 << band_bits) - 1) for b in range(SIMHASH_BANDS)]
+        for b, key in enumerate(keys):
+            for j in buckets[b].get(key, ()):
+                if bin(h ^ int(sig[j])).count("1") <= max_hamming:
+                    owner[i] = j
+                    break
+            if owner[i] != i:
+                break
+        else:
+            for b, key in enumerate(keys):
+                buckets[b].setdefault(key, []).append(i)
+    kept = np.flatnonzero(owner == np.arange(len(text_chunks)))
+    alt = {int(i): {} for i in kept}
+    for i in np.flatnonzero(owner != np.arange(len(text_chunks))).tolist():
+        url = text_chunks[i][0]
+        if url != text_chunks[owner[i]][0]:
+            alt[int(owner[i])][url] = None
+    return [text_chunks[i] for i in kept], [tuple(alt[int(i)]) for i in kept]
+
+# --------------------------------------------------------------------------------------------
+# 빌드 체크포인트 (build-index --resume) - INDEX_DIR.build/
+#   crawl/<시드 해시>.pkl      시드별 크롤링 청크 목록 (완료된 시드는 재실행 시 건너뜀)
+#   embed/<배치 지문>.npy      BUILD_CHECKPOINT_ROWS 청크 단위 임베딩 (배치 내용 해시로 찾으므로 청크 목록이 바뀌어도
+#                              내용이 같은 배치는 재사용)
+#   빌드가 끝나 인덱스가 공개되면 삭제된다.
+BUILD_CHECKPOINT_ROWS = 20000
+
+def build_checkpoint_dir() -> str:
+    return INDEX_DIR + ".build"
+
+def _seed_checkpoint_path(checkpoint_dir: str, seed: str) -> str:
+    return os.path.join(checkpoint_dir, "crawl", hashlib.blake2b(seed.encode("utf-8"), digest_size=10).hexdigest() + ".pkl")
+
+def _save_checkpoint_pickle(path: str, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+def load_seed_checkpoint(checkpoint_dir: str, seed: str) -> Optional[List[Tuple[str, str, str, str]]]:
+    """완료된 시드의 크롤링 청크 (체크포인트가 없거나 손상되었으면 None)"""
+    path = _seed_checkpoint_path(checkpoint_dir, seed)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            saved_seed, chunks = pickle.load(f)
+        return chunks if saved_seed == seed else None
+    except Exception as e:
+        logger.warning(f"크롤링 체크포인트 손상 (다시 수집): {seed} ({e})")
+        return None
+
+def embed_with_checkpoints(text_chunks: List[Tuple[str, str, str, str]], embedder, embed_batch: int,
+                           checkpoint_dir: Optional[str], cache: Optional[EmbeddingCache] = None
+                           ) -> Tuple[List[np.ndarray], List[DocRecord]]:
+    """BUILD_CHECKPOINT_ROWS 청크씩 임베딩하며 배치마다 디스크에 저장합니다.
+    다시 실행하면 본문이 같은 배치는 저장된 임베딩을 쓴다."""
+    if checkpoint_dir is None:
+        return batch_embed_texts(text_chunks, embedder, embed_batch, cache)
+    embed_dir = os.path.join(checkpoint_dir, "embed")
+    os.makedirs(embed_dir, exist_ok=True)
+
+    all_vecs = []
+    n_batches = (len(text_chunks) + BUILD_CHECKPOINT_ROWS - 1) // BUILD_CHECKPOINT_ROWS
+    for b in range(n_batches):
+        batch = text_chunks[b * BUILD_CHECKPOINT_ROWS:(b + 1) * BUILD_CHECKPOINT_ROWS]
+        digest = hashlib.blake2b(digest_size=16)
+        for c in batch:
+            digest.update(c[3].encode("utf-8") + b"\0")
+        path = os.path.join(embed_dir, digest.hexdigest() + ".npy")
+        if os.path.exists(path):
+            vecs = np.load(path)
+            if len(vecs) == len(batch):
+                print(f"   ♻️  임베딩 배치 {b + 1}/{n_batches}: 체크포인트 사용 ({len(batch):,}개)")
+                all_vecs.extend(vecs)
+                continue
+        print(f"   📦 임베딩 배치 {b + 1}/{n_batches}")
+        vecs, _ = batch_embed_texts(batch, embedder, embed_batch, cache)
+        vecs = np.asarray(vecs, dtype=np.float32)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, vecs)
+        os.replace(path + ".tmp", path)
+        all_vecs.extend(vecs)
+    return all_vecs, chunk_records(text_chunks)
+
 # --------------------------------------------------------------------------------------------
 # 병렬 빌드 - 메모리 최적화
-def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch: int, fast_extract: bool) -> IndexPack:
+def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch: int, fast_extract: bool,
+                         checkpoint_dir: Optional[str] = None, resume: bool = False) -> IndexPack:
+    """시드 크롤링 → 근접 중복 합치기 → 임베딩.
+    checkpoint_dir 를 주면 시드별 크롤링 결과와 임베딩 배치를 저장하고, resume=True 면 저장된 것은 건너뛴다."""
     # 128GB RAM 활용을 위한 초기 용량 설정
     estimated_chunks = len(seeds) * MAX_PAGES_PER_DOMAIN * 5  # 페이지당 평균 5개 청크 예상
     all_vecs, all_recs = [], []
@@ -1660,16 +4178,28 @@ def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch:
             pages_processed += n
 
     completed_seeds = 0
-    all_text_chunks = []
+    seed_chunks = {}    # 시드 → 크롤링 청크 (완료 순서와 무관하게 시드 순서로 합침)
+
+    # 재개: 체크포인트가 있는 시드는 다시 크롤링하지 않음
+    if checkpoint_dir and resume:
+        for s in seeds:
+            chunks = load_seed_checkpoint(checkpoint_dir, s)
+            if chunks is not None:
+                seed_chunks[s] = chunks
+                completed_seeds += 1
+                seeds_progress.update(1)
+        if seed_chunks:
+            print(f"♻️  크롤링 체크포인트 사용: {len(seed_chunks)}/{len(seeds)}개 시드")
     
     with ThreadPoolExecutor(max_workers=effective_workers) as ex:
-        crawl_futs = {ex.submit(process_seed_crawl_only, s, fast_extract, safe_overall_update): s for s in seeds}
+        crawl_futs = {ex.submit(process_seed_crawl_only, s, fast_extract, safe_overall_update): s for s in seeds if s not in seed_chunks}
         for fut in as_completed(crawl_futs):
             s = crawl_futs[fut]
             try:
                 text_chunks = fut.result()
-                if text_chunks:
-                    all_text_chunks.extend(text_chunks)
+                seed_chunks[s] = text_chunks
+                if checkpoint_dir:
+                    _save_checkpoint_pickle(_seed_checkpoint_path(checkpoint_dir, s), (s, text_chunks))
                 
                 completed_seeds += 1
                 
@@ -1689,12 +4219,35 @@ def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch:
     # 크롤링 완료 후 최종 상태 표시
     seeds_progress.set_description("📰 크롤링 완료")
     seeds_progress.close()
+
+    all_text_chunks = []
+    crawled_urls = {}   # URL → 처음 수집한 시드 (시드 간 중복 수집 제거)
+    for s in seeds:
+        for c in seed_chunks.get(s) or ():
+            if crawled_urls.setdefault(c[0], s) == s:
+                all_text_chunks.append(c)
     
     print(f"\n[GPU] 2단계: GPU 최대 활용 임베딩 시작... (총 {len(all_text_chunks)}개 청크)")
     
+    # 근접 중복(통신사 전재 기사, 겹치는 청크 창) 은 임베딩 전에 하나로 합치고 다른 URL 은 목록으로 보존
+    if all_text_chunks and BUILD_NEAR_DUP_HAMMING >= 0:
+        before = len(all_text_chunks)
+        all_text_chunks, alt_urls = collapse_near_duplicate_chunks(all_text_chunks, BUILD_NEAR_DUP_HAMMING)
+        print(f"🧬 근접 중복 청크 합치기: {before:,} → {len(all_text_chunks):,}개")
+    else:
+        alt_urls = [() for _ in all_text_chunks]
+
     # 단계 2: 수집된 모든 텍스트를 한 번에 GPU에서 임베딩 (GPU 집약적)
     if all_text_chunks:
-        all_vecs, all_recs = batch_embed_texts(all_text_chunks, embedder, embed_batch)
+        # 이전 빌드와 본문이 같은 청크는 임베딩 캐시에서 가져옴
+        cache = open_embedding_cache()
+        try:
+            all_vecs, all_recs = embed_with_checkpoints(all_text_chunks, embedder, embed_batch, checkpoint_dir, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        for rec, alt in zip(all_recs, alt_urls):
+            rec.alt_urls = alt
         print(f"✅ 임베딩 완료! (최종 청크: {len(all_recs):,}개)")
     else:
         all_vecs, all_recs = [], []
@@ -1711,7 +4264,7 @@ def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch:
         raise RuntimeError("인덱스에 추가할 데이터가 없다. 시드/크롤링을 확인하라.")
     M = np.vstack(all_vecs).astype("float32")
     return IndexPack(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+        model_name=embedder_model_name(embedder),
         embed_dim=M.shape[1],
         matrix=M,
         records=all_recs
@@ -1719,15 +4272,31 @@ def build_index_parallel(seeds: List[str], embedder, workers: int, embed_batch:
 
 # --------------------------------------------------------------------------------------------
 # 인덱스 빌드/로드
-def build_index(workers: int, embed_batch: int, use_gpu: bool, fp16: bool, http_pool: int, timeout: int, sleep: float, fast_extract: bool, test_mode: bool = False):
+def build_index(workers: int, embed_batch: int, use_gpu: bool, fp16: bool, http_pool: int, timeout: int, sleep: float, fast_extract: bool, test_mode: bool = False,
+                ann_kind: str = "none", ann_nlist: int = 0, ann_hnsw_m: int = 32,
+                quant_kind: str = "none", pq_m: int = 96, compress_chunks: int = 0,
+                shards: int = 0, shard_by: str = "domain", rebuild_shard: Optional[int] = None,
+                near_dup_hamming: int = BUILD_NEAR_DUP_HAMMING, resume: bool = False,
+                embed_cache_rows: int = EMBED_CACHE_ROWS):
     configure_http(http_pool=http_pool, timeout=timeout)
-    global CRAWL_SLEEP
+    global CRAWL_SLEEP, CHUNK_COMPRESS_LEVEL, BUILD_NEAR_DUP_HAMMING, EMBED_CACHE_ROWS
     CRAWL_SLEEP = sleep
+    EMBED_CACHE_ROWS = embed_cache_rows
+    CHUNK_COMPRESS_LEVEL = compress_chunks
+    BUILD_NEAR_DUP_HAMMING = near_dup_hamming
 
     assert os.path.exists(SEED_CSV), f"seed csv not found: {SEED_CSV}"
     with open(SEED_CSV, "r", encoding="utf-8") as f:
         seeds = [canonical_url(r["url"]) for r in csv.DictReader(f) if r.get("url", "").startswith("http")]
     seeds = list(dict.fromkeys(seeds))
+
+    # 샤드 하나만 다시 빌드: 해당 샤드에 속하는 시드만 크롤링
+    if rebuild_shard is not None:
+        shard_meta = read_shard_meta(current_index_dir())
+        assert shard_meta and shard_meta["by"] == "domain", "--rebuild-shard 는 도메인 기준 샤드 인덱스에서만 사용할 수 있습니다."
+        assert 0 <= rebuild_shard < shard_meta["count"], f"샤드 번호 범위 초과: {rebuild_shard} (샤드 {shard_meta['count']}개)"
+        seeds = [s for s in seeds if shard_of_domain(domain_of(s), shard_meta["count"]) == rebuild_shard]
+        print(f"🧩 샤드 {rebuild_shard:03d} 재빌드: 시드 {len(seeds)}개")
     
     # 테스트 모드: 매우 소량의 시드만 사용 (빠른 테스트)
     if test_mode:
@@ -1751,31 +4320,534 @@ def build_index(workers: int, embed_batch: int, use_gpu: bool, fp16: bool, http_
         print(f"⚡ 예상 완료시간: 30-60분 (하드웨어에 따라)")
         print("=" * 50)
 
+    # 시드별 크롤링/임베딩 배치 체크포인트 (--resume 이 아니면 이전 체크포인트는 버림)
+    checkpoint_dir = build_checkpoint_dir()
+    if not resume:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    elif os.path.isdir(checkpoint_dir):
+        print(f"♻️  이전 빌드 체크포인트에서 재개: {checkpoint_dir}")
+
     embedder, _ = get_embedder(use_gpu=use_gpu, fp16=fp16)
-    pack = build_index_parallel(seeds, embedder, workers=workers, embed_batch=embed_batch, fast_extract=fast_extract)
-    with open(INDEX_PKL, "wb") as f:
-        pickle.dump(pack, f)
-    logger.info("[ok] index built: %s (rows=%d, dim=%d)", INDEX_PKL, pack.matrix.shape[0], pack.matrix.shape[1])
+    pack = build_index_parallel(seeds, embedder, workers=workers, embed_batch=embed_batch, fast_extract=fast_extract,
+                                checkpoint_dir=checkpoint_dir, resume=resume)
+    if rebuild_shard is not None:
+        replace_shard(INDEX_DIR, rebuild_shard, pack.model_name, pack.matrix, pack.records)
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        return
+    if shards > 1 or shard_by == "year":
+        tmp_dir = INDEX_DIR + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        write_sharded_index(tmp_dir, pack.model_name, pack.matrix, pack.records, shards, shard_by)
+        with index_file_lock(INDEX_DIR + ".lock"):
+            publish_index_version(tmp_dir)
+        gc_index_versions()
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        logger.info("[ok] sharded index built: %s (rows=%d, shards=%d by %s)", INDEX_DIR, len(pack.records), shards, shard_by)
+        if ann_kind != "none" or quant_kind != "none":
+            logger.warning("ANN/양자화 인덱스는 base 세그먼트 전용이라 샤드 인덱스에서는 만들지 않습니다.")
+        return
+    save_index(pack)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    logger.info("[ok] index built: %s (rows=%d, dim=%d)", INDEX_DIR, pack.matrix.shape[0], pack.matrix.shape[1])
+    if ann_kind != "none" or quant_kind != "none":
+        publish_base_sidecars(
+            ann=dict(kind=ann_kind, nlist=ann_nlist, hnsw_m=ann_hnsw_m) if ann_kind != "none" else None,
+            quant=dict(kind=quant_kind, pq_m=pq_m) if quant_kind != "none" else None)
+
+def index_exists() -> bool:
+    return os.path.exists(os.path.join(current_index_dir(), "meta.json")) or os.path.exists(INDEX_PKL)
+
+class _LegacyIndexUnpickler(pickle.Unpickler):
+    """__main__ 으로 실행되며 저장된 IndexPack/DocRecord 를 현재 모듈의 클래스로 매핑"""
+    def find_class(self, module, name):
+        if name in ("IndexPack", "DocRecord"):
+            return globals()[name]
+        return super().find_class(module, name)
+
+def convert_pickle_index(pkl_path: str = INDEX_PKL, index_dir: str = INDEX_DIR):
+    """기존 pickle(IndexPack) 인덱스를 온디스크 포맷으로 1회 변환합니다."""
+    assert os.path.exists(pkl_path), f"index pkl not found: {pkl_path}"
+    t0 = time.time()
+    with open(pkl_path, "rb") as f:
+        legacy = _LegacyIndexUnpickler(f).load()
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    write_index_dir(tmp_dir, legacy.model_name, legacy.matrix, legacy.records, embed_dim=legacy.embed_dim)
+    with index_file_lock(index_dir + ".lock"):
+        publish_index_version(tmp_dir, index_dir)
+    gc_index_versions(index_dir)
+    logger.info("[ok] index converted: %s -> %s (rows=%d, %.1fs)", pkl_path, index_dir, legacy.matrix.shape[0], time.time() - t0)
 
 def load_index() -> IndexPack:
-    assert os.path.exists(INDEX_PKL), f"index pkl not found: {INDEX_PKL}"
-    with open(INDEX_PKL, "rb") as f:
-        return pickle.load(f)
+    """현재 버전의 온디스크 인덱스를 mmap 으로 연다. 온디스크 인덱스가 없고 pickle 만 있으면 1회 변환 후 연다.
+    연 버전에는 리더 lease 를 잡아 두어, 새 버전이 공개되어도 pack 이 살아 있는 동안 지워지지 않는다."""
+    if not os.path.exists(os.path.join(current_index_dir(), "meta.json")) and os.path.exists(INDEX_PKL):
+        logger.warning("온디스크 인덱스가 없어 pickle 인덱스를 변환합니다: %s -> %s", INDEX_PKL, INDEX_DIR)
+        convert_pickle_index(INDEX_PKL, INDEX_DIR)
+    while True:
+        version = read_current_version() or LEGACY_VERSION
+        lease = _acquire_reader_lease(version)
+        # lease 를 잡는 사이 새 버전이 공개되었으면 (이전 버전이 GC 됐을 수 있으므로) 다시 시도
+        if (read_current_version() or LEGACY_VERSION) == version:
+            break
+        _release_reader_lease(lease)
+    index_dir = version_dir(version)
+    try:
+        assert os.path.exists(os.path.join(index_dir, "meta.json")), f"index not found: {INDEX_DIR}"
+        stamp = _index_stamp(index_dir, version)
+        pack = open_index_dir(index_dir)
+    except BaseException:
+        _release_reader_lease(lease)
+        raise
+    pack.version, pack.stamp, pack.lease = version, stamp, lease
+    weakref.finalize(pack, _release_reader_lease, lease)
+    return pack
 
 def save_index(pack: IndexPack):
-    """인덱스를 파일에 저장합니다."""
-    with open(INDEX_PKL, "wb") as f:
-        pickle.dump(pack, f)
-    logger.info("[ok] index saved: %s (rows=%d, dim=%d)", INDEX_PKL, pack.matrix.shape[0], pack.matrix.shape[1])
+    """인덱스 전체(base + delta)를 하나의 base 로 다시 기록해 새 버전으로 공개합니다.
+    빌드 직후처럼 전체를 새로 쓸 때만 사용하고, 평가 중 URL 추가는 add_url_to_index 의 delta 를 사용."""
+    tmp_dir = INDEX_DIR + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    write_index_dir(tmp_dir, pack.model_name, [m for _, m, _ in pack.iter_segments()], pack.iter_records(),
+                    embed_dim=pack.embed_dim)
+    with index_file_lock(INDEX_DIR + ".lock"):
+        publish_index_version(tmp_dir)
+    gc_index_versions()
+    logger.info("[ok] index saved: %s (rows=%d, dim=%d)", INDEX_DIR, len(pack), pack.embed_dim)
+
+# delta 세그먼트가 이 개수 이상 쌓이면 백그라운드 병합(merge-index)을 띄운다
+DELTA_MERGE_THRESHOLD = 32
+
+def append_delta_segment(pack: IndexPack, matrix: np.ndarray, records: List[DocRecord]) -> IndexSegment:
+    """새 행들을 append-only delta 세그먼트로 기록하고 pack 에 연결합니다 (base 는 건드리지 않음)."""
+    name = f"{time.time_ns():020d}-{os.getpid()}"
+    staging_dir = os.path.join(INDEX_DIR + ".staging", name)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    write_index_dir(staging_dir, pack.model_name, matrix, records, compress_level=0)
+    # 새 버전 공개(merge-index 등)와 겹치지 않도록 잠금 하에서 현재 버전에 rename 으로 공개
+    with index_file_lock(INDEX_DIR + ".lock"):
+        version = read_current_version()
+        delta_root = os.path.join(version_dir(version or LEGACY_VERSION), "deltas")
+        os.makedirs(delta_root, exist_ok=True)
+        os.replace(staging_dir, os.path.join(delta_root, name))
+        write_index_manifest(os.path.dirname(delta_root), version)
+    seg_dir = os.path.join(delta_root, name)
+    seg = IndexSegment(name=name, matrix=_load_npy(os.path.join(seg_dir, "matrix.npy")), records=RecordColumns.open(seg_dir), path=seg_dir)
+    seg.urls = UrlMap.open(seg_dir, seg.records)
+    pack.deltas.append(seg)
+    logger.info("delta 세그먼트 추가: %s (%d행, 누적 delta %d개)", name, len(seg.records), len(pack.deltas))
+    return seg
+
+def _live_row_ranges(rows: int, dead: List[List[int]]) -> List[Tuple[int, int]]:
+    """삭제 범위를 뺀 나머지 행 구간 목록"""
+    out, pos = [], 0
+    for a, b in sorted(dead):
+        if a > pos:
+            out.append((pos, a))
+        pos = max(pos, b)
+    if pos < rows:
+        out.append((pos, rows))
+    return out
 
-def add_url_to_index(url: str, text: str, dt, title: str, embedder, pack: IndexPack) -> bool:
-    """URL을 인덱스에 추가합니다. 이미 존재하면 False, 추가되면 True를 반환합니다."""
-    
-    # URL 중복 체크
-    for record in pack.records:
-        if record.url == url:
+def _carry_live_segments(live_dir: str, tmp_dir: str, included: Iterable[str], shards: bool):
+    """새 버전(tmp_dir)으로 넘길 세그먼트를 하드링크로 옮긴다: 작업 도중 추가된 delta, 그리고 shards=True 면 샤드.
+    이전 버전 디렉터리는 그대로 두어 아직 그 버전을 읽는 프로세스에 영향이 없다."""
+    delta_root = os.path.join(live_dir, "deltas")
+    if os.path.isdir(delta_root):
+        for name in os.listdir(delta_root):
+            if name not in included:
+                _link_tree(os.path.join(delta_root, name), os.path.join(tmp_dir, "deltas", name))
+    if shards and os.path.isdir(os.path.join(live_dir, "shards")):
+        _link_tree(os.path.join(live_dir, "shards"), os.path.join(tmp_dir, "shards"))
+
+def _merge_deltas_into_base() -> int:
+    pack = load_index()
+    if not pack.deltas and not pack.deleted:
+        return 0
+    live_dir = pack.index_dir
+    merged = {seg.name for seg in pack.deltas}
+    t0 = time.time()
+    tmp_dir = INDEX_DIR + ".merge"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    # 삭제(tombstone)된 행은 빼고 기록. new_pos: (세그먼트, 기존 행) → 새 base 행 (병합 중 추가된 삭제 재매핑용)
+    blocks, live, new_offset = [], {}, {}
+    pos = 0
+    for name, _, matrix, records in pack.iter_named_segments(include_shards=False):
+        live[name] = _live_row_ranges(len(records), pack.deleted.get(name, []))
+        new_offset[name] = pos
+        for a, b in live[name]:
+            blocks.append(matrix[a:b])
+            pos += b - a
+    def live_records():
+        for name, _, _, records in pack.iter_named_segments(include_shards=False):
+            for a, b in live[name]:
+                for i in range(a, b):
+                    yield records[i]
+    def new_pos(name: str, row: int) -> Optional[int]:
+        p = new_offset[name]
+        for a, b in live[name]:
+            if a <= row < b:
+                return p + row - a
+            p += b - a
+        return None
+    compress_level = read_index_meta(live_dir).get("chunk_compress_level", 0)
+    write_index_dir(tmp_dir, pack.model_name, blocks, live_records(), embed_dim=pack.embed_dim,
+                    compress_level=compress_level)
+    # 기존에 ANN 인덱스가 있었다면 병합된 base 기준으로 다시 만든다
+    ann_meta = read_ann_meta(live_dir)
+    if ann_meta and FAISS_AVAILABLE:
+        build_ann_index(tmp_dir, kind=ann_meta["kind"], nlist=ann_meta.get("nlist", 0), hnsw_m=ann_meta.get("hnsw_m", 32))
+    quant_meta = read_quant_meta(live_dir)
+    if quant_meta and (quant_meta["kind"] == "int8" or FAISS_AVAILABLE):
+        build_quant_index(tmp_dir, kind=quant_meta["kind"], pq_m=quant_meta.get("pq_m", 96))
+    with index_file_lock(INDEX_DIR + ".lock"):
+        if current_index_dir() != live_dir:
+            # 병합 도중 다른 작업(build-index 등)이 새 버전을 공개했으면 이번 병합은 버린다
+            logger.warning("병합 도중 새 인덱스 버전이 공개되어 병합 결과를 버립니다.")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return 0
+        # 병합 도중 새로 추가된 delta 와 (병합 대상이 아닌) 샤드는 새 버전으로 옮겨 보존
+        _carry_live_segments(live_dir, tmp_dir, merged, shards=True)
+        # 병합 도중 추가된 삭제: 병합된 세그먼트 것은 새 base 행으로 옮기고, 나머지 delta 것은 그대로 유지
+        carried = {}
+        for name, ranges in read_tombstones(live_dir).items():
+            for a, b in ranges:
+                if name not in new_offset:
+                    carried.setdefault(name, []).append([a, b])
+                    continue
+                if [a, b] in pack.deleted.get(name, []):
+                    continue
+                rows = [r for r in (new_pos(name, i) for i in range(a, b)) if r is not None]
+                if rows:
+                    carried.setdefault(BASE_SEGMENT, []).append([rows[0], rows[-1] + 1])
+        write_tombstones(tmp_dir, carried)
+        publish_index_version(tmp_dir)
+    pack = None
+    gc_index_versions()
+    logger.info("[ok] delta 병합 완료: %d개 세그먼트 → base (rows=%d, %.1fs)", len(merged), pos, time.time() - t0)
+    return len(merged)
+
+def merge_index_deltas() -> int:
+    """delta 세그먼트를 base 에 병합합니다. 병합한 delta 수를 반환 (다른 병합이 진행 중이면 0)."""
+    merge_lock = index_file_lock(INDEX_DIR + ".merge.lock", timeout=0)
+    try:
+        merge_lock.__enter__()
+    except TimeoutError:
+        logger.info("다른 인덱스 병합이 진행 중이어서 건너뜀")
+        return 0
+    try:
+        return _merge_deltas_into_base()
+    finally:
+        merge_lock.__exit__(None, None, None)
+
+# --------------------------------------------------------------------------------------------
+# 인덱스 정리 (compact-index): 중복/오래된/시드 목록에서 빠진 도메인 청크 제거 + 행 재배치
+COMPACT_NEAR_DUP_THRESHOLD = 0.97   # 이 코사인 유사도 이상이면 거의 같은 청크로 보고 앞선 행만 남김
+COMPACT_LSH_BITS = 64               # 근접 중복 후보를 찾는 랜덤 초평면 부호 비트 수
+COMPACT_LSH_BANDS = 4               # 비트를 나눈 밴드 수 (밴드 하나라도 같으면 후보)
+COMPACT_LSH_MAX_BUCKET = 2048       # 버킷이 이보다 크면 나눠서 비교
+COMPACT_BENCH_QUERIES = 16
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _normalize_chunk_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+def _unit_rows(vecs: np.ndarray) -> np.ndarray:
+    vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+    return vecs
+
+def _near_duplicate_mask(pack: IndexPack, rows: np.ndarray, threshold: float) -> np.ndarray:
+    """전역 행 목록(rows) 중 앞선 행과 코사인 유사도가 threshold 이상인 행을 표시합니다.
+    전체 쌍을 비교하지 않고 LSH 밴드 버킷이 같은 행끼리만 비교한다. 밴드 키는 행렬을
+    ANN_ADD_BLOCK 행 블록으로 읽어 계산하고, 비교할 때는 버킷 행의 벡터만 다시 읽으므로
+    전체 행렬을 메모리에 올리지 않는다."""
+    n = len(rows)
+    dup = np.zeros(n, dtype=bool)
+    if n < 2:
+        return dup
+    planes = np.random.default_rng(0).standard_normal((pack.embed_dim, COMPACT_LSH_BITS)).astype(np.float32)
+    band_bits = COMPACT_LSH_BITS // COMPACT_LSH_BANDS
+    weights = np.left_shift(np.uint64(1), np.arange(band_bits, dtype=np.uint64))
+    band_keys = np.empty((n, COMPACT_LSH_BANDS), dtype=np.uint64)
+    for pos in range(0, n, ANN_ADD_BLOCK):
+        bits = (_unit_rows(pack.vectors(rows[pos:pos + ANN_ADD_BLOCK])) @ planes) > 0
+        for band in range(COMPACT_LSH_BANDS):
+            band_keys[pos:pos + len(bits), band] = (bits[:, band * band_bits:(band + 1) * band_bits].astype(np.uint64) * weights).sum(axis=1)
+    for band in range(COMPACT_LSH_BANDS):
+        keys = band_keys[:, band]
+        order = np.argsort(keys, kind="stable")
+        for group in np.split(order, np.flatnonzero(np.diff(keys[order])) + 1):
+            group = np.sort(group[~dup[group]])
+            for s in range(0, len(group), COMPACT_LSH_MAX_BUCKET):
+                g = group[s:s + COMPACT_LSH_MAX_BUCKET]
+                if len(g) < 2:
+                    continue
+                vecs = _unit_rows(pack.vectors(rows[g]))
+                sims = vecs @ vecs.T
+                local = np.zeros(len(g), dtype=bool)
+                for j in range(1, len(g)):
+                    prev = sims[j, :j][~local[:j]]
+                    if prev.size and prev.max() >= threshold:
+                        local[j] = True
+                dup[g[local]] = True
+    return dup
+
+def _chunk_digests(pack: IndexPack, rows: np.ndarray) -> np.ndarray:
+    """전역 행 목록의 정규화 청크 본문 해시 (16바이트, 행 순서). 청크 컬럼만 읽고 DocRecord 는 만들지 않는다."""
+    buf = bytearray(16 * len(rows))
+    for name, start, _, records in pack.iter_named_segments():
+        sel = np.nonzero((rows >= start) & (rows < start + len(records)))[0]
+        if not len(sel):
+            continue
+        col = records.columns["chunk"] if isinstance(records, RecordColumns) else None
+        for j, r in zip(sel.tolist(), (rows[sel] - start).tolist()):
+            text = col[r] if col is not None else records[r].chunk
+            buf[16 * j:16 * j + 16] = hashlib.blake2b(_normalize_chunk_text(text).encode("utf-8"), digest_size=16).digest()
+    return np.frombuffer(bytes(buf), dtype=np.dtype([("hi", "<u8"), ("lo", "<u8")]))
+
+class _PackRowView:
+    """IndexPack 의 전역 행 목록을 DocRecord 시퀀스처럼 보여주는 뷰 (접근한 행만 DocRecord 로 만든다)"""
+
+    def __init__(self, pack: IndexPack, rows: np.ndarray):
+        self.rows = rows
+        self._segments = [(start, records) for start, _, records in pack.iter_segments()]
+        self._starts = np.array([start for start, _ in self._segments], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i) -> DocRecord:
+        row = int(self.rows[i])
+        start, records = self._segments[int(np.searchsorted(self._starts, row, side="right")) - 1]
+        return records[row - start]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+def _bench_search(pack: IndexPack, queries: np.ndarray) -> float:
+    """질의 행마다 search_index 를 돌려 중앙값 지연(ms)을 잰다."""
+    k = min(TOPK_CANDIDATES, len(pack))
+    if k == 0 or len(queries) == 0:
+        return 0.0
+    search_index(pack, queries[:1], k)  # 워밍업 (mmap 페이지 로딩)
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search_index(pack, q[None, :], k)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+def _seed_domains() -> set:
+    with open(SEED_CSV, "r", encoding="utf-8") as f:
+        return {domain_of(canonical_url(r["url"])) for r in csv.DictReader(f) if r.get("url", "").startswith("http")}
+
+def compact_index(max_age_days: Optional[float] = None,
+                  near_dup_threshold: float = COMPACT_NEAR_DUP_THRESHOLD,
+                  drop_unlisted_domains: bool = True) -> dict:
+    """인덱스 전체(base + shard + delta)를 정리해 다시 기록합니다.
+    - 정규화한 청크 본문 해시가 같은 청크, 임베딩 코사인 유사도가 near_dup_threshold 이상인 청크는 앞선 것만 남김
+    - published 가 max_age_days 보다 오래된 청크 제거 (발행일 없는 청크는 유지)
+    - SEED_CSV 에 더 이상 없는 도메인의 시드 크롤 청크 제거 (사용자 추가 URL 은 유지)
+    - 도메인 → 최신 발행일 → 기사 순으로 행을 재배치해 같은 기사/도메인 행이 붙어 있도록 함
+    절약한 바이트와 검색 지연 변화를 담은 통계 dict 를 반환한다."""
+    with index_file_lock(INDEX_DIR + ".merge.lock"):
+        t0 = time.time()
+        pack = load_index()
+        live_dir = pack.index_dir
+        bytes_before = _dir_size(live_dir)
+        included = set()
+        live_rows = []
+        for name, start, _, records in pack.iter_named_segments():
+            included.add(name)
+            idx = np.arange(len(records), dtype=np.int64)
+            dead = pack.deleted_mask(name, len(records))
+            live_rows.append((idx[~dead] if dead is not None else idx) + start)
+        rows = np.concatenate(live_rows) if live_rows else np.zeros(0, dtype=np.int64)
+        stats = {"rows_before": int(len(rows)), "bytes_before": bytes_before}
+        if len(rows) == 0:
+            logger.info("정리할 행이 없습니다.")
+            return stats
+
+        rng = np.random.default_rng(0)
+        bench_q = pack.vectors(np.sort(rng.choice(rows, size=min(COMPACT_BENCH_QUERIES, len(rows)), replace=False)))
+        stats["latency_ms_before"] = _bench_search(pack, bench_q)
+
+        # 필터/정렬에 필요한 필드는 컬럼에서 배열로 읽는다 (문자열 필드는 고유 값 표 + 정수 코드)
+        published = pack.column_values(rows, "published")
+        keep = np.ones(len(rows), dtype=bool)
+
+        if max_age_days:
+            cutoff = time.time() - max_age_days * 86400
+            stale = ~np.isnan(published) & (published < cutoff)
+            stats["dropped_stale"] = int((keep & stale).sum())
+            keep &= ~stale
+
+        domain_codes, domains = pack.string_codes(rows, "domain")
+        if drop_unlisted_domains and os.path.exists(SEED_CSV):
+            seed_doms = _seed_domains()
+            listed = np.array([any(dom == d or dom.endswith("." + d) for d in seed_doms) for dom in domains], dtype=bool)
+            unlisted = pack.column_values(rows, "from_seed") & ~listed[domain_codes]
+            stats["dropped_unlisted_domain"] = int((keep & unlisted).sum())
+            keep &= ~unlisted
+
+        cand = np.flatnonzero(keep)
+        _, first = np.unique(_chunk_digests(pack, rows[cand]), return_index=True)
+        exact = np.ones(len(cand), dtype=bool)
+        exact[first] = False
+        stats["dropped_exact_dup"] = int(exact.sum())
+        keep[cand[exact]] = False
+
+        if near_dup_threshold and near_dup_threshold < 1.0:
+            cand = np.flatnonzero(keep)
+            near = _near_duplicate_mask(pack, rows[cand], near_dup_threshold)
+            stats["dropped_near_dup"] = int(near.sum())
+            keep[cand[near]] = False
+
+        # 도메인 → 최신 발행일 → 기사(첫 등장 순) → 원래 순서
+        kept = np.flatnonzero(keep)
+        url_codes, urls = pack.string_codes(rows[kept], "url")
+        url_first = np.zeros(len(urls), dtype=np.int64)
+        uniq, first = np.unique(url_codes, return_index=True)
+        url_first[uniq] = kept[first]
+        domain_rank = np.empty(len(domains), dtype=np.int64)
+        domain_rank[sorted(range(len(domains)), key=domains.__getitem__)] = np.arange(len(domains))
+        newest = -np.nan_to_num(published[kept], nan=0.0)
+        order = kept[np.lexsort((kept, url_first[url_codes], newest, domain_rank[domain_codes[kept]]))]
+        new_rows = rows[order]
+        stats["rows_after"] = len(new_rows)
+
+        # 남길 행의 행렬은 블록 단위로 임시 mmap 파일에 모아 기록한다
+        matrix_path = INDEX_DIR + ".compact.matrix.npy"
+        if len(new_rows):
+            matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32,
+                                               shape=(len(new_rows), pack.embed_dim))
+            for pos in range(0, len(new_rows), ANN_ADD_BLOCK):
+                matrix[pos:pos + ANN_ADD_BLOCK] = pack.vectors(new_rows[pos:pos + ANN_ADD_BLOCK])
+            matrix.flush()
+        else:
+            matrix = np.zeros((0, pack.embed_dim), dtype=np.float32)
+        new_recs = _PackRowView(pack, new_rows)
+
+        tmp_dir = INDEX_DIR + ".compact"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shard_meta = read_shard_meta(live_dir)
+        if shard_meta:
+            write_sharded_index(tmp_dir, pack.model_name, matrix, new_recs, shard_meta["count"], shard_meta["by"])
+        else:
+            write_index_dir(tmp_dir, pack.model_name, matrix, new_recs,
+                            compress_level=read_index_meta(live_dir).get("chunk_compress_level", 0))
+            ann_meta = read_ann_meta(live_dir)
+            if ann_meta and FAISS_AVAILABLE and new_recs:
+                build_ann_index(tmp_dir, kind=ann_meta["kind"], nlist=ann_meta.get("nlist", 0), hnsw_m=ann_meta.get("hnsw_m", 32))
+            quant_meta = read_quant_meta(live_dir)
+            if quant_meta and (quant_meta["kind"] == "int8" or FAISS_AVAILABLE) and new_recs:
+                build_quant_index(tmp_dir, kind=quant_meta["kind"], pq_m=quant_meta.get("pq_m", 96))
+        deleted_snapshot = pack.deleted
+        pack = None
+        del matrix, new_recs
+        if os.path.exists(matrix_path):
+            os.remove(matrix_path)
+
+        with index_file_lock(INDEX_DIR + ".lock"):
+            if current_index_dir() != live_dir:
+                logger.warning("정리 도중 새 인덱스 버전이 공개되어 정리 결과를 버립니다.")
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                stats["aborted"] = True
+                return stats
+            # 정리 도중 새로 추가된 delta 와 그 삭제 기록은 그대로 옮긴다
+            _carry_live_segments(live_dir, tmp_dir, included, shards=False)
+            carried = {}
+            for name, ranges in read_tombstones(live_dir).items():
+                if name not in included:
+                    carried[name] = ranges
+                elif any(r not in deleted_snapshot.get(name, []) for r in ranges):
+                    logger.warning("정리 도중 삭제된 URL 이 있습니다 (%s). 필요하면 delete-url 을 다시 실행하세요.", name)
+            write_tombstones(tmp_dir, carried)
+            publish_index_version(tmp_dir)
+        gc_index_versions()
+
+        pack = load_index()
+        stats["bytes_after"] = _dir_size(pack.index_dir)
+        stats["bytes_saved"] = stats["bytes_before"] - stats["bytes_after"]
+        stats["latency_ms_after"] = _bench_search(pack, bench_q)
+        stats["elapsed_sec"] = round(time.time() - t0, 1)
+
+    print(f"\n🧹 인덱스 정리 완료 ({stats['elapsed_sec']}s)")
+    print(f"   행: {stats['rows_before']:,} → {stats['rows_after']:,}")
+    for key, label in (("dropped_exact_dup", "완전 중복"), ("dropped_near_dup", "근접 중복"),
+                       ("dropped_stale", "오래된 청크"), ("dropped_unlisted_domain", "시드 목록 외 도메인")):
+        if key in stats:
+            print(f"   - {label}: {stats[key]:,}")
+    print(f"   크기: {stats['bytes_before'] / 1024**2:.1f}MB → {stats['bytes_after'] / 1024**2:.1f}MB "
+          f"({stats['bytes_saved'] / 1024**2:.1f}MB 절약)")
+    print(f"   검색 지연(중앙값): {stats['latency_ms_before']:.1f}ms → {stats['latency_ms_after']:.1f}ms")
+    return stats
+
+def schedule_index_merge(pack: IndexPack):
+    """delta 가 임계치 이상이면 merge-index 를 별도 프로세스로 띄운다 (현재 요청은 기다리지 않음)."""
+    if len(pack.deltas) < DELTA_MERGE_THRESHOLD or os.path.exists(INDEX_DIR + ".merge.lock"):
+        return
+    if sys.platform == "win32":
+        detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    try:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "merge-index", "--quiet"],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **detach)
+        logger.info("백그라운드 인덱스 병합 시작 (delta %d개)", len(pack.deltas))
+    except Exception as e:
+        logger.warning(f"백그라운드 병합 실행 실패: {e}")
+
+def delete_url_from_index(url: str, pack: IndexPack) -> int:
+    """URL 의 청크들을 삭제(tombstone) 처리합니다. 삭제한 행 수를 반환.
+    행은 검색/URL 조회에서 바로 제외되고, 실제 제거는 다음 merge-index 때 이루어진다."""
+    while True:
+        found = []
+        for name, start, _, records in pack.iter_named_segments():
+            for a, b in pack.url_map(name).lookup(url):
+                if [a, b] not in pack.deleted.get(name, []):
+                    found.append((name, a, b))
+        if not found:
+            return 0
+        with index_file_lock(INDEX_DIR + ".lock"):
+            live_dir = current_index_dir()
+            # 행 범위는 pack 이 연 버전 기준이므로, 그 사이 새 버전이 공개되었으면 새 버전에서 다시 찾는다
+            if pack.index_dir is None or pack.index_dir == live_dir:
+                tombstones = read_tombstones(live_dir)
+                for name, a, b in found:
+                    if [a, b] not in tombstones.setdefault(name, []):
+                        tombstones[name].append([a, b])
+                write_tombstones(live_dir, tombstones)
+                write_index_manifest(live_dir, read_current_version())
+                break
+        pack = load_index()
+    pack.deleted = tombstones
+    pack._deleted_masks.clear()
+    rows = sum(b - a for _, a, b in found)
+    logger.info("URL 삭제(tombstone): %s (%d행)", url, rows)
+    return rows
+
+def add_url_to_index(url: str, text: str, dt, title: str, embedder, pack: IndexPack, reindex: bool = False) -> bool:
+    """URL을 인덱스에 추가합니다. 이미 존재하면 False, 추가되면 True를 반환합니다.
+    reindex=True 면 기존 청크를 삭제(tombstone)한 뒤 새 내용으로 다시 추가합니다.
+    새 청크는 append-only delta 세그먼트로 바로 디스크에 기록되므로 save_index 가 필요 없습니다."""
+    
+    # URL 중복 체크 (URL 맵 조회)
+    if pack.has_url(url):
+        if not reindex:
             logger.debug(f"URL이 이미 인덱스에 존재함: {url}")
             return False
+        delete_url_from_index(url, pack)
     
     # 새로운 URL 추가
     logger.info(f"새 URL을 인덱스에 추가: {url}")
@@ -1788,9 +4860,6 @@ def add_url_to_index(url: str, text: str, dt, title: str, embedder, pack: IndexP
     # 임베딩 생성
     embeddings = embedder.encode(chunks, convert_to_numpy=True, normalize_embeddings=True)
     
-    # 기존 매트릭스에 새 임베딩 추가
-    new_matrix = np.vstack([pack.matrix, embeddings])
-    
     # 새 레코드들 생성
     new_records = []
     for i, chunk in enumerate(chunks):
@@ -1804,41 +4873,37 @@ def add_url_to_index(url: str, text: str, dt, title: str, embedder, pack: IndexP
         )
         new_records.append(new_record)
     
-    # 인덱스 팩 업데이트
-    pack.matrix = new_matrix
-    pack.records.extend(new_records)
+    # delta 세그먼트로 기록 (base 재기록 없음)
+    append_delta_segment(pack, embeddings, new_records)
     
     return True
 
 def check_domains(domain_filter: Optional[str] = None, verbose: bool = False):
-    """인덱스에 포함된 도메인들을 확인합니다."""
-    if not os.path.exists(INDEX_PKL):
-        logger.error("인덱스 파일이 없습니다: %s", INDEX_PKL)
+    """인덱스에 포함된 도메인들을 확인합니다 (도메인 통계는 manifest 에서 읽어 인덱스를 열지 않음)."""
+    manifest = read_index_manifest() if index_exists() else None
+    if manifest is None:
+        logger.error("인덱스 파일이 없습니다: %s", INDEX_DIR)
         return
-    
-    pack = load_index()
-    logger.info("인덱스 로드 완료: %d개 레코드", len(pack.records))
-    
-    # 도메인별 URL 수집
-    domain_counts = {}
-    matching_urls = []
-    
-    for record in pack.records:
-        url = record.url
-        if url:
-            from urllib.parse import urlparse
-            domain = urlparse(url).netloc
-            domain_counts[domain] = domain_counts.get(domain, 0) + 1
-            
-            if domain_filter and domain_filter.lower() in domain.lower():
-                matching_urls.append(url)
+    logger.info("인덱스 manifest: %d개 레코드 (버전 %s, 갱신 %s)", manifest["rows"], manifest["version"], manifest["updated"])
+    domain_counts = {d: v["chunks"] for d, v in manifest["domains"].items()}
+    url_counts = {d: v["urls"] for d, v in manifest["domains"].items()}
     
     # 결과 출력
     if domain_filter:
         print(f"\n'{domain_filter}' 포함 도메인:")
         filtered_domains = {d: c for d, c in domain_counts.items() if domain_filter.lower() in d.lower()}
         for domain, count in sorted(filtered_domains.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {domain}: {count}개")
+            print(f"  {domain}: {count}개 (URL {url_counts[domain]}개)")
+        
+        # URL 목록은 manifest 에 없으므로 해당할 때만 인덱스를 열어 URL 맵에서 찾는다
+        matching_urls = []
+        if filtered_domains:
+            pack = load_index()
+            for name, _, _, _ in pack.iter_named_segments():
+                dead = pack.deleted.get(name, [])
+                for url, a, b in pack.url_map(name).iter_ranges():
+                    if url and [a, b] not in dead and domain_of(url) in filtered_domains:
+                        matching_urls.append(url)
         
         print(f"\n'{domain_filter}' 포함 URL 목록:")
         for url in matching_urls[:20]:  # 처음 20개만
@@ -1849,12 +4914,16 @@ def check_domains(domain_filter: Optional[str] = None, verbose: bool = False):
         print(f"\n전체 도메인 통계 (상위 20개):")
         sorted_domains = sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)
         for domain, count in sorted_domains[:20]:
-            print(f"  {domain}: {count}개")
+            print(f"  {domain}: {count}개 (URL {url_counts[domain]}개)")
         
         if verbose:
             print(f"\n전체 도메인 목록:")
             for domain, count in sorted(domain_counts.items()):
-                print(f"  {domain}: {count}개")
+                print(f"  {domain}: {count}개 (URL {url_counts[domain]}개)")
+            print(f"\n발행월 분포:")
+            for month, count in manifest["published_hist"].items():
+                print(f"  {month}: {count}개")
+            print(f"  발행일 없음: {manifest['unknown_published']}개")
 
 
 def search_real_time_news(query_keywords: List[str]) -> List[dict]:
@@ -2055,6 +5124,26 @@ def fact_check_article(title: str, snippet: str, query_keywords: List[str]) -> b
         return True  # 오류 시 통과
 
 
+RELEVANCE_IMPORTANT_KEYWORDS = {'사드', 'THAAD', '성주', '미사일', '배치', '방어', '레이더', '괌', '일본'}
+RELEVANCE_IMPORTANT_HASH_SET = frozenset(keyword_hash(k) for k in RELEVANCE_IMPORTANT_KEYWORDS)
+_RELEVANCE_IMPORTANT_HASHES = None
+
+def relevance_important_hashes() -> np.ndarray:
+    """RELEVANCE_IMPORTANT_KEYWORDS 의 해시 (정렬된 uint64, 한 번 계산)"""
+    global _RELEVANCE_IMPORTANT_HASHES
+    if _RELEVANCE_IMPORTANT_HASHES is None:
+        _RELEVANCE_IMPORTANT_HASHES = np.array(sorted(RELEVANCE_IMPORTANT_HASH_SET), dtype=np.uint64)
+    return _RELEVANCE_IMPORTANT_HASHES
+
+def check_keyword_relevance_hashes(query_hashes: np.ndarray, evidence_hashes: np.ndarray, min_common_keywords: int = 2) -> bool:
+    """check_keyword_relevance 와 같은 판정을 키워드 해시 집합 (relevance_keyword_hashes) 으로 수행합니다.
+    근거 쪽 해시는 인덱스에 저장된 컬럼을 그대로 쓸 수 있다."""
+    common = np.intersect1d(query_hashes, evidence_hashes, assume_unique=True)
+    important_common = np.intersect1d(common, relevance_important_hashes(), assume_unique=True)
+    effective_common = len(common) + len(important_common) * 2
+    logger.debug(f"키워드 관련성 검증: 공통={len(common)}개, 중요공통={len(important_common)}개, 효과적공통={effective_common}")
+    return effective_common >= min_common_keywords
+
 def check_keyword_relevance(query_text: str, evidence_text: str, min_common_keywords: int = 2) -> bool:
     """
     질의와 근거 텍스트 간의 키워드 관련성을 검증합니다.
@@ -2067,45 +5156,16 @@ def check_keyword_relevance(query_text: str, evidence_text: str, min_common_keyw
     Returns:
         관련성이 있으면 True, 없으면 False
     """
-    # 한국어/영어 키워드 추출
-    import re
-    
-    # 질의에서 주요 키워드 추출 (한국어 2글자 이상, 영어 3글자 이상)
-    query_keywords = set()
-    
-    # 한국어 키워드
-    kr_words = re.findall(r'[가-힣]{2,}', query_text)
-    query_keywords.update(kr_words)
-    
-    # 영어 키워드 (대소문자 구분 없이)
-    en_words = re.findall(r'[A-Za-z]{3,}', query_text.upper())
-    query_keywords.update(en_words)
-    
-    # 숫자 포함 키워드
-    num_words = re.findall(r'[0-9]{2,}', query_text)
-    query_keywords.update(num_words)
-    
-    # 근거 텍스트에서도 동일하게 추출
-    evidence_keywords = set()
-    
-    # 한국어 키워드
-    kr_words = re.findall(r'[가-힣]{2,}', evidence_text)
-    evidence_keywords.update(kr_words)
-    
-    # 영어 키워드 (대소문자 구분 없이)
-    en_words = re.findall(r'[A-Za-z]{3,}', evidence_text.upper())
-    evidence_keywords.update(en_words)
-    
-    # 숫자 포함 키워드
-    num_words = re.findall(r'[0-9]{2,}', evidence_text)
-    evidence_keywords.update(num_words)
+    # 질의/근거에서 주요 키워드 해시 집합 (한국어 2글자 이상, 영어 3글자 이상, 숫자 2자리 이상)
+    # 후보마다 같은 질의로 호출되므로 텍스트별로 memo 된 집합을 정수 해시로 교집합
+    query_keywords = relevance_hash_set(query_text or "")
+    evidence_keywords = relevance_hash_set(evidence_text or "")
     
     # 공통 키워드 계산
-    common_keywords = query_keywords.intersection(evidence_keywords)
+    common_keywords = query_keywords & evidence_keywords
     
     # 중요 키워드는 가중치 부여
-    important_keywords = {'사드', 'THAAD', '성주', '미사일', '배치', '방어', '레이더', '괌', '일본'}
-    important_common = common_keywords.intersection(important_keywords)
+    important_common = common_keywords & RELEVANCE_IMPORTANT_HASH_SET
     
     # 중요 키워드가 있으면 기준 완화, 없으면 기준 강화
     effective_common = len(common_keywords) + len(important_common) * 2
@@ -2124,7 +5184,7 @@ def summarize_for_nli(text: str, max_sents: int = 3) -> str:
     sents = [normalize_space(s) for s in split_into_sentences_for_summary(text) if s.strip()]
     return " ".join(sents[:max_sents]) if sents else text[:500]
 
-def search_contradiction_evidence(query_url, query_text, matrix, records, embedder, k=5):
+def search_contradiction_evidence(query_url, query_text, pack: IndexPack, embedder, k=5):
     """
     특정 기사에 대한 정확한 반박 증거를 검색합니다.
     URL과 내용을 모두 매칭하여 정확한 반박 기사만 반환합니다.
@@ -3050,6 +6110,74 @@ def evaluate_image(image_path: str, nli_batch: int, use_gpu: bool, fp16: bool, s
             "error": f"이미지 평가 중 오류 발생: {str(e)}"
         }
 
+def iter_keyword_candidates(pack: IndexPack, keywords, min_hits: int = 1, always=()):
+    """키워드 필터 후보 레코드를 (전역 행 번호, 레코드) 로 전역 행 순서대로 반환.
+    역색인 posting 에서 keywords 중 min_hits 개 이상이 들어 있을 수 있는 행과 always 키워드 행의 합집합만 읽는다
+    (posting 은 상위 집합이므로 실제 포함 여부는 호출 측의 부분 문자열 확인이 결정).
+    역색인으로 거를 수 없는 키워드가 있으면 전체 레코드를 훑는다."""
+    keywords = list(keywords)
+    hits = {}
+    for kw in set(keywords) | set(always):
+        rows = pack.keyword_rows(kw)
+        if rows is None:
+            yield from enumerate(pack.iter_records())
+            return
+        hits[kw] = rows
+    if keywords:
+        rows, counts = np.unique(np.concatenate([hits[kw] for kw in keywords]), return_counts=True)
+        candidates = rows[counts >= min_hits]
+    else:
+        candidates = np.zeros(0, dtype=np.int64)
+    if always:
+        candidates = np.unique(np.concatenate([candidates] + [hits[kw] for kw in always]))
+    for i in candidates.tolist():
+        yield i, pack.record(i)
+
+# evaluate_text 키워드 추출용 중요 키워드 사전
+OCR_IMPORTANT_KEYWORDS = [
+    # 정치/법률 관련
+    '대통령', '탄핵', '헌법재판소', '헌재', '법재판소', '국회', '의원', '정부', 
+    '정치', '선거', '국정감사', '파면', '결정', '판결', '재판', '수사',
+    '기소', '검찰', '사법부', '법원', '판사', '검사', '변호사', '소송',
+
+    # 인물명
+    '윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜', '이낙연',
+    '김기현', '추경호', '박홍근', '우원식', '정진석',
+
+    # 정당/기관
+    '민주당', '국민의힘', '야당', '여당', '정당', '청와대', '대통령실',
+
+    # 경제/사회
+    '경제', '물가', '금리', '부동산', '투자', '기업', '일자리', '고용',
+    '교육', '의료', '복지', '환경', '안전', '범죄', '사회', '국민',
+
+    # 국제/외교
+    '외교', '국제', '미국', '중국', '일본', '북한', '안보', '통일',
+
+    # 기타 중요 키워드
+    '정책', '법안', '개혁', '논란', '갈등', '협력', '합의', '발표', '발언'
+]
+
+# 특정 기관명의 줄임말 처리 (편향 없이)
+OCR_KEYWORD_ABBREVIATIONS = {
+    '헌법재판소': ['헌재', '법재판소'],
+    '국회의원': ['의원'],
+    '대통령': ['대통'],
+    '검찰청': ['검찰'],
+    '경찰청': ['경찰']
+}
+
+def ocr_keyword_patterns() -> List[Tuple[str, str]]:
+    """중요 키워드별 (패턴, 키워드) - 직접 매칭, 글자 사이에 공백이 하나 들어간 OCR 오류 변형, 줄임말"""
+    patterns = []
+    for keyword in OCR_IMPORTANT_KEYWORDS:
+        patterns.append((keyword, keyword))
+        patterns.extend((keyword[:i] + ' ' + keyword[i:], keyword) for i in range(1, len(keyword)))
+        patterns.extend((abbrev, keyword) for abbrev in OCR_KEYWORD_ABBREVIATIONS.get(keyword, ()))
+    return patterns
+
+OCR_KEYWORD_MATCHER = AhoCorasick(ocr_keyword_patterns())
+
 def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, similarity_threshold: float = 0.35, min_text_length: int = None):
     """
     텍스트를 직접 평가하는 함수 (URL 파싱 없이)
@@ -3097,30 +6225,8 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             import re
             direct_nouns = re.findall(r'[가-힣]{2,}', text)
             
-            # 2차: 중요 키워드 사전과 매칭
-            important_keywords = [
-                # 정치/법률 관련
-                '대통령', '탄핵', '헌법재판소', '헌재', '법재판소', '국회', '의원', '정부', 
-                '정치', '선거', '국정감사', '파면', '결정', '판결', '재판', '수사',
-                '기소', '검찰', '사법부', '법원', '판사', '검사', '변호사', '소송',
-                
-                # 인물명
-                '윤석열', '이재명', '한동훈', '조국', '문재인', '박근혜', '이낙연',
-                '김기현', '추경호', '박홍근', '우원식', '정진석',
-                
-                # 정당/기관
-                '민주당', '국민의힘', '야당', '여당', '정당', '청와대', '대통령실',
-                
-                # 경제/사회
-                '경제', '물가', '금리', '부동산', '투자', '기업', '일자리', '고용',
-                '교육', '의료', '복지', '환경', '안전', '범죄', '사회', '국민',
-                
-                # 국제/외교
-                '외교', '국제', '미국', '중국', '일본', '북한', '안보', '통일',
-                
-                # 기타 중요 키워드
-                '정책', '법안', '개혁', '논란', '갈등', '협력', '합의', '발표', '발언'
-            ]
+            # 2차: 중요 키워드 사전 매칭 (직접/OCR 띄어쓰기 변형/줄임말을 오토마톤 1회 스캔으로)
+            dictionary_hits = OCR_KEYWORD_MATCHER.find_all(text_lower)
             
             # 3차: 정확한 키워드 매칭 (직접 명사 + 사전 키워드)
             # 직접 추출된 명사들을 우선순위로 처리
@@ -3129,39 +6235,8 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
                     keywords.append(noun)
             
             # 중요 키워드 사전과 매칭 (편향 없는 범용적 OCR 오류 고려)
-            for keyword in important_keywords:
-                found = False
-                
-                # 직접 매칭
-                if keyword in text_lower:
-                    found = True
-                else:
-                    # 범용적 OCR 오류 패턴 매칭 (특정 인물/상황에 편향되지 않음)
-                    # 2-3글자 단어의 중간에 공백이 들어간 경우
-                    if len(keyword) >= 2:
-                        # 각 글자 사이에 공백이 들어간 패턴
-                        spaced_patterns = []
-                        for i in range(1, len(keyword)):
-                            pattern = keyword[:i] + ' ' + keyword[i:]
-                            spaced_patterns.append(pattern)
-                        
-                        if any(pattern in text for pattern in spaced_patterns):
-                            found = True
-                    
-                    # 특정 기관명의 줄임말 처리 (편향 없이)
-                    abbreviation_map = {
-                        '헌법재판소': ['헌재', '법재판소'],
-                        '국회의원': ['의원'],
-                        '대통령': ['대통'],
-                        '검찰청': ['검찰'],
-                        '경찰청': ['경찰']
-                    }
-                    
-                    if keyword in abbreviation_map:
-                        if any(abbrev in text_lower for abbrev in abbreviation_map[keyword]):
-                            found = True
-                
-                if found and keyword not in keywords:
+            for keyword in OCR_IMPORTANT_KEYWORDS:
+                if keyword in dictionary_hits and keyword not in keywords:
                     keywords.append(keyword)
                     logger.debug(f"키워드 매칭: '{keyword}'")
             
@@ -3360,7 +6435,7 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             keyword_matches = []
             keyword_scores = []
             
-            for i, record in enumerate(pack.records):
+            for i, record in iter_keyword_candidates(pack, keywords):
                 record_text = record.chunk.lower()
                 matched_keywords = [kw for kw in keywords if kw in record_text]
                 
@@ -3418,7 +6493,7 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             for i, idx in enumerate(top_5_indices):
                 record_idx = keyword_matches[idx]
                 score = keyword_scores[idx]
-                url = pack.records[record_idx].url
+                url = pack.record(record_idx).url
                 logger.info(f"  {i+1}. 매칭점수 {score:.3f}: {url[:80]}...")
             
             # 키워드 점수 기준으로 정렬하여 상위 50개 선택
@@ -3428,36 +6503,30 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             
             # 고도화된 의미적 연관성 분석 적용
             query_emb = embedder.encode([text], normalize_embeddings=True)
-            selected_matrix = pack.matrix[selected_indices]
+            selected_matrix = pack.vectors(selected_indices)
             base_similarities = util.cos_sim(query_emb[0], selected_matrix).cpu().numpy().squeeze()
             
             if np.isscalar(base_similarities):
                 base_similarities = np.array([base_similarities])
             
-            # 의미적 연관성 분석으로 유사도 개선
-            enhanced_similarities = []
-            for i, idx in enumerate(selected_indices):
-                article_content = pack.records[idx].chunk
-                
-                # 새로운 의미적 연관성 분석 적용
-                semantic_analysis = analyze_semantic_relevance(text, article_content, embedder)
-                
-                # 기존 유사도와 의미적 연관성 점수 결합
-                enhanced_score = (
-                    base_similarities[i] * 0.3 +          # 기존 임베딩 유사도 30%
-                    semantic_analysis['final_score'] * 0.7  # 의미적 연관성 70%
-                )
-                enhanced_similarities.append(enhanced_score)
-                
-                if semantic_analysis['final_score'] > 0.6:  # 높은 연관성 발견시 로그
-                    logger.info(f"🧠 높은 의미적 연관성 발견 (점수: {semantic_analysis['final_score']:.3f}): {pack.records[idx].url[:50]}...")
-                    logger.debug(f"   주제: {semantic_analysis['query_topics']} ↔ {semantic_analysis['article_topics']}")
+            # 의미적 연관성 분석으로 유사도 개선 (질의 임베딩과 저장된 행 벡터를 재사용해 후보 전체를 한 번에 채점)
+            selected_chunks = pack.field_values(selected_indices, "chunk")
+            semantic_analysis = analyze_semantic_relevance_batch(text, selected_chunks, selected_matrix, query_vector=query_emb[0])
+            
+            # 기존 유사도와 의미적 연관성 점수 결합
+            similarities = (
+                base_similarities * 0.3 +                 # 기존 임베딩 유사도 30%
+                semantic_analysis['final_score'] * 0.7    # 의미적 연관성 70%
+            )
+            
+            for i in np.nonzero(semantic_analysis['final_score'] > 0.6)[0]:  # 높은 연관성 발견시 로그
+                logger.info(f"🧠 높은 의미적 연관성 발견 (점수: {semantic_analysis['final_score'][i]:.3f}): {pack.record(selected_indices[i]).url[:50]}...")
+                logger.debug(f"   주제: {semantic_analysis['query_topics']} ↔ {semantic_analysis['article_topics'][i]}")
             
-            similarities = np.array(enhanced_similarities)
             logger.info(f"🚀 의미적 연관성 분석 완료: 평균 점수 {similarities.mean():.3f}")
             
             # NLI 평가
-            premises = [pack.records[i].chunk for i in selected_indices]
+            premises = selected_chunks
             hypothesis = text
             
             support_scores = []
@@ -3507,7 +6576,7 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             
             for rank, idx in enumerate(sorted_indices_final[:40]):  # 상위 40개로 증가
                 orig_idx = selected_indices[idx]
-                url = pack.records[orig_idx].url
+                url = pack.record(orig_idx).url
                 domain = url.split('/')[2].lower() if '//' in url else ''
                 clean_domain = domain.replace('www.', '')
                 
@@ -3595,20 +6664,28 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
         # 임베딩 생성
         query_emb = embedder.encode([cleaned_text], normalize_embeddings=True)
         
+        if SEARCH_HYBRID:
+            # 하이브리드 검색: 키워드 밀도 루프 대신 BM25F 와 코사인 유사도를 융합한 점수로 후보 선정
+            # (후보 순위만 융합 점수 - 아래 임계값/최종 점수/보고는 코사인 유사도 그대로)
+            topk_hybrid = min(1000, len(pack)) if len(cleaned_text) < 100 else TOPK_CANDIDATES
+            logger.info(f"하이브리드 검색 (BM25F + 임베딩, α={HYBRID_ALPHA:.2f}): 상위 {topk_hybrid}개 후보")
+            candidate_indices, candidate_sims, _ = hybrid_search(pack, cleaned_text, query_emb, topk_hybrid)
         # 스마트 이중 필터링: 키워드 + 의미적 유사성
-        if query_keywords and len(cleaned_text) < 100:
+        elif query_keywords and len(cleaned_text) < 100:
             logger.info("스마트 이중 필터링 수행")
             
             # 1단계: 키워드 기반 사전 필터링
             keyword_filtered_indices = []
             keyword_scores = []  # 키워드 매칭 점수
             
-            for i, record in enumerate(pack.records):
+            # 적절한 키워드 매칭: 중요 키워드 우선, 일반 키워드도 고려
+            important_keywords = {'대통령', '탄핵', '헌법재판소', '윤석열', '파면', '국회'}
+            important_in_query = [keyword for keyword in important_keywords if keyword in query_keywords]
+            
+            for i, record in iter_keyword_candidates(pack, query_keywords, min_hits=2, always=important_in_query):
                 record_text = record.chunk.lower()
                 keyword_match_count = sum(1 for keyword in query_keywords if keyword in record_text)
                 
-                # 적절한 키워드 매칭: 중요 키워드 우선, 일반 키워드도 고려
-                important_keywords = {'대통령', '탄핵', '헌법재판소', '윤석열', '파면', '국회'}
                 important_matches = sum(1 for keyword in important_keywords if keyword in query_keywords and keyword in record_text)
                 
                 # 더 엄격한 조건: 중요 키워드 1개 이상 OR 일반 키워드 2개 이상
@@ -3623,7 +6700,7 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             
             if keyword_filtered_indices and len(keyword_filtered_indices) >= 5:  # 최소 기준 완화
                 # 2단계: 키워드 매칭된 문서들의 의미적 유사성 계산
-                filtered_matrix = pack.matrix[keyword_filtered_indices]
+                filtered_matrix = pack.vectors(keyword_filtered_indices)
                 similarities = util.cos_sim(query_emb[0], filtered_matrix).cpu().numpy().squeeze()
                 
                 if np.isscalar(similarities):
@@ -3671,27 +6748,17 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             else:
                 # 키워드 매칭 결과가 부족하면 일반 유사도 검색
                 logger.info("키워드 매칭 부족, 일반 유사도 검색으로 전환")
-                similarities = util.cos_sim(query_emb[0], pack.matrix).cpu().numpy().squeeze()
-                if np.isscalar(similarities):
-                    similarities = np.array([similarities])
-                candidate_indices = np.argsort(similarities)[::-1][:TOPK_CANDIDATES]
-                candidate_sims = similarities[candidate_indices]
+                candidate_indices, candidate_sims = search_index(pack, query_emb, TOPK_CANDIDATES)
         else:
             # 일반적인 유사도 검색
-            similarities = util.cos_sim(query_emb[0], pack.matrix).cpu().numpy().squeeze()
-            
-            if np.isscalar(similarities):
-                similarities = np.array([similarities])
-            
             # 짧은 텍스트에 대해서는 더 많은 후보 고려
             if len(cleaned_text) < 100:
-                topk_for_short_text = min(1000, len(similarities))
+                topk_for_short_text = min(1000, len(pack))
                 logger.info(f"짧은 텍스트: 상위 {topk_for_short_text}개 후보 검색")
             else:
                 topk_for_short_text = TOPK_CANDIDATES
 
-            candidate_indices = np.argsort(similarities)[::-1][:topk_for_short_text]
-            candidate_sims = similarities[candidate_indices]
+            candidate_indices, candidate_sims = search_index(pack, query_emb, topk_for_short_text)
         
         # 짧은 텍스트에 대해서는 더 관대한 임계값 적용 (하지만 키워드 기반 검색을 위한 상한선 설정)
         if len(cleaned_text) < 50:  # 매우 짧은 텍스트 (50자 미만)
@@ -3733,7 +6800,7 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
         
         # NLI 평가 (이미 위에서 준비됨)
         
-        premises = [pack.records[i].chunk for i in candidate_indices]
+        premises = [pack.record(i).chunk for i in candidate_indices]
         hypothesis = cleaned_text
         
         support_scores = []
@@ -3784,60 +6851,23 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             'kyeongin.com', 'kwnews.co.kr', 'kwangju.co.kr', 'kado.net'
         }
         
-        # URL 품질 필터링 함수
-        def is_quality_news_url(url: str) -> bool:
-            """뉴스 기사 URL인지 확인 (일반 페이지 제외)"""
-            url_lower = url.lower()
-            
-            # 제외할 URL 패턴들 (더 강력하게)
-            exclude_patterns = [
-                'copyright', 'agreement', 'privacy', 'terms', 'policy',
-                'contact', 'about', 'newslist', 'category', 'tag',
-                'search', 'login', 'register', 'member', 'mypage',
-                'sitemap', 'rss', 'xml', 'api', 'admin', 'management',
-                'list', 'index', 'main', 'home', 'plan', 'specialedition',
-                'history', 'archive', 'event', 'promotion', 'guide'
-            ]
-            
-            # 제외 패턴이 있으면 False (대소문자 구분 없이)
-            for pattern in exclude_patterns:
-                if pattern in url_lower:
-                    logger.debug(f"제외 패턴 '{pattern}' 발견: {url}")
-                    return False
-            
-            # 포함되어야 할 패턴들 (뉴스 기사 URL 특징)
-            include_patterns = [
-                'article', 'news', 'view', 'read', 'story', 'report'
-            ]
-            
-            # 포함 패턴이 있거나, 숫자가 많이 포함된 URL (기사 ID)
-            has_include_pattern = any(pattern in url_lower for pattern in include_patterns)
-            has_many_numbers = len([c for c in url if c.isdigit()]) >= 10  # 기사 ID는 보통 10자리 이상
-            
-            # URL에 날짜 패턴이 있는지 확인 (YYYY/MM/DD 또는 YYYYMMDD)
-            import re
-            has_date_pattern = bool(re.search(r'20\d{2}[/\-]?\d{2}[/\-]?\d{2}', url))
-            
-            result = has_include_pattern or has_many_numbers or has_date_pattern
-            logger.debug(f"URL 품질 검사: {url} -> {result} (패턴:{has_include_pattern}, 숫자:{has_many_numbers}, 날짜:{has_date_pattern})")
-            
-            return result
-        
         results = []
         korean_results = []
         other_results = []
+        # URL 품질 비트는 인덱스 빌드 시 계산된 컬럼에서 읽음
+        quality_url = (pack.domain_classes(candidate_indices) & URL_QUALITY_NEWS) != 0
         
         for rank, idx in enumerate(sorted_indices):
             orig_idx = candidate_indices[idx]
             if final_scores[idx] >= adaptive_final_threshold:
-                url = pack.records[orig_idx].url
+                url = pack.record(orig_idx).url
                 domain = url.split('/')[2].lower() if '//' in url else ''
                 
                 # 도메인에서 www. 제거하고 체크
                 clean_domain = domain.replace('www.', '')
                 
                 # URL 품질 확인
-                if not is_quality_news_url(url):
+                if not quality_url[idx]:
                     logger.debug(f"저품질 URL 제외: {url}")
                     continue
                 
@@ -4087,6 +7117,81 @@ def evaluate_text(query_text: str, nli_batch: int, use_gpu: bool, fp16: bool, si
             "error": f"텍스트 평가 중 오류 발생: {str(e)}"
         }
 
+EVIDENCE_KOREAN_CONTEXT_KEYWORDS = ['한국', '대한민국', '서울', '부산', '정부', '대통령', '국정감사', '국회', '청와대', 'Korea', 'South Korea', 'Seoul']
+EVIDENCE_KR_STOPWORDS = {'것은', '있다', '한다', '된다', '이다', '그것', '이것', '그리고', '하지만', '그러나'}
+EVIDENCE_EN_STOPWORDS = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'was', 'one', 'our', 'has'}
+
+def evidence_query_keywords(q_text: str) -> List[str]:
+    """근거 키워드 매칭 비율용 질의 키워드 (한글 2글자 이상 상위 10개 + 영어 3글자 이상 상위 5개, 불용어 제외)"""
+    q_keywords = set()
+    for word in re.findall(r'[가-힣]{2,}', q_text)[:10]:
+        if word not in EVIDENCE_KR_STOPWORDS:
+            q_keywords.add(word)
+    for word in re.findall(r'[A-Za-z]{3,}', q_text)[:5]:
+        if word.lower() not in EVIDENCE_EN_STOPWORDS:
+            q_keywords.add(word.lower())
+    return sorted(q_keywords)
+
+def score_evidence_candidates(pack: IndexPack, cand_idx: List[int], sims: np.ndarray, e_prob: np.ndarray,
+                              c_prob: np.ndarray, q_text: str, keep: np.ndarray,
+                              foreign_mask: np.ndarray) -> List[Tuple[int, float, dict]]:
+    """NLI 를 마친 후보들의 최종 점수를 컬럼(배열) 단위로 계산합니다.
+    유사도/지지/반박/시간/출처/언어 정합/내용 관련성을 후보 배열로 만들고 임계값은 마스크로 적용한다.
+    keep: 유사도·NLI 지지 기본 필터를 통과한 후보 마스크. 반환: [(전역 행 번호, 점수, {url, similarity, support})]"""
+    keep = np.asarray(keep, dtype=bool).copy()
+    idx = np.asarray(cand_idx, dtype=np.int64)
+    sim_v = np.asarray(sims, dtype=np.float64).copy()
+    q_lang_kr = korean_ratio(q_text)
+    live = np.nonzero(keep)[0]
+    if not len(live):
+        return []
+    # 아래 단계는 기본 필터를 통과한 후보(live)만 계산
+    chunks = pack.field_values(idx[live], "chunk")
+
+    # 언어/지역 필터링: 한국어 비중 30% 이상 질의면 외국 사이트는 한국 맥락 키워드 2개 이상일 때만 남기고 유사성 페널티
+    if q_lang_kr >= 0.3:
+        for j in np.nonzero(foreign_mask[live])[0].tolist():
+            if sum(1 for keyword in EVIDENCE_KOREAN_CONTEXT_KEYWORDS if keyword in chunks[j]) >= 2:
+                sim_v[live[j]] *= 0.7
+            else:
+                keep[live[j]] = False
+
+    # 내용 관련성: 관련성 키워드 해시 공통 개수 (빌드 시 저장된 컬럼) + 질의 키워드 부분 문자열 매칭 비율
+    content_relevance = np.ones(len(idx), dtype=np.float64)
+    q_keywords = evidence_query_keywords(q_text)
+    if q_keywords:
+        q_hashes = np.array(sorted(relevance_hash_set(q_text)), dtype=np.uint64)
+        important = np.intersect1d(q_hashes, relevance_important_hashes())
+        effective_common = pack.keyword_hash_hits(idx[live], q_hashes) + 2 * pack.keyword_hash_hits(idx[live], important)
+        is_relevant = effective_common >= 2
+        lowered = [text.lower() for text in chunks]
+        matched = np.array([sum(1 for keyword in q_keywords if keyword in text) for text in lowered], dtype=np.float64)
+        ratio = matched / len(q_keywords)
+        keep[live[ratio == 0.0]] = False          # 키워드 매칭이 아예 없으면 제외
+        content_relevance[live] = np.where(~is_relevant | (ratio < 0.15), 0.5, np.where(ratio < 0.25, 0.7, 1.0))
+
+    time_v = np.zeros(len(idx), dtype=np.float64)
+    src_v = np.zeros(len(idx), dtype=np.float64)
+    time_v[live] = time_weight_array(pack.column_values(idx[live], "published"))
+    urls = pack.field_values(idx[live], "url")
+    src_v[live] = source_reputation_array(urls, pack.column_values(idx[live], "from_seed"))
+
+    # 언어 정합 가중: 질의가 한글 비중 높으면 한글 비중 높은 청크에 보너스 (-0.2 ~ 0.0)
+    lang_v = np.zeros(len(idx), dtype=np.float64)
+    if q_lang_kr >= 0.25:
+        cand_kr, _ = pack.record_features(idx[live])
+        lang_v[live] = np.where(cand_kr >= 0.25, 0.0, -0.2)
+
+    score = (ALPHA_SIM * sim_v) + (BETA_SUP * np.asarray(e_prob, dtype=np.float64)) \
+            - (GAMMA_CONTRA * np.asarray(c_prob, dtype=np.float64)) \
+            + (DELTA_TIME * time_v) + (EPS_SOURCE * src_v) + (EPS_LANG * lang_v)
+    score *= content_relevance
+    keep &= score >= MIN_FINAL_SCORE
+
+    url_of = dict(zip(live.tolist(), urls))
+    return [(int(idx[r]), float(score[r]), {"url": url_of[r], "similarity": float(sim_v[r]), "support": float(e_prob[r])})
+            for r in np.nonzero(keep)[0].tolist()]
+
 def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, similarity_threshold: float = 0.35):
     if SESSION is None:
         configure_http(http_pool=64, timeout=12)
@@ -4112,8 +7217,8 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     # 사용자 입력 URL을 인덱스에 추가 (중복이 아닌 경우)
     try:
         if add_url_to_index(query_url, q_text, q_dt, q_title, embedder, pack):
-            save_index(pack)
             logger.info("사용자 URL이 인덱스에 추가되었습니다.")
+            schedule_index_merge(pack)
         else:
             logger.debug("URL이 이미 인덱스에 존재하여 추가하지 않았습니다.")
     except Exception as e:
@@ -4125,12 +7230,11 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     logger.info("질의 청크 수: %d", len(q_chunks))
 
     q_vecs = embedder.encode(q_chunks, convert_to_numpy=True, normalize_embeddings=True)
-    sims = util.cos_sim(torch.tensor(q_vecs), torch.from_numpy(pack.matrix)).cpu().numpy()  # (Q,N)
-    sim_per_idx = sims.max(axis=0)
 
-    # 후보 TopK
-    K = min(TOPK_CANDIDATES, pack.matrix.shape[0])
-    cand_idx = np.argsort(-sim_per_idx)[:K].tolist()
+    # 후보 TopK (base + delta 세그먼트, 질의 청크별 최대 유사도)
+    K = min(TOPK_CANDIDATES, len(pack))
+    cand_idx, cand_sims = search_index(pack, q_vecs, K)
+    cand_idx = cand_idx.tolist()
 
     tok, mdl, use_fp16 = get_nli(use_gpu=use_gpu, fp16=fp16)
     q_premise = summarize_for_nli(q_text, max_sents=3)
@@ -4138,121 +7242,21 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     # 반박 증거 검색 추가
     logger.debug("반박 증거 검색 시작...")
     contradiction_evidence = search_contradiction_evidence(
-        query_url, q_text, pack.matrix, pack.records, embedder, k=3
+        query_url, q_text, pack, embedder, k=3
     )
     
-    pairs = [(pack.records[idx].chunk, q_premise) for idx in cand_idx]
+    pairs = [(pack.record(idx).chunk, q_premise) for idx in cand_idx]
     probs = nli_batch_probs(pairs, tok, mdl, batch_size=nli_batch, use_fp16=use_fp16)  # [N,3]
     c_prob = probs[:, 0] if probs.size else np.zeros((len(cand_idx),), dtype=np.float32)  # contradiction
     e_prob = probs[:, 2] if probs.size else np.zeros((len(cand_idx),), dtype=np.float32)  # entailment
 
-    q_lang_kr = korean_ratio(q_text)
-
-    scored = []
-    for rank, idx in enumerate(cand_idx):
-        rec = pack.records[idx]
-        sim_v = float(sim_per_idx[idx])
-        sup_v = float(e_prob[rank])
-        con_v = float(c_prob[rank])
-        
-        # 기본 필터링: 너무 낮은 유사성이나 NLI 지지도는 제외
-        if sim_v < similarity_threshold or sup_v < MIN_NLI_SUPPORT_THRESHOLD:
-            continue
-        
-        # 언어/지역 필터링 강화: 한국어 기사인 경우 외국 사이트 제한
-        rec_domain = domain_of(rec.url)
-        
-        # 한국 사이트 판별 (더 엄격하게)
-        korean_domains = [
-            'naver.com', 'daum.net', 'chosun.com', 'joins.com', 'donga.com',
-            'hani.co.kr', 'khan.co.kr', 'ytn.co.kr', 'jtbc.co.kr', 'sbs.co.kr',
-            'kbs.co.kr', 'mbc.co.kr', 'news1.kr', 'newsis.com', 'edaily.co.kr',
-            'mk.co.kr', 'hankyung.com', 'korea.kr', 'koreaherald.com', 'koreatimes.co.kr',
-            'koreajoongangdaily.joins.com', 'pressian.com', 'ohmynews.com'
-        ]
-        
-        is_korean_site = any(korean_domain in rec_domain for korean_domain in korean_domains)
-        is_foreign_site = not is_korean_site and any(tld in rec_domain for tld in ['.fr', '.de', '.it', '.es', '.com', '.net', '.org'])
-        
-        # 한국어 비중이 높은 질의의 경우 외국 사이트 강력 제한
-        if q_lang_kr >= 0.3:  # 한국어 비중 30% 이상
-            if is_foreign_site:
-                # 외국 사이트이지만 한국 관련 내용인지 매우 엄격하게 확인
-                korean_keywords = ['한국', '대한민국', '서울', '부산', '정부', '대통령', '국정감사', '국회', '청와대', 'Korea', 'South Korea', 'Seoul']
-                has_strong_korean_context = sum(1 for keyword in korean_keywords if keyword in rec.chunk) >= 2  # 2개 이상 키워드 필요
-                
-                if not has_strong_korean_context:
-                    # 한국 맥락이 약한 외국 기사는 제외
-                    continue
-                    
-                # 한국 맥락이 있어도 페널티 적용
-                sim_v *= 0.7  # 유사성에 페널티
-        
-        # 내용 관련성 강화: 주요 키워드 매칭 점검 (강화된 버전)
-        content_relevance = 1.0
-        
-        # 더 정교한 키워드 관련성 검증 사용
-        is_relevant = check_keyword_relevance(q_text, rec.chunk, min_common_keywords=2)
-        
-        # 기존 방식도 병행 (호환성 유지)
-        q_keywords = set()
-        import re
-        # 한글 2글자 이상 단어들
-        korean_words = re.findall(r'[가-힣]{2,}', q_text)
-        for word in korean_words[:10]:  # 상위 10개만
-            if len(word) >= 2 and word not in ['것은', '있다', '한다', '된다', '이다', '그것', '이것', '그리고', '하지만', '그러나']:
-                q_keywords.add(word)
-        
-        # 영어 단어들도 추가
-        english_words = re.findall(r'[A-Za-z]{3,}', q_text)
-        for word in english_words[:5]:  # 상위 5개만
-            if word.lower() not in ['the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'was', 'one', 'our', 'has']:
-                q_keywords.add(word.lower())
-        
-        if q_keywords:
-            # 후보 텍스트에서 키워드 매칭 비율 계산
-            rec_text_lower = rec.chunk.lower()
-            matched_keywords = 0
-            for keyword in q_keywords:
-                if keyword.lower() in rec_text_lower:
-                    matched_keywords += 1
-            
-            keyword_match_ratio = matched_keywords / len(q_keywords) if q_keywords else 0
-            
-            # 키워드 매칭이 아예 없으면 제외 (0% 매칭 허용 안함)
-            if keyword_match_ratio == 0.0:
-                logger.debug(f"키워드 매칭 0%로 증거에서 제외: {rec.url}")
-                continue
-            
-            # 새로운 관련성 검증이 실패하거나 키워드 매칭이 낮으면 강한 페널티
-            if not is_relevant or keyword_match_ratio < 0.15:  # 기준 강화: 10% → 15%
-                content_relevance = 0.5  # 더 강한 페널티: 0.8 → 0.5
-                logger.debug(f"관련성 낮음: 새검증={is_relevant}, 키워드매칭={keyword_match_ratio:.2f}")
-            elif keyword_match_ratio < 0.25:  # 25% 미만도 페널티
-                content_relevance = 0.7
-                logger.debug(f"관련성 보통: 키워드매칭={keyword_match_ratio:.2f}")
-            elif keyword_match_ratio < 0.2:  # 20% 미만 매칭
-                content_relevance = 0.9
-        
-        dt = datetime.fromtimestamp(rec.published, tz=timezone.utc) if rec.published else None
-        time_v = time_weight(dt)
-        src_v = source_reputation(rec.url, rec.from_seed)
-        
-        # 언어 정합 가중: 질의가 한글 비중 높으면 한글 비중 높은 청크에 보너스
-        lang_align = 1.0
-        if q_lang_kr >= 0.25:
-            lang_align = 0.8 + 0.2 * (1.0 if korean_ratio(rec.chunk) >= 0.25 else 0.0)
-        lang_v = (lang_align - 1.0)  # -0.2 ~ 0.0
-        
-        score = (ALPHA_SIM * sim_v) + (BETA_SUP * sup_v) - (GAMMA_CONTRA * con_v) \
-                + (DELTA_TIME * time_v) + (EPS_SOURCE * src_v) + (EPS_LANG * lang_v)
-        
-        # 내용 관련성 보정 적용
-        score *= content_relevance
-        
-        # 최종 점수 임계값 적용
-        if score >= MIN_FINAL_SCORE:
-            scored.append((idx, score, {"url": rec.url, "similarity": sim_v, "support": sup_v}))
+    # 기본 필터링 (마스크 연산): 너무 낮은 유사성이나 NLI 지지도는 제외
+    # 도메인 분류(국내/해외 사이트)는 인덱스에 저장된 비트 컬럼에서 한 번에 읽는다
+    cand_cls = pack.domain_classes(cand_idx)
+    keep = (np.asarray(cand_sims[:len(cand_idx)]) >= similarity_threshold) & (e_prob >= MIN_NLI_SUPPORT_THRESHOLD)
+    foreign_mask = (cand_cls & DOMAIN_FOREIGN) != 0
+    scored = score_evidence_candidates(pack, cand_idx, np.asarray(cand_sims[:len(cand_idx)]), e_prob, c_prob,
+                                       q_text, keep, foreign_mask)
 
     # 유사도 기준 정렬로 변경 (최종 점수 대신 유사도 우선)
     scored.sort(key=lambda x: x[2]["similarity"], reverse=True)
@@ -4336,21 +7340,22 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     
     # 1. 출처 다양성 평가
     unique_domains = set()
-    government_sources = 0
-    media_sources = 0
     total_articles = len(uniq_top)
     
-    for idx, s, meta in uniq_top:
+    top_cls = pack.domain_classes([idx for idx, _, __ in uniq_top])
+    for k, (idx, s, meta) in enumerate(uniq_top):
         url = meta['url']
         domain = url.split('/')[2] if '//' in url else url
         unique_domains.add(domain)
-        
-        # 정부/공공기관 출처
-        if any(gov_domain in domain for gov_domain in ['korea.kr', 'mofa.go.kr', 'mois.go.kr', 'gov.kr']):
-            government_sources += 1
-        # 언론사 출처  
-        elif any(media_domain in domain for media_domain in ['yna.co.kr', 'ytn.co.kr', 'jtbc.co.kr', 'naver.com', 'hankyung.com']):
-            media_sources += 1
+        # 빌드 시 이 청크로 합쳐진 다른 기사(통신사 전재 등)도 출처로 센다
+        for alt_url in pack.record(idx).alt_urls:
+            unique_domains.add(domain_of(alt_url))
+            top_cls[k] |= domain_class_bits(alt_url)
+    
+    # 정부/공공기관 출처, 언론사 출처 (정부 출처와 겹치면 정부로만 셈)
+    is_gov = (top_cls & DOMAIN_GOV) != 0
+    government_sources = int(np.count_nonzero(is_gov))
+    media_sources = int(np.count_nonzero(~is_gov & ((top_cls & DOMAIN_MEDIA) != 0)))
     
     # 출처 다양성 점수 (0~1)
     domain_diversity = min(1.0, len(unique_domains) / max(1, total_articles))
@@ -4363,16 +7368,9 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     recent_count = 0
     
     # 평가 대상 기사의 연도 먼저 확인
-    query_year = None
-    if 'jtbc.co.kr' in query_url:
-        jtbc_match = re.search(r'NB(\d{2})', query_url)
-        if jtbc_match:
-            year_suffix = int(jtbc_match.group(1))
-            if year_suffix <= 25:
-                query_year = 2000 + year_suffix
-            else:
-                query_year = 1900 + year_suffix
-            logger.debug(f"평가 대상 JTBC 기사 연도: {query_url} -> {query_year}")
+    query_year = jtbc_url_year(query_url)
+    if query_year:
+        logger.debug(f"평가 대상 JTBC 기사 연도: {query_url} -> {query_year}")
     
     # 평가 대상 기사가 오래되었으면 강력한 페널티
     if query_year and query_year <= 2015:
@@ -4384,40 +7382,11 @@ def evaluate_url(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool, simi
     else:
         # 기존 근거 기사들 기반 평가
         if total_articles > 0:
-            for idx, s, meta in uniq_top:
+            # 연도 감지 (JTBC 기사 ID, URL 의 20xx, korea.kr 특수 처리) 는 빌드 시 url_year 컬럼으로 저장됨
+            _, top_years = pack.record_features([idx for idx, _, __ in uniq_top])
+            for (idx, s, meta), detected_year in zip(uniq_top, top_years.tolist()):
                 url = meta['url']
-                import re
-                
-                logger.debug(f"연도 감지 시작: {url}")
-                
-                # 연도 감지 로직 (개선됨)
-                year_matches = re.findall(r'20(\d{2})', url)
-                detected_year = None
-                
-                if 'jtbc.co.kr' in url:
-                    # JTBC 패턴: NB11272032 -> 11은 2011년
-                    jtbc_match = re.search(r'NB(\d{2})', url)
-                    if jtbc_match:
-                        year_suffix = int(jtbc_match.group(1))
-                        if year_suffix <= 25:  # 00-25는 2000-2025
-                            detected_year = 2000 + year_suffix
-                        else:  # 26-99는 1926-1999 (하지만 실제로는 거의 없음)
-                            detected_year = 1900 + year_suffix
-                        logger.debug(f"JTBC 연도 감지: {url} -> {detected_year} (year_suffix: {year_suffix})")
-                
-                if not detected_year and year_matches:
-                    for year_suffix in year_matches:
-                        year_candidate = int('20' + year_suffix)
-                        if 2000 <= year_candidate <= 2025:
-                            detected_year = year_candidate
-                            logger.debug(f"일반 연도 감지: {url} -> {detected_year}")
-                            break
-                
-                if not detected_year and 'korea.kr' in url and '132038018' in url:
-                    detected_year = 2016
-                    logger.debug(f"korea.kr 특수 처리: {url} -> {detected_year}")
-                
-                logger.debug(f"최종 감지된 연도: {url} -> {detected_year}")
+                logger.debug(f"감지된 연도: {url} -> {detected_year or None}")
                 
                 if detected_year:
                     if detected_year <= 2015:  # 2015년 이전 (더 엄격)
@@ -4670,7 +7639,7 @@ def main():
     parser = argparse.ArgumentParser(description="Smart IT - 신뢰도 평가(병렬/배치/GPU, Overall)")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    p_build = sub.add_parser("build-index", help="시드 크롤링 후 인덱스(pkl) 생성")
+    p_build = sub.add_parser("build-index", help="시드 크롤링 후 인덱스 생성")
     p_build.add_argument("--workers", type=int, default=96, help="시드 병렬 워커 수 (Intel Ultra9 285k 32스레드 최대 활용)")
     p_build.add_argument("--embed-batch", type=int, default=1024, help="임베딩 배치 크기 (RTX3070ti 8GB VRAM 최대 활용)")
     p_build.add_argument("--use-gpu", action="store_true", help="가능하면 CUDA 사용")
@@ -4680,10 +7649,66 @@ def main():
     p_build.add_argument("--timeout", type=int, default=12, help="요청 타임아웃(초)")
     p_build.add_argument("--fast-extract", action="store_true", help="본문 추출 가속(favor_precision=False)")
     p_build.add_argument("--test-mode", action="store_true", help="🧪 테스트 모드: 소량의 선별된 시드만 사용 (빠른 테스트)")
+    p_build.add_argument("--ann", choices=("none",) + ANN_KINDS, default="none", help="함께 생성할 FAISS ANN 인덱스 종류")
+    p_build.add_argument("--ann-nlist", type=int, default=0, help="IVF 클러스터 수 (0이면 4*sqrt(N))")
+    p_build.add_argument("--ann-hnsw-m", type=int, default=32, help="HNSW 노드당 연결 수")
+    p_build.add_argument("--compress-chunks", type=int, default=0, metavar="LEVEL", help="청크 본문 zlib 압축 레벨 (0=미압축, 1-9)")
+    p_build.add_argument("--embed-cache-rows", type=int, default=EMBED_CACHE_ROWS,
+                         help=f"재빌드 시 본문이 같은 청크의 임베딩을 재사용하는 캐시 크기 (0=끔, 기본값: {EMBED_CACHE_ROWS:,})")
+    p_build.add_argument("--resume", action="store_true", help="이전 빌드의 체크포인트(완료된 시드 크롤링/임베딩 배치)를 이어서 사용")
+    p_build.add_argument("--near-dup-hamming", type=int, default=BUILD_NEAR_DUP_HAMMING,
+                         help=f"SimHash 해밍 거리 이하 청크를 임베딩 전에 하나로 합침 (음수=끔, 기본값: {BUILD_NEAR_DUP_HAMMING})")
+    p_build.add_argument("--shards", type=int, default=0, help="인덱스를 N개 샤드로 나눠 기록 (0/1 = 단일 인덱스)")
+    p_build.add_argument("--shard-by", choices=SHARD_BY_CHOICES, default="domain", help="샤드 분할 기준 (도메인 해시 / 발행 연월 / 발행 연도별)")
+    p_build.add_argument("--rebuild-shard", type=int, default=None, help="도메인 샤드 하나만 다시 빌드 (샤드 번호)")
+    p_build.add_argument("--quantize", choices=("none",) + QUANT_KINDS, default="none", help="함께 생성할 양자화 임베딩 (int8=4x, pq=최대 16x 절감)")
+    p_build.add_argument("--pq-m", type=int, default=96, help="PQ 서브벡터 수 (행당 바이트 수, 임베딩 차원의 약수)")
     p_build.add_argument("--verbose", action="store_true", help="자세한 로그")
     p_build.add_argument("--quiet", action="store_true", help="간단 로그")
     p_build.add_argument("--log-file", type=str, default=None, help="로그 파일 경로")
 
+    p_convert = sub.add_parser("convert-index", help="기존 pickle 인덱스를 mmap 온디스크 포맷으로 변환")
+    p_convert.add_argument("--pkl", type=str, default=INDEX_PKL, help="변환할 pickle 인덱스 경로")
+    p_convert.add_argument("--out", type=str, default=INDEX_DIR, help="출력 인덱스 디렉터리")
+    p_convert.add_argument("--verbose", action="store_true")
+
+    p_ann = sub.add_parser("build-ann", help="기존 인덱스에 FAISS ANN 인덱스 생성/재생성")
+    p_ann.add_argument("--ann", choices=ANN_KINDS, default="hnsw", help="ANN 인덱스 종류 (flat=정확, ivf/hnsw=근사)")
+    p_ann.add_argument("--ann-nlist", type=int, default=0, help="IVF 클러스터 수 (0이면 4*sqrt(N))")
+    p_ann.add_argument("--ann-hnsw-m", type=int, default=32, help="HNSW 노드당 연결 수")
+    p_ann.add_argument("--verbose", action="store_true")
+
+    p_quant = sub.add_parser("quantize-index", help="기존 인덱스에 양자화 임베딩(int8/PQ) 생성/재생성")
+    p_quant.add_argument("--kind", choices=QUANT_KINDS, default="int8", help="양자화 방식")
+    p_quant.add_argument("--pq-m", type=int, default=96, help="PQ 서브벡터 수 (행당 바이트 수, 임베딩 차원의 약수)")
+    p_quant.add_argument("--verbose", action="store_true")
+
+    p_merge = sub.add_parser("merge-index", help="사용자 URL delta 세그먼트를 base 인덱스에 병합")
+    p_merge.add_argument("--verbose", action="store_true")
+    p_merge.add_argument("--quiet", action="store_true")
+    p_merge.add_argument("--log-file", type=str, default=None)
+
+    p_warm = sub.add_parser("warm-index", help="여러 평가 워커가 공유하도록 인덱스 파생 파일 생성 + 페이지 캐시 적재")
+    p_warm.add_argument("--verbose", action="store_true")
+    p_warm.add_argument("--quiet", action="store_true")
+    p_warm.add_argument("--log-file", type=str, default=None)
+
+    p_gc = sub.add_parser("gc-index", help="읽는 프로세스가 없는 이전 인덱스 버전 삭제")
+    p_gc.add_argument("--verbose", action="store_true")
+    p_gc.add_argument("--quiet", action="store_true")
+    p_gc.add_argument("--log-file", type=str, default=None)
+
+    p_compact = sub.add_parser("compact-index", help="중복/오래된/시드 목록 외 도메인 청크를 제거하고 인덱스를 다시 기록")
+    p_compact.add_argument("--max-age-days", type=float, default=None, help="이보다 오래된 발행일의 청크 제거")
+    p_compact.add_argument("--near-dup-threshold", type=float, default=COMPACT_NEAR_DUP_THRESHOLD,
+                           help="근접 중복으로 볼 코사인 유사도 (1 이상이면 근접 중복 제거 안 함)")
+    p_compact.add_argument("--keep-unlisted-domains", action="store_true", help="SEED_CSV 에 없는 도메인의 시드 청크도 유지")
+    p_compact.add_argument("--verbose", action="store_true")
+
+    p_del = sub.add_parser("delete-url", help="인덱스에서 URL 의 청크 삭제 (merge-index 때 실제 제거)")
+    p_del.add_argument("--url", required=True, help="삭제할 URL")
+    p_del.add_argument("--verbose", action="store_true")
+
     p_check = sub.add_parser("check-domains", help="인덱스에 포함된 도메인 확인")
     p_check.add_argument("--domain", type=str, help="특정 도메인 검색 (예: mediatoday)")
     p_check.add_argument("--verbose", action="store_true")
@@ -4696,6 +7721,13 @@ def main():
     p_eval.add_argument("--similarity-threshold", type=float, default=0.6, help="근거 유사성 최소 임계값 (기본값: 0.6)")
     p_eval.add_argument("--auto-threshold", action="store_true", help="주제별 동적 임계값 자동 조정")
     p_eval.add_argument("--strict-mode", action="store_true", help="엄격 모드: 임계값 0.65 사용 (고품질 근거만)")
+    p_eval.add_argument("--search-backend", choices=("auto", "exact", "faiss"), default="auto", help="근거 검색 백엔드 (auto: ANN 인덱스가 있으면 사용)")
+    p_eval.add_argument("--nprobe", type=int, default=None, help=f"IVF 탐색 클러스터 수 (기본값: {ANN_NPROBE})")
+    p_eval.add_argument("--ef-search", type=int, default=None, help=f"HNSW 탐색 폭 (기본값: {ANN_EF_SEARCH})")
+    p_eval.add_argument("--recency-days", type=float, default=None, help="최근 N일 안에 발행된 청크만 근거로 검색 (발행일 없는 청크 포함)")
+    p_eval.add_argument("--newest-first", action="store_true", help="최신 세그먼트부터 검색하고 오래된 세그먼트는 가능하면 생략 (--shard-by year 인덱스에서 효과적)")
+    p_eval.add_argument("--shard-workers", type=int, default=None, help="샤드 인덱스 병렬 검색 프로세스 수 (0/1 = 순차)")
+    p_eval.add_argument("--rerank", type=int, default=None, help=f"양자화 검색 시 원본 벡터로 재채점할 최소 후보 수 (기본값: {QUANT_RERANK})")
     p_eval.add_argument("--verbose", action="store_true")
     p_eval.add_argument("--quiet", action="store_true", default=True, help="간단 로그 (기본값: True)")
     p_eval.add_argument("--log-file", type=str, default=None)
@@ -4707,6 +7739,15 @@ def main():
     p_eval_img.add_argument("--use-gpu", action="store_true", default=True, help="가능하면 CUDA 사용 (기본값: True)")
     p_eval_img.add_argument("--fp16", action="store_true", default=True, help="가능하면 FP16로 추론 (기본값: True)")
     p_eval_img.add_argument("--similarity-threshold", type=float, default=0.5, help="근거 유사성 최소 임계값")
+    p_eval_img.add_argument("--search-backend", choices=("auto", "exact", "faiss"), default="auto", help="근거 검색 백엔드 (auto: ANN 인덱스가 있으면 사용)")
+    p_eval_img.add_argument("--nprobe", type=int, default=None, help=f"IVF 탐색 클러스터 수 (기본값: {ANN_NPROBE})")
+    p_eval_img.add_argument("--ef-search", type=int, default=None, help=f"HNSW 탐색 폭 (기본값: {ANN_EF_SEARCH})")
+    p_eval_img.add_argument("--recency-days", type=float, default=None, help="최근 N일 안에 발행된 청크만 근거로 검색 (발행일 없는 청크 포함)")
+    p_eval_img.add_argument("--newest-first", action="store_true", help="최신 세그먼트부터 검색하고 오래된 세그먼트는 가능하면 생략 (--shard-by year 인덱스에서 효과적)")
+    p_eval_img.add_argument("--shard-workers", type=int, default=None, help="샤드 인덱스 병렬 검색 프로세스 수 (0/1 = 순차)")
+    p_eval_img.add_argument("--rerank", type=int, default=None, help=f"양자화 검색 시 원본 벡터로 재채점할 최소 후보 수 (기본값: {QUANT_RERANK})")
+    p_eval_img.add_argument("--retrieval", choices=("dense", "hybrid"), default="dense", help="근거 검색 방식 (hybrid: BM25F + 임베딩 융합, 짧은 OCR 텍스트에 유리)")
+    p_eval_img.add_argument("--hybrid-alpha", type=float, default=None, help=f"하이브리드 융합의 코사인 가중치 (기본값: {HYBRID_ALPHA})")
     p_eval_img.add_argument("--verbose", action="store_true")
     p_eval_img.add_argument("--quiet", action="store_true", default=True, help="간단 로그 (기본값: True)")
     p_eval_img.add_argument("--log-file", type=str, default=None)
@@ -4730,11 +7771,46 @@ def main():
             timeout=args.timeout,
             sleep=args.sleep,
             fast_extract=args.fast_extract,
-            test_mode=args.test_mode
+            test_mode=args.test_mode,
+            ann_kind=args.ann,
+            ann_nlist=args.ann_nlist,
+            ann_hnsw_m=args.ann_hnsw_m,
+            quant_kind=args.quantize,
+            pq_m=args.pq_m,
+            compress_chunks=args.compress_chunks,
+            shards=args.shards,
+            shard_by=args.shard_by,
+            rebuild_shard=args.rebuild_shard,
+            near_dup_hamming=args.near_dup_hamming,
+            resume=args.resume,
+            embed_cache_rows=args.embed_cache_rows
         )
+    elif args.cmd == "convert-index":
+        convert_pickle_index(pkl_path=args.pkl, index_dir=args.out)
+    elif args.cmd == "build-ann":
+        publish_base_sidecars(ann=dict(kind=args.ann, nlist=args.ann_nlist, hnsw_m=args.ann_hnsw_m))
+    elif args.cmd == "quantize-index":
+        publish_base_sidecars(quant=dict(kind=args.kind, pq_m=args.pq_m))
+    elif args.cmd == "merge-index":
+        merge_index_deltas()
+    elif args.cmd == "warm-index":
+        files, total = warm_index()
+        print(f"인덱스 적재 완료: 파일 {files}개, {total / 1e6:.1f} MB (워커는 mmap 으로 같은 페이지를 공유)")
+    elif args.cmd == "gc-index":
+        removed = gc_index_versions()
+        print(f"삭제된 이전 버전: {', '.join(removed)}" if removed else "삭제할 이전 버전이 없습니다.")
+    elif args.cmd == "compact-index":
+        compact_index(max_age_days=args.max_age_days, near_dup_threshold=args.near_dup_threshold,
+                      drop_unlisted_domains=not args.keep_unlisted_domains)
+    elif args.cmd == "delete-url":
+        rows = delete_url_from_index(args.url, load_index())
+        print(f"삭제된 청크: {rows}개" if rows else f"인덱스에 없는 URL: {args.url}")
     elif args.cmd == "check-domains":
         check_domains(domain_filter=args.domain, verbose=args.verbose)
     elif args.cmd == "evaluate":
+        configure_search(args.search_backend, nprobe=args.nprobe, ef_search=args.ef_search, rerank=args.rerank,
+                         shard_workers=args.shard_workers, recency_days=args.recency_days,
+                         newest_first=args.newest_first)
         # 동적 임계값 조정
         threshold = args.similarity_threshold
         if args.strict_mode:
@@ -4773,6 +7849,10 @@ def main():
         
         return result
     elif args.cmd == "evaluate-image":
+        configure_search(args.search_backend, nprobe=args.nprobe, ef_search=args.ef_search, rerank=args.rerank,
+                         shard_workers=args.shard_workers, recency_days=args.recency_days,
+                         newest_first=args.newest_first, hybrid=args.retrieval == "hybrid",
+                         hybrid_alpha=args.hybrid_alpha)
         # OCR 라이브러리 확인
         if not IMAGE_OCR_AVAILABLE:
             print("❌ 이미지 OCR 라이브러리가 설치되지 않았습니다.")
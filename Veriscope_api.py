@@ -28,6 +28,9 @@ CORS(app)
 PYTHON_PATH = "C:/Smart_IT/.venv/Scripts/python.exe"
 SCRIPT_PATH = "C:/Smart_IT/Veriscope.py"
 
+# 인덱스 manifest 요약 (Veriscope.py 가 인덱스를 갱신할 때마다 기록) - 헬스체크에서 인덱스를 열지 않고 읽음
+from index_manifest import index_health as _index_health
+
 # 데이터베이스 설정
 DATABASE_PATH = 'database/veriscope.db'
 
@@ -317,7 +320,8 @@ def health():
                 "status": "available" if result.returncode == 0 else "unavailable",
                 "python_path": PYTHON_PATH,
                 "script_path": SCRIPT_PATH
-            }
+            },
+            "index": _index_health()
         })
     except Exception as e:
         return jsonify({
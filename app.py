@@ -16,9 +16,10 @@ import logging
 
 # 기존 모듈 임포트
 from Veriscope_url import (
-    evaluate_url, load_index, configure_http, 
+    evaluate_url, get_index, configure_http, 
     setup_logging, SESSION, logger
 )
+from index_manifest import load_manifest
 
 app = Flask(__name__)
 CORS(app)  # CORS 허용
@@ -55,15 +56,22 @@ def home():
 def health_check():
     """헬스체크 엔드포인트"""
     try:
-        # 인덱스 파일 존재 확인
-        pack = load_index()
-        index_size = pack.matrix.shape[0] if pack else 0
+        # 인덱스 상태는 manifest 에서 확인 (인덱스를 열지 않음)
+        manifest = load_manifest()
+        if manifest is None:
+            raise RuntimeError("인덱스가 없습니다")
         
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "index_loaded": True,
-            "index_size": index_size,
+            "index_size": manifest["rows"],
+            "index_version": manifest["version"],
+            "index_model": manifest["model_name"],
+            "index_dim": manifest["embed_dim"],
+            "index_built": manifest["built"],
+            "index_updated": manifest["updated"],
+            "index_checksum": manifest["checksum"],
             "session_configured": SESSION is not None
         })
     except Exception as e:
@@ -134,20 +142,18 @@ def evaluate_url_api(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool,
     """
     from Veriscope_url import (
         domain_of, polite_get, extract_text, make_chunks, 
-        get_embedder, load_index, MIN_TEXT_LEN, get_nli,
+        get_embedder, get_index, MIN_TEXT_LEN, get_nli,
         summarize_for_nli, TOPK_CANDIDATES, check_keyword_relevance,
-        add_url_to_index, save_index, time_weight, source_reputation,
+        add_url_to_index, schedule_index_merge, search_index, time_weight, source_reputation,
         korean_ratio, FAKE_NEWS_PATTERNS, TOPN_RETURN
     )
     import torch
-    from sentence_transformers import util
-    import numpy as np
     from collections import defaultdict
     
     if SESSION is None:
         configure_http(http_pool=64, timeout=12)
 
-    pack = load_index()
+    pack = get_index()
     embedder, _ = get_embedder(use_gpu=use_gpu, fp16=fp16)
 
     # URL 파싱 및 콘텐츠 추출
@@ -165,8 +171,8 @@ def evaluate_url_api(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool,
     # 사용자 URL을 인덱스에 추가 (중복이 아닌 경우)
     try:
         if add_url_to_index(query_url, q_text, q_dt, q_title, embedder, pack):
-            save_index(pack)
             logger.info("사용자 URL이 인덱스에 추가되었습니다.")
+            schedule_index_merge(pack)
     except Exception as e:
         logger.warning(f"URL 인덱스 추가 중 오류 (계속 진행): {e}")
 
@@ -175,12 +181,10 @@ def evaluate_url_api(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool,
         q_chunks = [q_text]
 
     q_vecs = embedder.encode(q_chunks, convert_to_numpy=True, normalize_embeddings=True)
-    sims = util.cos_sim(torch.tensor(q_vecs), torch.from_numpy(pack.matrix)).cpu().numpy()
-    sim_per_idx = sims.max(axis=0)
 
-    # 후보 선택
-    K = min(TOPK_CANDIDATES, pack.matrix.shape[0])
-    cand_idx = np.argsort(-sim_per_idx)[:K].tolist()
+    # 후보 선택 (base + delta 세그먼트)
+    K = min(TOPK_CANDIDATES, len(pack))
+    cand_idx, cand_sims = search_index(pack, q_vecs, K)
 
     tok, mdl, use_fp16 = get_nli(use_gpu=use_gpu, fp16=fp16)
     q_premise = summarize_for_nli(q_text, max_sents=3)
@@ -190,9 +194,8 @@ def evaluate_url_api(query_url: str, nli_batch: int, use_gpu: bool, fp16: bool,
     seen = set()
     url_groups = defaultdict(list)
     
-    for idx in cand_idx:
-        rec = pack.records[idx]
-        sim_score = float(sim_per_idx[idx])
+    for idx, sim_score in zip(cand_idx.tolist(), cand_sims.tolist()):
+        rec = pack.record(idx)
         
         if sim_score < similarity_threshold:
             continue
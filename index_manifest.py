@@ -0,0 +1,58 @@
+# index_manifest.py - Veriscope 인덱스 manifest 읽기 (표준 라이브러리만 사용)
+# --------------------------------------------------------------------------------------------
+# Veriscope.py 가 새 버전 공개 / delta 추가 / URL 삭제 때마다 스냅샷 루트에 manifest.json 을 기록한다.
+# API 서버 헬스체크는 이 모듈만 import 해 ML 스택을 올리지 않고, 인덱스도 열지 않고 읽는다.
+# 여기서는 읽기만 한다 (manifest 가 없으면 계산하지 않고 None / "missing").
+# --------------------------------------------------------------------------------------------
+
+import os
+import json
+from typing import Optional
+
+# 온디스크 인덱스 경로 (Veriscope.py 의 INDEX_DIR 과 API 서버가 함께 사용)
+INDEX_DIR = r"C:\Smart_IT\smart_it_index"
+
+# 스냅샷 레이아웃 - INDEX_DIR/CURRENT 가 가리키는 INDEX_DIR/versions/<버전>/manifest.json
+INDEX_CURRENT_FILE = "CURRENT"
+INDEX_VERSIONS_DIR = "versions"
+INDEX_MANIFEST_FILE = "manifest.json"
+LEGACY_VERSION = "legacy"           # CURRENT 이전 레이아웃(INDEX_DIR 바로 아래 인덱스)의 버전 이름
+
+def read_current_version(root: Optional[str] = None) -> Optional[str]:
+    """CURRENT 가 가리키는 버전 이름 (이전 레이아웃이면 None)"""
+    try:
+        with open(os.path.join(root or INDEX_DIR, INDEX_CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def current_index_dir(root: Optional[str] = None) -> str:
+    """현재 공개된 인덱스 스냅샷 디렉터리"""
+    root = root or INDEX_DIR
+    version = read_current_version(root)
+    return os.path.join(root, INDEX_VERSIONS_DIR, version) if version else root
+
+def load_manifest(root: Optional[str] = None) -> Optional[dict]:
+    """현재 버전의 manifest.json (없거나 읽을 수 없으면 None)"""
+    try:
+        with open(os.path.join(current_index_dir(root), INDEX_MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def index_health(root: Optional[str] = None) -> dict:
+    """헬스체크용 인덱스 요약 (manifest 가 없으면 {"status": "missing"})"""
+    manifest = load_manifest(root)
+    if manifest is None:
+        return {"status": "missing"}
+    return {
+        "status": "ready",
+        "rows": manifest["rows"],
+        "domains": len(manifest["domains"]),
+        "model": manifest["model_name"],
+        "dim": manifest["embed_dim"],
+        "version": manifest["version"],
+        "built": manifest["built"],
+        "updated": manifest["updated"],
+        "checksum": manifest["checksum"]
+    }
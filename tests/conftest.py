@@ -0,0 +1,40 @@
+# Veriscope 테스트 공통 설정 - 저장소 루트의 Veriscope.py 를 import 하고 인덱스 경로를 임시 디렉터리로 돌린다
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Veriscope as V  # noqa: E402
+
+
+class FakeEmbedder:
+    """텍스트별로 고정된 랜덤 단위 벡터를 돌려주는 임베더 (모델 로딩 없이 인덱스 경로만 검증)"""
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        rows = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little")
+            rows.append(np.random.default_rng(seed).standard_normal(self.dim))
+        vecs = np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dim)
+        return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    """INDEX_DIR / INDEX_PKL / SEED_CSV 를 tmp_path 아래로 돌린다"""
+    monkeypatch.setattr(V, "INDEX_DIR", str(tmp_path / "idx"))
+    monkeypatch.setattr(V, "INDEX_PKL", str(tmp_path / "idx.pkl"))
+    monkeypatch.setattr(V, "SEED_CSV", str(tmp_path / "seeds.csv"))
+    return tmp_path
+
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
@@ -0,0 +1,152 @@
+# 온디스크 인덱스 포맷: 컬럼 기록/재로딩, pickle 인덱스 변환
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import Veriscope as V
+
+
+def _records(n: int, now: float = 1.7e9):
+    recs = []
+    for i in range(n):
+        recs.append(V.DocRecord(
+            url=f"https://news{(i // 2) % 3}.example.com/article/{i // 2}",
+            title=f"제목 {i % 5}",
+            published=None if i % 7 == 0 else now - i * 3600.0,
+            chunk=f"청크 본문 {i} 대통령 탄핵 Korea {'가' * (i % 11)}",
+            domain=f"news{(i // 2) % 3}.example.com",
+            from_seed=(i % 4 != 0),
+        ))
+    return recs
+
+
+@pytest.mark.parametrize("compress_level", [0, 6])
+def test_record_columns_roundtrip(tmp_path, compress_level):
+    recs = _records(300)
+    matrix = np.random.default_rng(0).standard_normal((len(recs), 8)).astype(np.float32)
+    V.write_index_dir(str(tmp_path), "m", matrix, recs, compress_level=compress_level)
+
+    pack = V.open_index_dir(str(tmp_path))
+    records = pack.records
+    assert isinstance(records, V.RecordColumns)
+    for f in V.INDEX_INTERNED_FIELDS:
+        assert isinstance(records.columns[f], V.InternedColumn)
+    # 반복되는 url/title/domain 은 고유 문자열 한 번씩만 저장
+    assert len(records.columns["domain"].table) == 3
+    assert isinstance(records.columns["chunk"], V.CompressedStringColumn if compress_level else V.StringColumn)
+    assert (pack.model_name, pack.embed_dim) == ("m", 8)
+    assert len(records) == len(recs)
+    assert [records[i] for i in range(len(recs))] == recs
+    assert records[-1] == recs[-1]
+    np.testing.assert_array_equal(np.asarray(pack.matrix), matrix)
+    assert list(records.iter_field("domain")) == [r.domain for r in recs]
+
+    idx = np.array([5, 0, 299, 42])
+    pub = pack.column_values(idx, "published")
+    assert [None if np.isnan(p) else p for p in pub] == [recs[i].published for i in idx]
+    assert pack.column_values(idx, "from_seed").tolist() == [recs[i].from_seed for i in idx]
+    codes, table = pack.string_codes(idx, "domain")
+    assert [table[c] for c in codes] == [recs[i].domain for i in idx]
+
+
+def test_write_index_dir_empty_matrix(tmp_path):
+    V.write_index_dir(str(tmp_path), "m", [], [], embed_dim=8)
+    pack = V.open_index_dir(str(tmp_path))
+    assert pack.matrix.shape == (0, 8) and pack.embed_dim == 8
+    assert len(pack.records) == 0
+
+
+def test_load_index_converts_pickle_once(index_root):
+    recs = _records(20)
+    matrix = np.random.default_rng(1).standard_normal((len(recs), 8)).astype(np.float32)
+    with open(V.INDEX_PKL, "wb") as f:
+        pickle.dump(V.IndexPack("m", 8, matrix, recs), f)
+
+    pack = V.load_index()
+    assert isinstance(pack.records, V.RecordColumns)
+    assert list(pack.records) == recs
+    np.testing.assert_array_equal(np.asarray(pack.matrix), matrix)
+
+
+def test_delta_append_reload_and_merge(index_root, embedder):
+    recs = _records(40)
+    V.write_index_dir(V.INDEX_DIR, "m", embedder.encode([r.chunk for r in recs]), recs)
+    pack = V.load_index()
+
+    text = "새로 추가된 기사의 본문입니다. 대통령 탄핵 심판 결과가 발표되었습니다. " * 20
+    assert V.add_url_to_index("https://added.example.com/1", text, None, "추가", embedder, pack)
+    assert not V.add_url_to_index("https://added.example.com/1", text, None, "추가", embedder, pack)
+
+    # base 파일은 그대로, 새 청크는 delta 세그먼트로만 기록
+    pack = V.load_index()
+    assert len(pack.records) == len(recs) and len(pack.deltas) == 1
+    added = len(pack.deltas[0].records)
+    assert added > 0 and len(pack) == len(recs) + added
+    assert pack.record(len(recs)).url == "https://added.example.com/1"
+
+    idx, sims = V.search_index(pack, pack.vectors([len(recs)]), 3)
+    assert idx[0] == len(recs) and np.isclose(sims[0], 1.0, atol=1e-5)
+
+    urls = list(pack.iter_field("url"))
+    assert V.merge_index_deltas() == 1
+    pack = V.load_index()
+    assert not pack.deltas and len(pack.records) == len(recs) + added
+    assert list(pack.iter_field("url")) == urls
+
+
+def test_url_map_delete_and_reindex(index_root, embedder):
+    recs = _records(40)
+    V.write_index_dir(V.INDEX_DIR, "m", embedder.encode([r.chunk for r in recs]), recs)
+    pack = V.load_index()
+    url0, url1 = recs[0].url, recs[2].url
+    assert pack.find_url(url0) == [(0, 2)] and pack.find_url(url1) == [(2, 4)]
+    assert not pack.has_url("https://news0.example.com/article/999")
+
+    assert V.delete_url_from_index(url0, pack) == 2
+    assert V.delete_url_from_index(url0, pack) == 0
+    pack = V.load_index()
+    assert not pack.has_url(url0) and pack.has_url(url1)
+
+    # reindex: 기존 청크는 tombstone, 새 내용은 delta 로
+    text = "다시 수집한 기사 본문입니다. 정정 보도 내용이 추가되었습니다. " * 20
+    assert V.add_url_to_index(url1, text, None, "재수집", embedder, pack, reindex=True)
+    pack = V.load_index()
+    added = len(pack.deltas[0].records)
+    assert pack.find_url(url1) == [(len(recs), len(recs) + added)]
+
+    assert V.merge_index_deltas() == 1
+    pack = V.load_index()
+    assert len(pack) == len(recs) - 4 + added and not pack.deleted
+    assert not pack.has_url(url0)
+    assert pack.find_url(url1) == [(len(recs) - 4, len(recs) - 4 + added)]
+
+
+def test_delta_tombstone_compaction_row_counts(index_root, embedder):
+    recs = _records(120)
+    recs[60] = V.DocRecord(url="https://news0.example.com/dup", title="t", published=1.7e9,
+                           chunk=recs[10].chunk.upper(), domain="news0.example.com", from_seed=True)
+    V.write_index_dir(V.INDEX_DIR, "m", embedder.encode([r.chunk for r in recs]), recs)
+
+    pack = V.load_index()
+    text = "새로 추가된 기사의 본문입니다. 대통령 탄핵 심판 결과가 발표되었습니다. " * 20
+    assert V.add_url_to_index("https://added.example.com/1", text, None, "추가", embedder, pack)
+    pack = V.load_index()
+    added = len(pack) - len(recs)
+    assert V.delete_url_from_index("https://news0.example.com/article/0", pack) == 2
+    live = len(recs) + added - 2
+
+    stats = V.compact_index(max_age_days=None, near_dup_threshold=1.0, drop_unlisted_domains=False)
+    assert stats["rows_before"] == live
+    assert stats["dropped_exact_dup"] == 1          # 대소문자만 다른 청크 (행 60)
+    assert stats["rows_after"] == live - 1
+
+    pack = V.load_index()
+    assert len(pack) == live - 1 and not pack.deltas and not pack.deleted
+    assert pack.has_url("https://added.example.com/1")
+    assert not pack.has_url("https://news0.example.com/dup")
+    # 도메인 → 최신 발행일 순으로 재배치
+    domains = list(pack.iter_field("domain"))
+    assert domains == sorted(domains)
+    assert not any(n.endswith(".compact.matrix.npy") for n in os.listdir(index_root))
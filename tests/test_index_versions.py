@@ -0,0 +1,94 @@
+# 인덱스 버전 공개: CURRENT 교체, 리더 lease 가 있는 버전의 GC 보호, ANN/양자화 부가 파일의 새 버전 공개, manifest 헬스체크
+import os
+
+import numpy as np
+import pytest
+
+import Veriscope as V
+import index_manifest
+
+
+def _unit(rng, n, dim):
+    m = rng.standard_normal((n, dim)).astype(np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def _records(n):
+    return [V.DocRecord(url=f"https://a.example.com/{i}", title="t", published=1.7e9, chunk=f"c{i}",
+                        domain="a.example.com", from_seed=True) for i in range(n)]
+
+
+def _publish(matrix):
+    tmp_dir = V.INDEX_DIR + ".tmp"
+    V.write_index_dir(tmp_dir, "m", matrix, _records(len(matrix)))
+    with V.index_file_lock(V.INDEX_DIR + ".lock"):
+        return V.publish_index_version(tmp_dir)
+
+
+def test_publish_switches_current_and_lease_blocks_gc(index_root):
+    rng = np.random.default_rng(0)
+    v1 = _publish(_unit(rng, 10, 8))
+    old = V.load_index()
+    assert old.version == v1 and V.current_index_dir() == V.version_dir(v1)
+
+    v2 = _publish(_unit(rng, 12, 8))
+    assert V.read_current_version() == v2
+    # 이전 pack 이 lease 를 잡고 있는 동안 v1 은 지워지지 않고 계속 읽힌다
+    assert V.gc_index_versions() == []
+    assert os.path.isdir(V.version_dir(v1)) and len(old) == 10
+    assert len(V.load_index()) == 12
+
+    V._release_reader_lease(old.lease)
+    assert V.gc_index_versions() == [v1]
+    assert not os.path.exists(V.version_dir(v1))
+
+
+@pytest.mark.skipif(not V.FAISS_AVAILABLE, reason="faiss 없음")
+def test_sidecars_published_as_new_version(index_root):
+    matrix = _unit(np.random.default_rng(1), 200, 16)
+    v1 = _publish(matrix)
+    reader = V.load_index()
+    v1_files = sorted(os.listdir(V.version_dir(v1)))
+
+    v2 = V.publish_base_sidecars(ann=dict(kind="flat"), quant=dict(kind="int8"))
+    assert v2 is not None and V.read_current_version() == v2
+    # 읽는 중인 이전 버전은 그대로 두고, 새 버전에는 같은 base 와 부가 파일이 함께 있다
+    assert sorted(os.listdir(V.version_dir(v1))) == v1_files
+    new_files = set(os.listdir(V.version_dir(v2)))
+    assert set(V.ANN_FILES) <= new_files and {V.QUANT_META_FILE, "quant.codes.npy"} <= new_files
+    assert not os.path.exists(V.INDEX_DIR + ".sidecar.tmp")
+    assert os.path.samefile(os.path.join(V.version_dir(v1), "matrix.npy"),
+                            os.path.join(V.version_dir(v2), "matrix.npy"))
+
+    pack = V.load_index()
+    assert V.load_ann_index(pack) is not None and len(pack) == len(reader)
+    del reader
+
+
+def test_sidecars_discarded_when_version_changes(index_root, monkeypatch):
+    rng = np.random.default_rng(2)
+    _publish(_unit(rng, 20, 8))
+    build = V.build_quant_index
+
+    def racing_build(index_dir, **kwargs):
+        build(index_dir, **kwargs)
+        _publish(_unit(rng, 30, 8))   # 만드는 도중 다른 작업이 새 base 를 공개
+
+    monkeypatch.setattr(V, "build_quant_index", racing_build)
+    assert V.publish_base_sidecars(quant=dict(kind="int8")) is None
+    assert not os.path.exists(os.path.join(V.current_index_dir(), V.QUANT_META_FILE))
+
+
+def test_index_health_reads_manifest_without_writing(index_root):
+    assert index_manifest.index_health(V.INDEX_DIR) == {"status": "missing"}
+    version = _publish(_unit(np.random.default_rng(3), 10, 8))
+    health = index_manifest.index_health(V.INDEX_DIR)
+    assert health["status"] == "ready" and health["rows"] == 10 and health["version"] == version
+    assert health["domains"] == 1 and health["dim"] == 8
+
+    # manifest 가 없는 인덱스: 헬스체크는 계산/기록하지 않고 missing, CLI 쪽 read_index_manifest 만 다시 만든다
+    manifest_path = os.path.join(V.current_index_dir(), V.INDEX_MANIFEST_FILE)
+    os.remove(manifest_path)
+    assert index_manifest.index_health(V.INDEX_DIR) == {"status": "missing"}
+    assert not os.path.exists(manifest_path)
+    assert V.read_index_manifest()["rows"] == 10 and os.path.exists(manifest_path)
@@ -0,0 +1,97 @@
+# evaluate_url 후보 채점: 배열 단위 score_evidence_candidates 가 기존 행 단위 루프와 같은 결과를 내는지
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import Veriscope as V
+
+WORDS = ["대통령은", "탄핵", "헌법재판소가", "사드", "배치", "THAAD", "국회", "경제", "정부의",
+         "Korea", "Seoul", "trump", "서울", "날씨", "미사일", "economy"]
+URLS = ["https://www.yna.co.kr/view/AKR2023", "https://foo.com/news/", "https://www.gov.kr/a/",
+        "http://bar.info/x/", "https://cnn.com/2019/", "https://news.jtbc.co.kr/article/NB12"]
+KR_STOPWORDS = ['것은', '있다', '한다', '된다', '이다', '그것', '이것', '그리고', '하지만', '그러나']
+EN_STOPWORDS = ['the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'was', 'one', 'our', 'has']
+KOREAN_CONTEXT = ['한국', '대한민국', '서울', '부산', '정부', '대통령', '국정감사', '국회', '청와대', 'Korea', 'South Korea', 'Seoul']
+
+
+def _reference_scores(pack, cand_idx, sims, e_prob, c_prob, q_text, keep, foreign_mask):
+    """배열화 이전 evaluate_url 의 후보별 채점 루프"""
+    q_lang_kr = V.korean_ratio(q_text)
+    q_hashes = V.relevance_keyword_hashes(q_text)
+    cand_kr = [V.korean_ratio(pack.record(i).chunk or "") for i in cand_idx]
+    scored = []
+    for rank in np.nonzero(keep)[0].tolist():
+        idx = cand_idx[rank]
+        rec = pack.record(idx)
+        sim_v, sup_v, con_v = float(sims[rank]), float(e_prob[rank]), float(c_prob[rank])
+        if q_lang_kr >= 0.3 and foreign_mask[rank]:
+            if sum(1 for k in KOREAN_CONTEXT if k in rec.chunk) < 2:
+                continue
+            sim_v *= 0.7
+        content_relevance = 1.0
+        is_relevant = V.check_keyword_relevance(q_text, rec.chunk, min_common_keywords=2)
+        assert is_relevant == V.check_keyword_relevance_hashes(q_hashes, pack.keyword_hashes(idx))
+        q_keywords = set()
+        for w in re.findall(r'[가-힣]{2,}', q_text)[:10]:
+            if w not in KR_STOPWORDS:
+                q_keywords.add(w)
+        for w in re.findall(r'[A-Za-z]{3,}', q_text)[:5]:
+            if w.lower() not in EN_STOPWORDS:
+                q_keywords.add(w.lower())
+        if q_keywords:
+            text = rec.chunk.lower()
+            ratio = sum(1 for k in q_keywords if k.lower() in text) / len(q_keywords)
+            if ratio == 0:
+                continue
+            if not is_relevant or ratio < 0.15:
+                content_relevance = 0.5
+            elif ratio < 0.25:
+                content_relevance = 0.7
+        dt = datetime.fromtimestamp(rec.published, tz=timezone.utc) if rec.published else None
+        time_v = V.time_weight(dt)
+        src_v = V.source_reputation(rec.url, rec.from_seed)
+        lang_adj = 1.0
+        if q_lang_kr >= 0.25:
+            lang_adj = 0.8 + 0.2 * (1.0 if cand_kr[rank] >= 0.25 else 0.0)
+        score = (V.ALPHA_SIM * sim_v + V.BETA_SUP * sup_v - V.GAMMA_CONTRA * con_v
+                 + V.DELTA_TIME * time_v + V.EPS_SOURCE * src_v + V.EPS_LANG * (lang_adj - 1))
+        score *= content_relevance
+        if score >= V.MIN_FINAL_SCORE:
+            scored.append((idx, score, {"url": rec.url, "similarity": sim_v, "support": sup_v}))
+    return scored
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("q_text", [
+    "대통령 탄핵 사드 배치 THAAD 논란 Korea economy 정부의 결정",
+    "Trump economy policy and Korea trade",
+    "서울 날씨",
+])
+def test_score_evidence_candidates_matches_per_row_loop(tmp_path, seed, q_text):
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    n = 400
+    recs = [V.DocRecord(url=rnd.choice(URLS) + str(i // 2), title="t", chunk=" ".join(rnd.choices(WORDS, k=8)),
+                        published=rnd.choice([None, now - 86400 * rnd.randint(1, 5000)]), domain="x",
+                        from_seed=rnd.random() < 0.5) for i in range(n)]
+    V.write_index_dir(str(tmp_path), "m", rng.random((n, 4)).astype(np.float32), recs)
+    pack = V.open_index_dir(str(tmp_path))
+
+    cand_idx = rng.permutation(n)[:250].tolist()
+    sims, e_prob, c_prob = rng.random(250), rng.random(250), rng.random(250)
+    keep = (sims >= 0.2) & (e_prob >= 0.1)
+    foreign_mask = (pack.domain_classes(cand_idx) & V.DOMAIN_FOREIGN) != 0
+
+    want = _reference_scores(pack, cand_idx, sims, e_prob, c_prob, q_text, keep, foreign_mask)
+    got = V.score_evidence_candidates(pack, cand_idx, sims, e_prob, c_prob, q_text, keep, foreign_mask)
+    assert [g[0] for g in got] == [w[0] for w in want]
+    np.testing.assert_allclose([g[1] for g in got], [w[1] for w in want], rtol=1e-9, atol=1e-12)
+    for (_, _, g), (_, _, w) in zip(got, want):
+        assert g["url"] == w["url"]
+        assert g["similarity"] == pytest.approx(w["similarity"])
+        assert g["support"] == pytest.approx(w["support"])
@@ -0,0 +1,322 @@
+# 인덱스 검색: ANN(FAISS) / 양자화 백엔드와 blockwise_topk 가 전수 코사인 검색과 같은 top-k 를 내는지
+import numpy as np
+import pytest
+
+import Veriscope as V
+
+needs_faiss = pytest.mark.skipif(not V.FAISS_AVAILABLE, reason="faiss 없음")
+
+
+def _unit(rng, n, dim):
+    m = rng.standard_normal((n, dim)).astype(np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def _records(n):
+    return [V.DocRecord(url=f"https://a.example.com/{i}", title="t", published=1.7e9, chunk=f"c{i}",
+                        domain="a.example.com", from_seed=True) for i in range(n)]
+
+
+def _brute_topk(matrix, q, k, excluded=None):
+    unit = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    sims = (unit @ q.T).max(axis=1)
+    if excluded is not None:
+        sims[excluded] = -np.inf
+    order = np.argsort(-sims, kind="stable")[:k]
+    order = order[np.isfinite(sims[order])]
+    return order, sims[order]
+
+
+@pytest.fixture
+def ann_pack(index_root):
+    rng = np.random.default_rng(0)
+    matrix = _unit(rng, 2000, 32)
+    V.write_index_dir(V.INDEX_DIR, "m", matrix, _records(len(matrix)))
+    V.build_ann_index(V.INDEX_DIR, kind="flat")
+    return V.load_index(), matrix
+
+
+@needs_faiss
+@pytest.mark.parametrize("n_queries", [1, 4])
+def test_ann_flat_matches_exact_search(ann_pack, monkeypatch, n_queries):
+    pack, matrix = ann_pack
+    q = _unit(np.random.default_rng(n_queries), n_queries, 32)
+    want_idx, want_sims = _brute_topk(matrix, q, 20)
+
+    monkeypatch.setattr(V, "SEARCH_BACKEND", "faiss")
+    idx, sims = V.search_index(pack, q, 20)
+    assert pack.ann is not None
+    np.testing.assert_array_equal(idx, want_idx)
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5, atol=1e-6)
+
+    monkeypatch.setattr(V, "SEARCH_BACKEND", "exact")
+    exact_idx, _ = V.search_index(pack, q, 20)
+    np.testing.assert_array_equal(exact_idx, want_idx)
+
+
+@needs_faiss
+def test_ann_search_merges_queries_by_similarity(ann_pack):
+    pack, matrix = ann_pack
+    q = _unit(np.random.default_rng(7), 5, 32)
+    ann = V.load_ann_index(pack)
+    idx, sims = V._ann_search(ann, q, 10)
+    # 질의 5개 × top-10 → 고유 행은 10개보다 많고, 유사도 내림차순이어야 앞에서 자른 k개가 정답
+    assert len(idx) > 10 and len(set(idx.tolist())) == len(idx)
+    assert np.all(np.diff(sims) <= 0)
+    want_idx, _ = _brute_topk(matrix, q, 10)
+    np.testing.assert_array_equal(idx[:10], want_idx)
+
+
+@pytest.mark.parametrize("kind", ["int8", pytest.param("pq", marks=needs_faiss)])
+def test_quantized_search_reranks_to_exact(index_root, monkeypatch, kind):
+    rng = np.random.default_rng(3)
+    matrix = _unit(rng, 3000, 32)
+    V.write_index_dir(V.INDEX_DIR, "m", matrix, _records(len(matrix)))
+    V.build_quant_index(V.INDEX_DIR, kind=kind, pq_m=8)
+    pack = V.load_index()
+    monkeypatch.setattr(V, "SEARCH_BACKEND", "auto")
+    for n_queries in (1, 3):
+        q = _unit(rng, n_queries, 32)
+        want_idx, want_sims = _brute_topk(matrix, q, 10)
+        idx, sims = V.search_index(pack, q, 10)
+        assert pack.quant is not None and pack.quant.kind == kind
+        # 재채점 후보 안에 든 행은 float32 원본 유사도 그대로
+        hit = np.isin(idx, want_idx)
+        assert hit.mean() >= (1.0 if kind == "int8" else 0.9)
+        np.testing.assert_allclose(sims[hit], want_sims[np.isin(want_idx, idx)], rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("backend", [
+    "exact", pytest.param("faiss", marks=needs_faiss), "int8"])
+def test_search_skips_tombstoned_rows(index_root, monkeypatch, backend):
+    rng = np.random.default_rng(11)
+    matrix = _unit(rng, 2000, 32)
+    recs = _records(len(matrix))
+    V.write_index_dir(V.INDEX_DIR, "m", matrix, recs)
+    if backend == "faiss":
+        V.build_ann_index(V.INDEX_DIR, kind="flat")
+    elif backend == "int8":
+        V.build_quant_index(V.INDEX_DIR, kind="int8")
+    monkeypatch.setattr(V, "SEARCH_BACKEND", {"exact": "exact", "faiss": "faiss", "int8": "auto"}[backend])
+    pack = V.load_index()
+
+    q = _unit(rng, 3, 32)
+    top, _ = _brute_topk(matrix, q, 5)
+    dead = set(top.tolist()) | set(rng.choice(len(matrix), 50, replace=False).tolist())
+    for i in dead:
+        assert V.delete_url_from_index(recs[i].url, pack) == 1
+    pack = V.load_index()
+
+    live = np.ones(len(matrix), dtype=bool)
+    live[list(dead)] = False
+    want_idx, want_sims = _brute_topk(matrix[live], q, 20)
+    want_idx = np.nonzero(live)[0][want_idx]
+    idx, sims = V.search_index(pack, q, 20)
+    np.testing.assert_array_equal(idx, want_idx)
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5, atol=1e-6)
+
+
+@pytest.fixture
+def shard_pool_cleanup():
+    yield
+    if V._SHARD_POOL is not None:
+        V._SHARD_POOL.shutdown()
+        V._SHARD_POOL = None
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_sharded_search_matches_unsharded(index_root, monkeypatch, shard_pool_cleanup, workers):
+    rng = np.random.default_rng(5)
+    matrix = _unit(rng, 1500, 32)
+    recs = [V.DocRecord(url=f"https://d{i % 7}.example.com/{i}", title="t", published=1.7e9 - i * 86400.0,
+                        chunk=f"c{i}", domain=f"d{i % 7}.example.com", from_seed=True) for i in range(len(matrix))]
+    V.write_sharded_index(V.INDEX_DIR, "m", matrix, recs, 4, "domain")
+    monkeypatch.setattr(V, "SHARD_SEARCH_WORKERS", workers)
+    pack = V.load_index()
+    assert len(pack.shards) == 4 and len(pack) == len(recs)
+
+    q = _unit(rng, 3, 32)
+    top, _ = _brute_topk(matrix, q, 3)
+    for i in top:
+        assert V.delete_url_from_index(recs[i].url, pack) == 1
+    pack = V.load_index()
+    live = np.ones(len(matrix), dtype=bool)
+    live[top] = False
+    want_idx, want_sims = _brute_topk(matrix[live], q, 15)
+    want_urls = [recs[i].url for i in np.nonzero(live)[0][want_idx]]
+
+    # 샤드가 행 순서를 바꾸므로 전역 행 번호 대신 URL 로 비교
+    idx, sims = V.search_index(pack, q, 15)
+    assert [pack.record(i).url for i in idx] == want_urls
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5, atol=1e-6)
+
+
+def _dated_records(n, rng):
+    now = V.now_utc().timestamp()
+    ages = rng.uniform(0, 10 * 365, n) * 86400.0
+    return [V.DocRecord(url=f"https://a.example.com/{i}", title="t",
+                        published=None if i % 10 == 0 else now - ages[i], chunk=f"c{i}",
+                        domain="a.example.com", from_seed=True) for i in range(n)]
+
+
+def _in_window(recs, days):
+    cutoff = V.now_utc().timestamp() - days * 86400
+    return np.array([r.published is None or r.published >= cutoff for r in recs])
+
+
+@pytest.mark.parametrize("backend", ["exact", pytest.param("faiss", marks=needs_faiss)])
+def test_recency_window_on_base_segment(index_root, monkeypatch, backend):
+    rng = np.random.default_rng(21)
+    matrix = _unit(rng, 2000, 32)
+    recs = _dated_records(len(matrix), rng)
+    V.write_index_dir(V.INDEX_DIR, "m", matrix, recs)
+    if backend == "faiss":
+        V.build_ann_index(V.INDEX_DIR, kind="flat")
+    monkeypatch.setattr(V, "SEARCH_BACKEND", backend)
+    pack = V.load_index()
+
+    q = _unit(rng, 3, 32)
+    live = _in_window(recs, 365)
+    want_idx, want_sims = _brute_topk(matrix[live], q, 20)
+    idx, sims = V.search_index(pack, q, 20, recency_days=365)
+    np.testing.assert_array_equal(idx, np.nonzero(live)[0][want_idx])
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5, atol=1e-6)
+
+
+def test_year_shards_skip_out_of_window_years(index_root, monkeypatch):
+    rng = np.random.default_rng(23)
+    matrix = _unit(rng, 3000, 32)
+    recs = _dated_records(len(matrix), rng)
+    V.write_sharded_index(V.INDEX_DIR, "m", matrix, recs, 0, "year")
+    pack = V.load_index()
+    assert {seg.name for seg in pack.shards} >= {"shards/0000"}
+
+    searched = []
+    search_segment = V._search_segment
+    def spy(pack, name, *args, **kwargs):
+        searched.append(name)
+        return search_segment(pack, name, *args, **kwargs)
+    monkeypatch.setattr(V, "_search_segment", spy)
+
+    q = _unit(rng, 2, 32)
+    live = _in_window(recs, 2 * 365)
+    want_idx, want_sims = _brute_topk(matrix[live], q, 15)
+    want_urls = [recs[i].url for i in np.nonzero(live)[0][want_idx]]
+    idx, sims = V.search_index(pack, q, 15, recency_days=2 * 365)
+    assert [pack.record(i).url for i in idx] == want_urls
+    np.testing.assert_allclose(sims, want_sims, rtol=1e-5, atol=1e-6)
+    # 발행 연도 전체가 창 밖인 샤드는 열지 않는다 (발행일 없는 행의 0000 샤드와 최근 연도만)
+    this_year = V.now_utc().year
+    assert searched and all(n == "shards/0000" or int(n[-4:]) >= this_year - 3 for n in searched)
+    assert len(searched) < len(pack.shards)
+
+
+def test_newest_first_matches_time_weighted_selection(index_root):
+    rng = np.random.default_rng(29)
+    matrix = _unit(rng, 3000, 32)
+    recs = _dated_records(len(matrix), rng)
+    V.write_sharded_index(V.INDEX_DIR, "m", matrix, recs, 0, "year")
+    pack = V.load_index()
+
+    q = _unit(rng, 2, 32)
+    sims_all = (matrix @ q.T).max(axis=1)
+    pub = np.array([np.nan if r.published is None else r.published for r in recs])
+    adj = sims_all + (V.DELTA_TIME / V.ALPHA_SIM) * V.time_weight_array(pub)
+    # 샤드마다 유사도 top-k 를 구한 뒤 시간 가중 점수로 k개를 고른다 (조기 종료해도 결과는 같아야 함)
+    years = np.array([V.shard_year(r.published) for r in recs])
+    cand = np.concatenate([rows[np.argsort(-sims_all[rows], kind="stable")[:10]]
+                           for rows in (np.nonzero(years == y)[0] for y in np.unique(years))])
+    want = {recs[i].url for i in cand[np.argsort(-adj[cand], kind="stable")[:10]]}
+
+    idx, sims = V.search_index(pack, q, 10, newest_first=True)
+    assert {pack.record(i).url for i in idx} == want
+    assert np.all(np.diff(sims) <= 0)
+
+
+def test_hybrid_search_fuses_cosine_and_bm25(index_root, monkeypatch):
+    rng = np.random.default_rng(31)
+    matrix = _unit(rng, 500, 32)
+    words = ["경제", "정치", "사회", "문화", "스포츠"]
+    recs = [V.DocRecord(url=f"https://a.example.com/{i}", title="t", published=1.7e9,
+                        chunk=" ".join(words[j] for j in rng.choice(5, 3)), domain="a.example.com", from_seed=True)
+            for i in range(len(matrix))]
+    # 임베딩으로는 멀지만 질의어가 반복되는 행
+    keyword_rows = [7, 123, 404]
+    for i in keyword_rows:
+        recs[i].chunk = "반도체 수출 반도체 " + recs[i].chunk
+    V.write_index_dir(V.INDEX_DIR, "m", matrix, recs)
+    pack = V.load_index()
+    monkeypatch.setattr(V, "SEARCH_BACKEND", "exact")
+    q = _unit(rng, 1, 32)
+    sims_all = (matrix @ q.T).max(axis=1)
+
+    idx, cos, fused = V.hybrid_search(pack, "반도체 수출", q, 10, alpha=0.5)
+    assert len(idx) == len(cos) == len(fused) == 10
+    # 순위는 융합 점수, 반환 유사도는 코사인 그대로
+    assert np.all(np.diff(fused) <= 0)
+    np.testing.assert_allclose(cos, sims_all[idx], rtol=1e-5, atol=1e-6)
+    assert set(keyword_rows) <= set(idx.tolist())
+
+    sparse_idx, sparse_scores = pack.bm25_scores("반도체 수출")
+    assert set(sparse_idx.tolist()) == set(keyword_rows)
+    dense_idx, _ = _brute_topk(matrix, q, 10)
+    cand = np.union1d(dense_idx, sparse_idx)
+    bm25 = np.zeros(len(cand))
+    bm25[np.isin(cand, sparse_idx)] = sparse_scores / sparse_scores.max()
+    want = 0.5 * sims_all[cand] + 0.5 * bm25
+    order = np.argsort(-want, kind="stable")[:10]
+    np.testing.assert_array_equal(idx, cand[order])
+    np.testing.assert_allclose(fused, want[order], rtol=1e-5, atol=1e-6)
+
+    # alpha=1 이면 임베딩 검색과 같은 순서
+    idx, cos, _ = V.hybrid_search(pack, "반도체 수출", q, 10, alpha=1.0)
+    np.testing.assert_array_equal(idx, dense_idx)
+
+
+@pytest.mark.parametrize("n,k,block", [(1000, 10, 64), (1000, 50, 1000), (37, 100, 8), (500, 1, 7)])
+@pytest.mark.parametrize("n_queries", [1, 3])
+def test_blockwise_topk_matches_brute_force(n, k, block, n_queries):
+    rng = np.random.default_rng(n + k + block)
+    matrix = rng.standard_normal((n, 24)).astype(np.float32) * rng.uniform(0.5, 2.0, (n, 1)).astype(np.float32)
+    q = _unit(rng, n_queries, 24)
+    excluded = rng.random(n) < 0.2
+
+    for mask in (None, excluded):
+        idx, sims = V.blockwise_topk(matrix, q, k, excluded=mask, block=block)
+        want_idx, want_sims = _brute_topk(matrix, q, k, mask)
+        order = np.argsort(-sims, kind="stable")
+        assert set(idx.tolist()) == set(want_idx.tolist())
+        np.testing.assert_allclose(sims[order], want_sims, rtol=1e-5, atol=1e-6)
+
+
+def test_blockwise_topk_normalized_rows_skip_norms():
+    matrix = _unit(np.random.default_rng(1), 300, 16)
+    q = matrix[[17]]
+    idx, sims = V.blockwise_topk(matrix, q, 5, normalized=True, block=32)
+    want_idx, want_sims = _brute_topk(matrix, q, 5)
+    assert set(idx.tolist()) == set(want_idx.tolist())
+    assert 17 in idx.tolist()
+    np.testing.assert_allclose(np.sort(sims)[::-1], want_sims, rtol=1e-5, atol=1e-6)
+
+
+def test_blockwise_topk_empty_and_zero_k():
+    q = np.ones((1, 8), dtype=np.float32) / np.sqrt(8)
+    assert len(V.blockwise_topk(np.zeros((0, 8), dtype=np.float32), q, 5)[0]) == 0
+    assert len(V.blockwise_topk(np.ones((4, 8), dtype=np.float32), q, 0)[0]) == 0
+
+
+@needs_faiss
+def test_ann_flat_matches_blockwise_topk_with_excluded_rows(ann_pack):
+    pack, matrix = ann_pack
+    rng = np.random.default_rng(5)
+    q = _unit(rng, 4, 32)
+    excluded = np.zeros(len(matrix), dtype=bool)
+    excluded[_brute_topk(matrix, q, 8)[0]] = True
+    excluded[rng.choice(len(matrix), 100, replace=False)] = True
+
+    want_idx, want_sims = V.blockwise_topk(matrix, q, 20, excluded=excluded, normalized=True)
+    order = np.argsort(-want_sims, kind="stable")
+    idx, sims = V._ann_search(V.load_ann_index(pack), q, 200)
+    live = ~excluded[idx]
+    np.testing.assert_array_equal(idx[live][:20], want_idx[order])
+    np.testing.assert_allclose(sims[live][:20], want_sims[order], rtol=1e-5, atol=1e-6)
@@ -0,0 +1,47 @@
+# 사전 매칭: AhoCorasick.find_all 이 용어별 `in` 검사와 같은 적중을 내는지 (C 구현/순수 파이썬 모두)
+import random
+
+import pytest
+
+import Veriscope as V
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(not V.AHOCORASICK_AVAILABLE, reason="pyahocorasick 없음"))]
+PIECES = V.OCR_IMPORTANT_KEYWORDS + V.SEMANTIC_HEURISTIC_TERMS + [
+    "대 통령", "탄 핵", "헌법 재판소", "윤 석열", "가", "나 ", "ABC", "2025년 3월", "오늘", " ", "헌", "재"]
+
+
+@pytest.fixture(params=BACKENDS, ids=["python", "c"])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(V, "AHOCORASICK_AVAILABLE", request.param)
+    return request.param
+
+
+def test_find_all_matches_substring_checks(backend):
+    terms = V.SEMANTIC_HEURISTIC_TERMS
+    matcher = V.AhoCorasick(terms)
+    rnd = random.Random(7)
+    for _ in range(2000):
+        text = "".join(rnd.choices(PIECES, k=rnd.randint(0, 25)))
+        assert matcher.find_all(text) == {t for t in terms if t in text}
+
+
+def test_find_all_overlapping_and_nested_patterns(backend):
+    matcher = V.AhoCorasick(["탄핵", "탄핵심판", "핵심", "심판", "a", "aa", "aaa"])
+    assert matcher.find_all("탄핵심판") == {"탄핵", "탄핵심판", "핵심", "심판"}
+    assert matcher.find_all("aa") == {"a", "aa"}
+    assert matcher.find_all("") == set()
+    assert V.AhoCorasick([]).find_all("탄핵") == set()
+
+
+def test_pattern_values_merge_ocr_variants(backend):
+    matcher = V.AhoCorasick(V.ocr_keyword_patterns())
+    abbreviations = V.OCR_KEYWORD_ABBREVIATIONS
+    rnd = random.Random(3)
+    for _ in range(2000):
+        text = "".join(rnd.choices(PIECES, k=rnd.randint(0, 20))).lower()
+        want = set()
+        for kw in V.OCR_IMPORTANT_KEYWORDS:
+            if (kw in text or any(kw[:i] + " " + kw[i:] in text for i in range(1, len(kw)))
+                    or any(a in text for a in abbreviations.get(kw, ()))):
+                want.add(kw)
+        assert matcher.find_all(text) == want
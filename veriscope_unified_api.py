@@ -21,6 +21,9 @@ DATABASE_PATH = 'database/veriscope.db'
 PYTHON_PATH = "C:/Smart_IT/.venv/Scripts/python.exe"
 SCRIPT_PATH = "C:/Smart_IT/Veriscope.py"
 
+# 인덱스 manifest 요약 (Veriscope.py 가 인덱스를 갱신할 때마다 기록) - 헬스체크에서 인덱스를 열지 않고 읽음
+from index_manifest import index_health as _index_health
+
 # =============================================================================
 # 데이터베이스 유틸리티 함수
 # =============================================================================
@@ -151,7 +154,8 @@ def health_check():
                 "status": "available" if cli_result.returncode == 0 else "unavailable",
                 "python_path": PYTHON_PATH,
                 "script_path": SCRIPT_PATH
-            }
+            },
+            "index": _index_health()
         }), 200
         
     except Exception as e: